@@ -129,10 +129,12 @@ def should_refresh_stock_detail_cache(detail_file=STOCK_DETAIL_FILE, min_rows=40
     return file_mtime.date() != now.date()
 
 def _stock_detail_worker_init(script_dir):
-    """ProcessPoolExecutor 子进程初始化：将 Spiders/ 加入 sys.path，确保 baostock_helper 可导入。"""
+    """ProcessPoolExecutor 子进程初始化：将 Spiders/ 加入 sys.path，并预登录 baostock（整个子进程复用会话）。"""
     import sys as _sys
     if script_dir not in _sys.path:
         _sys.path.insert(0, script_dir)
+    from spiders.baostock_helper import init_baostock_worker
+    init_baostock_worker()
 
 
 def run_stock_detail_spider(stock_file_path, log_file=None, target_date=None):
@@ -150,12 +152,13 @@ def run_stock_detail_spider(stock_file_path, log_file=None, target_date=None):
     project_root = os.path.dirname(script_dir)
     output_file_path = os.path.join(project_root, STOCK_DETAIL_FILE)
 
-    # 读取股票列表（兼容「代码」与「代码\\t名称」，只取代码列）
+    # 读取股票列表（兼容「代码」与「代码\\t名称」，简称直接传给 worker，省去逐只 query_stock_basic）
     codes = []
+    list_names = {}
     try:
         if os.path.exists(stock_file_path):
             from spiders.baostock_helper import read_stock_list_txt
-            codes, _ = read_stock_list_txt(stock_file_path)
+            codes, list_names = read_stock_list_txt(stock_file_path)
             log(f"[INFO] 估值抓取股票数量: {len(codes)}")
         else:
             log(f"[WARNING] 股票列表不存在: {stock_file_path}")
@@ -171,7 +174,9 @@ def run_stock_detail_spider(stock_file_path, log_file=None, target_date=None):
     if script_dir not in sys.path:
         sys.path.insert(0, script_dir)
 
-    from spiders.baostock_helper import fetch_stock_fundamental_worker
+    from spiders.baostock_helper import fetch_stock_fundamental_worker, resolve_stock_names
+
+    names = resolve_stock_names(codes, list_names)
 
     CSV_FIELDS = [
         'stock_id', 'stock_name', 'new_price', 'percentage_change', 'price_change',
@@ -209,7 +214,7 @@ def run_stock_detail_spider(stock_file_path, log_file=None, target_date=None):
             initargs=(script_dir,),
         ) as executor:
             futures = {
-                executor.submit(fetch_stock_fundamental_worker, code, target_date): code
+                executor.submit(fetch_stock_fundamental_worker, code, target_date, names.get(code)): code
                 for code in codes
             }
             pending_futures = set(futures.keys())
@@ -262,7 +267,8 @@ def run_stock_detail_spider(stock_file_path, log_file=None, target_date=None):
     log(f"[INFO] 估值文件路径: {output_file_path}")
     return True
 
-def run_stock_kline_spider_with_indicators(stock_codes, target_date=None, stock_file_path=None, progress=None):
+def run_stock_kline_spider_with_indicators(stock_codes, target_date=None, stock_file_path=None, progress=None,
+                                           resume=True):
     """
     获取带技术指标的K线数据
 
@@ -271,6 +277,7 @@ def run_stock_kline_spider_with_indicators(stock_codes, target_date=None, stock_
         target_date: 目标日期，格式 YYYYMMDD，如果为None则使用今天
         stock_file_path: 股票列表文件路径
         progress: 可选的 PinnedProgress 实例，用于在控制台显示进度条+滚动日志
+        resume: 同一日期上次运行中途退出时是否断点续跑（False 则从头开始）
     """
     from spiders.stock_kline import StockKlineSpider
 
@@ -279,6 +286,7 @@ def run_stock_kline_spider_with_indicators(stock_codes, target_date=None, stock_
         stock_codes=stock_codes,
         calc_indicators=True,
         progress=progress,
+        resume=resume,
     )
     if target_date:
         kwargs['start_date'] = target_date
@@ -658,7 +666,30 @@ if __name__ == "__main__":
                         help='禁用 PinnedProgress 进度条，改用普通日志输出（非终端环境会自动开启）')
     parser.add_argument('--progress', action='store_true',
                         help='强制启用 PinnedProgress 进度条（即使检测到非终端环境）')
+    parser.add_argument('--fresh', action='store_true',
+                        help='忽略同一日期未完成的运行日志，从头开始（默认中途退出后重跑会断点续跑）')
+    backend_group = parser.add_mutually_exclusive_group()
+    backend_group.add_argument('--baostock-record', nargs='?', const='', default=None, metavar='DIR',
+                               help='照常请求 baostock，同时把响应录制到 DIR（默认 cache/baostock_replay），供 --baostock-replay 回放')
+    backend_group.add_argument('--baostock-replay', nargs='?', const='', default=None, metavar='DIR',
+                               help='不联网，从录制目录 DIR 回放 baostock 响应（用于可重复的性能测试），并跳过云端上传/同步；'
+                                    '延迟/错误/卡死注入见 stock_config.py 中 BAOSTOCK_REPLAY_* 环境变量')
     args = parser.parse_args()
+
+    # baostock 后端需在导入 spiders 之前确定：通过环境变量传给 stock_config 及所有子进程
+    offline_replay = args.baostock_replay is not None
+    if args.baostock_record is not None or offline_replay:
+        os.environ['BAOSTOCK_BACKEND'] = 'replay' if offline_replay else 'record'
+        replay_dir = args.baostock_replay if offline_replay else args.baostock_record
+        if replay_dir:
+            os.environ['BAOSTOCK_REPLAY_DIR'] = os.path.abspath(replay_dir)
+    if offline_replay:
+        # 回放的缓存 / 报告 / 数据库都在录制目录下的 scratch/（stock_config.REPLAY_SCRATCH_DIR），
+        # 每次从空目录开始，不读写生产 cache/，回放耗时可重复
+        import shutil
+        from spiders.stock_config import REPLAY_SCRATCH_DIR
+        shutil.rmtree(REPLAY_SCRATCH_DIR, ignore_errors=True)
+        os.makedirs(REPLAY_SCRATCH_DIR, exist_ok=True)
     
     # 根据参数确定运行日期
     date_specified = False  # 标记是否明确指定了日期
@@ -703,8 +734,11 @@ if __name__ == "__main__":
     
     log_to_file(log_file, f"[STEP 1] 日志文件初始化完成，运行模式: {date_desc}的数据 ({target_date})")
 
-    # 先等网络恢复，避免唤醒后长时间卡在网络调用
-    wait_for_network(log_file=log_file, max_checks=60)
+    # 先等网络恢复，避免唤醒后长时间卡在网络调用（回放模式不联网）
+    if offline_replay:
+        log_to_file(log_file, "[STEP 2] baostock 回放模式，跳过网络检查")
+    else:
+        wait_for_network(log_file=log_file, max_checks=60)
 
     # 检查并更新股票列表（一周获取一次）
     log_to_file(log_file, f"[STEP 3] 检查股票列表缓存...")
@@ -753,14 +787,14 @@ if __name__ == "__main__":
             with PinnedProgress("股票数据爬虫", pin='bottom').bind(run_logger) as pp:
                 # 如果明确指定了日期参数，传入日期参数；否则使用默认（今天）
                 if date_specified:
-                    run_stock_kline_spider_with_indicators(STOCK_CODES, target_date=target_date, stock_file_path=stock_file_path, progress=pp)
+                    run_stock_kline_spider_with_indicators(STOCK_CODES, target_date=target_date, stock_file_path=stock_file_path, progress=pp, resume=not args.fresh)
                 else:
-                    run_stock_kline_spider_with_indicators(STOCK_CODES, stock_file_path=stock_file_path, progress=pp)
+                    run_stock_kline_spider_with_indicators(STOCK_CODES, stock_file_path=stock_file_path, progress=pp, resume=not args.fresh)
         else:
             if date_specified:
-                run_stock_kline_spider_with_indicators(STOCK_CODES, target_date=target_date, stock_file_path=stock_file_path, progress=None)
+                run_stock_kline_spider_with_indicators(STOCK_CODES, target_date=target_date, stock_file_path=stock_file_path, progress=None, resume=not args.fresh)
             else:
-                run_stock_kline_spider_with_indicators(STOCK_CODES, stock_file_path=stock_file_path, progress=None)
+                run_stock_kline_spider_with_indicators(STOCK_CODES, stock_file_path=stock_file_path, progress=None, resume=not args.fresh)
         log_to_file(log_file, "[STEP 5] 爬虫任务执行完成（正常退出）")
     except SystemExit as e:
         log_to_file(log_file, f"[STEP 5] 爬虫任务执行完成（SystemExit，退出码: {e.code if hasattr(e, 'code') else 'N/A'}）")
@@ -775,11 +809,18 @@ if __name__ == "__main__":
     # run_stock_kline_spider_without_indicators()
 
     # 清理超过30天的日线价格数据
-    log_to_file(log_file, "[STEP 6] 清理过期日线数据...")
-    try:
-        cleanup_old_daily_prices(days=30, log_file=log_file)
-    except Exception as e:
-        log_to_file(log_file, f"[STEP 6] [WARNING] 清理异常: {e}", also_print=False)
+    if offline_replay:
+        log_to_file(log_file, "[STEP 6] baostock 回放模式，跳过清理生产数据库中的过期日线数据")
+    else:
+        log_to_file(log_file, "[STEP 6] 清理过期日线数据...")
+        try:
+            cleanup_old_daily_prices(days=30, log_file=log_file)
+        except Exception as e:
+            log_to_file(log_file, f"[STEP 6] [WARNING] 清理异常: {e}", also_print=False)
+
+    if offline_replay:
+        log_to_file(log_file, "[STEP 7] baostock 回放模式，跳过上传报告与 SQLite 云同步")
+        sys.exit(0)
 
     # 爬虫运行完成后，上传信号分析报告到云数据库
     # 使用 try-finally 确保上传逻辑一定会执行
@@ -6,47 +6,184 @@ baostock 数据获取辅助函数
 """
 
 import os
-import random
 import socket
+import threading
 import baostock as bs
+import baostock.common.contants as cons
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # baostock 单次请求的 socket 超时（秒），防止服务端不响应时无限阻塞
 BAOSTOCK_SOCKET_TIMEOUT = 120
 
 from .stock_config import (
-    BAOSTOCK_INTER_REQUEST_JITTER_SEC,
-    BAOSTOCK_INTER_REQUEST_SLEEP_SEC,
+    BAOSTOCK_BACKEND,
+    BAOSTOCK_PIPELINE_PREFETCH,
     BAOSTOCK_RELOGIN_EVERY_N_REQUESTS,
+    KLINE_STORE_ENABLE,
+    KLINE_STORE_LOCAL_ADJUST,
+    PROFIT_CACHE_ENABLE,
 )
-
-
-def _sleep_inter_request_if_configured():
-    """每只股票任务前可选休眠，降低并发撞车导致的 Broken pipe。"""
-    base = float(BAOSTOCK_INTER_REQUEST_SLEEP_SEC or 0)
-    jitter = float(BAOSTOCK_INTER_REQUEST_JITTER_SEC or 0)
-    if base <= 0 and jitter <= 0:
-        return
-    extra = random.uniform(0, jitter) if jitter > 0 else 0.0
-    time.sleep(max(0.0, base) + extra)
+from .baostock_replay import BACKEND_LIVE, BACKEND_RECORD, create_backend
+from .kline_store import adjust_bars, fetch_adjusted_bars, fetch_bars_incremental
+from .circuit_breaker import baostock_breaker, baostock_breaker_paused
+from .data_sources import kline_router
+from .rate_limiter import acquire_baostock_token
+from .run_journal import JOURNAL_ROW_FIELDS
+from . import profit_cache
+from . import trade_calendar
 
 
 # 模块级登录状态，整个进程内只登录一次
 _BAOSTOCK_LOGGED_IN = False
 # 当前进程内已执行的 K 线 history 请求次数（用于周期性重登）
 _BAOSTOCK_KLINE_REQUEST_COUNT = 0
+# 当前进程的会话健康统计：随 worker 结果回报给主进程，用于观察登录/重登/失败次数
+_SESSION_HEALTH = {
+    'pid': None,
+    'logins': 0,       # 成功登录次数（含初始化预登录）
+    'relogins': 0,     # 因失败而重登的次数
+    'requests': 0,     # 已发出的查询请求数
+    'failures': 0,     # 被判定为会话失效的次数（网络错误 / 未登录错误码）
+    'last_error': None,
+}
+# 表示「会话已失效」的 baostock 错误码：未登录 + 全部网络类错误（100020xx）
+_SESSION_BROKEN_CODES = (cons.BSERR_NO_LOGIN,)
+_NETWORK_ERROR_PREFIX = "10002"
+
+
+# 会话锁：baostock 会话（模块级 socket）非线程安全；预取线程、多数据源竞速的执行器线程
+# 与调用线程可能同时请求，每次收发（含翻页）都在锁内进行
+_SESSION_LOCK = threading.RLock()
+
+
+# 当前进程使用的 baostock 后端（record / replay 时为包装对象，见 baostock_replay.py）
+_BAOSTOCK_BACKEND = None
+
+
+def _bs():
+    """返回 baostock 后端：live 模式即 baostock 模块本身，record / replay 模式为对应包装。"""
+    global _BAOSTOCK_BACKEND
+    if BAOSTOCK_BACKEND == BACKEND_LIVE:
+        return bs
+    if _BAOSTOCK_BACKEND is None:
+        _BAOSTOCK_BACKEND = create_backend(bs)
+    return _BAOSTOCK_BACKEND
+
+
+def get_session_health():
+    """返回当前进程 baostock 会话健康统计的副本。"""
+    health = dict(_SESSION_HEALTH)
+    health['pid'] = os.getpid()
+    health['logged_in'] = _BAOSTOCK_LOGGED_IN
+    return health
+
+
+def init_baostock_worker():
+    """
+    进程池 initializer：子进程启动时预登录一次，之后整个进程生命周期复用该会话。
+
+    fork 出来的子进程会继承主进程的登录标记和 socket，不能与主进程共用，
+    这里先清空继承的状态再重新登录。登录失败不抛出（initializer 抛错会让整个进程池不可用），
+    首次查询时会按需重试登录。
+    """
+    global _BAOSTOCK_LOGGED_IN, _BAOSTOCK_KLINE_REQUEST_COUNT
+    _BAOSTOCK_LOGGED_IN = False
+    _BAOSTOCK_KLINE_REQUEST_COUNT = 0
+    for key in ('logins', 'relogins', 'requests', 'failures'):
+        _SESSION_HEALTH[key] = 0
+    _SESSION_HEALTH['last_error'] = None
+    try:
+        login_baostock()
+    except Exception as e:
+        _SESSION_HEALTH['last_error'] = str(e)
+
+
+def _mark_session_broken(reason):
+    """记录一次会话失效并丢弃当前会话，下一次查询会重新登录。"""
+    global _BAOSTOCK_LOGGED_IN
+    _SESSION_HEALTH['failures'] += 1
+    _SESSION_HEALTH['last_error'] = str(reason)
+    if not _BAOSTOCK_LOGGED_IN:
+        return
+    _BAOSTOCK_LOGGED_IN = False
+    old_timeout = socket.getdefaulttimeout()
+    socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
+    try:
+        _bs().logout()
+    except Exception:
+        pass
+    finally:
+        socket.setdefaulttimeout(old_timeout)
+
+
+def _is_session_error(error_code):
+    error_code = str(error_code or '')
+    return error_code in _SESSION_BROKEN_CODES or error_code.startswith(_NETWORK_ERROR_PREFIX)
+
+
+def _is_network_error(error_code):
+    return str(error_code or '').startswith(_NETWORK_ERROR_PREFIX)
+
+
+def _breaker_before_request():
+    """熔断期间阻塞到恢复（或持续熔断过久时抛出 BaostockUnavailable），见 circuit_breaker。"""
+    breaker = baostock_breaker()
+    if breaker is not None:
+        breaker.before_request()
+
+
+def _breaker_record(ok):
+    breaker = baostock_breaker()
+    if breaker is not None:
+        breaker.record(ok)
+
+
+def _query_baostock(method_name, *args, **kwargs):
+    """
+    统一的 baostock 查询入口：熔断期间先等待恢复，确保已登录、设置 socket 超时，并且只在「已证实的失败」时重登：
+      - 服务端返回未登录 / 网络类错误码 → 丢弃会话、重新登录后重试一次
+      - socket 超时等异常 → 丢弃会话后抛出，由调用方决定是否重试（下次调用自动重新登录）
+    返回 baostock 的 ResultData；重试后仍失败时原样返回，由调用方检查 error_code。
+    """
+    rs = None
+    for attempt in (1, 2):
+        if attempt > 1:
+            _SESSION_HEALTH['relogins'] += 1
+        _breaker_before_request()
+        acquire_baostock_token()
+        with _SESSION_LOCK:
+            login_baostock()
+            old_timeout = socket.getdefaulttimeout()
+            socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
+            try:
+                _SESSION_HEALTH['requests'] += 1
+                rs = getattr(_bs(), method_name)(*args, **kwargs)
+            except (socket.timeout, OSError) as e:
+                _breaker_record(False)
+                _mark_session_broken(e)
+                raise
+            finally:
+                socket.setdefaulttimeout(old_timeout)
+            _breaker_record(not _is_network_error(getattr(rs, 'error_code', '0')))
+            if not _is_session_error(getattr(rs, 'error_code', '0')):
+                return rs
+            _mark_session_broken(f"{rs.error_code} {getattr(rs, 'error_msg', '')}".strip())
+    return rs
 
 
 def _force_relogin_baostock():
     """logout 后重新 login，用于长连接被服务端掐断前的主动换会话。"""
     global _BAOSTOCK_LOGGED_IN
     _BAOSTOCK_LOGGED_IN = False
+    _SESSION_HEALTH['relogins'] += 1
     old_timeout = socket.getdefaulttimeout()
     socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
     try:
-        bs.logout()
+        _bs().logout()
     except Exception:
         pass
     finally:
@@ -65,6 +202,90 @@ def _maybe_relogin_every_n_kline_requests():
         _force_relogin_baostock()
 
 
+# K 线结果集中的数值列（其余为字符串列）
+_KLINE_NUMERIC_FIELDS = frozenset([
+    'open', 'high', 'low', 'close', 'preclose', 'volume',
+    'amount', 'turn', 'pctChg', 'peTTM', 'pbMRQ',
+])
+# 分钟线频率与字段：分钟线没有昨收 / 换手率 / 涨跌幅 / 估值，time 为 'YYYYMMDDHHMMSSsss'（该根 K 线的结束时刻）
+MINUTE_FREQUENCIES = ('5', '15', '30', '60')
+_MINUTE_KLINE_FIELDS = "date,time,open,high,low,close,volume,amount,adjustflag"
+# 取值固定的状态列：用固定类别的 category 存储（固定类别保证本地仓库 concat 后仍是 category）
+_KLINE_STATUS_DTYPE = pd.CategoricalDtype(['0', '1'])
+_KLINE_CATEGORY_FIELDS = {'tradestatus': _KLINE_STATUS_DTYPE, 'isST': _KLINE_STATUS_DTYPE}
+
+
+def _drain_result_rows(rs):
+    """
+    一次性取出 baostock 结果集的全部行：按页整体拿 rs.data，不逐行调用 get_row_data()。
+    与 while rs.next(): rs.get_row_data() 等价（含翻页）。
+    """
+    rows = []
+    while True:
+        data = rs.data or []
+        if rs.cur_row_num < len(data):
+            rows.extend(data[rs.cur_row_num:] if rs.cur_row_num else data)
+            rs.cur_row_num = len(data)
+        # 当前页已取完：满页时 next() 会请求下一页并重置 cur_row_num
+        with _SESSION_LOCK:
+            has_next = rs.next()
+        if not has_next:
+            return rows
+
+
+def _to_numeric_array(values):
+    """
+    字符串序列 → 数值数组，语义同 pd.to_numeric(errors='coerce')：
+    全部为整数字面量时得到 int64，否则 float64；空串等非法值为 NaN。
+    """
+    arr = np.asarray(values, dtype=object)
+    missing = arr == ''
+    has_missing = bool(missing.any())
+    if not has_missing:
+        try:
+            return arr.astype(np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        if has_missing:
+            arr = np.where(missing, 'nan', arr)
+        return arr.astype(np.float64)
+    except ValueError:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy()
+
+
+def _kline_rows_to_frame(rows, fields):
+    """
+    批量把 K 线结果行转为带类型的 DataFrame：按列一次性解析数值（避免 object 列 + 逐列 to_numeric），
+    状态列为 category，code 列为 category，date 列转为已排序的 DatetimeIndex；
+    分钟线（含 time 列）以 time 为索引。
+    """
+    columns = dict(zip(fields, zip(*rows)))
+    data = {}
+    for field in fields:
+        if field in ('date', 'time'):
+            continue
+        values = columns[field]
+        if field in _KLINE_NUMERIC_FIELDS:
+            data[field] = _to_numeric_array(values)
+        elif field in _KLINE_CATEGORY_FIELDS:
+            data[field] = pd.Categorical(values, dtype=_KLINE_CATEGORY_FIELDS[field])
+        elif field == 'code':
+            data[field] = pd.Categorical(values)
+        else:
+            data[field] = np.asarray(values, dtype=object)
+    if 'time' in columns:
+        index = pd.DatetimeIndex(pd.to_datetime(columns['time'], format='%Y%m%d%H%M%S%f'), name='time')
+    elif 'date' in columns:
+        index = pd.DatetimeIndex(pd.to_datetime(columns['date'], format='%Y-%m-%d'), name='date')
+    else:
+        index = None
+    df = pd.DataFrame(data, index=index)
+    if index is not None and not df.index.is_monotonic_increasing:
+        df.sort_index(inplace=True)
+    return df
+
+
 def parse_stock_list_line(line):
     """解析 stock_list.txt 单行：兼容仅代码，或「代码\\t名称」（列表更新时写入）。"""
     if line is None:
@@ -132,16 +353,26 @@ def login_baostock():
     if _BAOSTOCK_LOGGED_IN:
         return True
 
+    _breaker_before_request()
+    acquire_baostock_token()
     old_timeout = socket.getdefaulttimeout()
     socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
     try:
-        lg = bs.login()
+        lg = _bs().login()
+        # 登录成功不作为服务恢复的依据（探测以实际查询为准），只回报网络类失败
+        if _is_network_error(lg.error_code):
+            _breaker_record(False)
         if lg.error_code != '0':
             raise Exception(f"baostock登录失败: {lg.error_msg}")
         _BAOSTOCK_LOGGED_IN = True
+        _SESSION_HEALTH['logins'] += 1
         return True
     except socket.timeout:
+        _breaker_record(False)
         raise Exception("baostock登录超时")
+    except OSError:
+        _breaker_record(False)
+        raise
     finally:
         socket.setdefaulttimeout(old_timeout)
 
@@ -150,19 +381,39 @@ def logout_baostock():
     """登出baostock（如需要可在程序结束时手动调用）"""
     global _BAOSTOCK_LOGGED_IN
     if _BAOSTOCK_LOGGED_IN:
-        bs.logout()
+        _bs().logout()
         _BAOSTOCK_LOGGED_IN = False
 
 
+def _fetch_trade_calendar_rows(start_date, end_date):
+    """query_trade_dates 拉取 [start_date, end_date] 的日历行 [(日期, '0'/'1')]；失败返回 None。"""
+    rs = _query_baostock('query_trade_dates', start_date=start_date, end_date=end_date)
+    if rs.error_code != "0":
+        return None
+    return [(row[0], row[1]) for row in _drain_result_rows(rs) if len(row) >= 2]
+
+
+def ensure_trade_calendar(end_date=None, start_date=None):
+    """
+    确保本地交易日历覆盖到 end_date（默认今天），只请求缺失区间；失败不抛出。
+
+    返回:
+        bool: 日历是否已覆盖
+    """
+    try:
+        return trade_calendar.update_calendar(_fetch_trade_calendar_rows, end_date, start_date)
+    except Exception:
+        return False
+
+
 def _get_trade_days_baostock(before_date=None, back_days=30):
     """
-    用 query_trade_dates 获取「最近若干个交易日」，从新到旧排序。
+    获取「最近若干个交易日」，从新到旧排序；优先查本地交易日历，日历无法覆盖时才直接 query_trade_dates。
     before_date: 不晚于该日期，默认今天；格式 YYYY-MM-DD 或 datetime
     back_days: 向前查询的日历天数
     返回: list['YYYY-MM-DD']，空列表表示失败
     """
     from datetime import timedelta
-    login_baostock()
     if before_date is None:
         end = datetime.now()
     elif isinstance(before_date, str):
@@ -172,14 +423,12 @@ def _get_trade_days_baostock(before_date=None, back_days=30):
     start = end - timedelta(days=max(1, back_days))
     start_str = start.strftime("%Y-%m-%d")
     end_str = end.strftime("%Y-%m-%d")
-    rs = bs.query_trade_dates(start_date=start_str, end_date=end_str)
-    if rs.error_code != "0":
+    if ensure_trade_calendar(end_str, start_str):
+        return [d for d in trade_calendar.previous_trading_days(end_str, back_days + 1) if d >= start_str]
+    rows = _fetch_trade_calendar_rows(start_str, end_str)
+    if rows is None:
         return []
-    trading_dates = []
-    while rs.next():
-        row = rs.get_row_data()
-        if len(row) >= 2 and row[1] == "1":
-            trading_dates.append(row[0])
+    trading_dates = [d for d, flag in rows if flag == "1"]
     trading_dates.sort(reverse=True)  # 从新到旧
     return trading_dates
 
@@ -220,18 +469,13 @@ def get_stock_list_baostock_entries(day=None, a_share_only=True, try_days=10):
     """
     from datetime import timedelta
 
-    login_baostock()
-
     def query_one_day(day_str):
         if len(day_str) == 8:
             day_str = f"{day_str[:4]}-{day_str[4:6]}-{day_str[6:8]}"
-        rs = bs.query_all_stock(day=day_str)
+        rs = _query_baostock('query_all_stock', day=day_str)
         if rs.error_code != "0":
             raise RuntimeError(f"baostock query_all_stock 失败: {rs.error_msg}")
-        rows = []
-        while rs.next():
-            rows.append(rs.get_row_data())
-        return rows, day_str
+        return _drain_result_rows(rs), day_str
 
     if day:
         day_str = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
@@ -267,8 +511,68 @@ def get_stock_list_baostock(day=None, a_share_only=True, try_days=10):
     return [c for c, _ in get_stock_list_baostock_entries(day, a_share_only, try_days)]
 
 
+def resolve_stock_names(codes, known_names=None):
+    """
+    为一批股票一次性解析简称，替代在 worker 里逐只调用 query_stock_basic。
+
+    优先使用 known_names（通常来自 stock_list.txt 的「代码\\t名称」）；
+    仍缺简称的代码再用一次 query_all_stock 批量补齐（整个市场一次请求）。
+    若本函数内发生了登录，返回前会登出，避免主进程会话被 fork 到子进程中共用。
+
+    返回:
+        dict[str, str]: 代码 -> 简称（查不到的代码不在字典中）
+    """
+    names = {c: n for c, n in (known_names or {}).items() if n}
+    missing = [c for c in codes if c not in names]
+    if not missing:
+        return names
+    was_logged_in = _BAOSTOCK_LOGGED_IN
+    try:
+        entries = get_stock_list_baostock_entries(a_share_only=False)
+        market_names = {code: name for code, name in entries if name}
+        for c in missing:
+            if c in market_names:
+                names[c] = market_names[c]
+    except Exception:
+        pass
+    finally:
+        if not was_logged_in:
+            try:
+                logout_baostock()
+            except Exception:
+                pass
+    return names
+
+
+def get_trade_status_baostock(day):
+    """
+    一次 query_all_stock 取某交易日全市场的交易状态（用于流水线预筛，见 universe_gate）。
+    若本函数内发生了登录，返回前会登出，避免主进程会话被 fork 到子进程中共用。
+
+    返回:
+        dict[str, str]: 扁平代码（sh600000）-> tradeStatus（'1' 正常交易 / '0' 停牌）；失败返回空字典
+    """
+    was_logged_in = _BAOSTOCK_LOGGED_IN
+    try:
+        day = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
+        if len(day) == 8:
+            day = f"{day[:4]}-{day[4:6]}-{day[6:8]}"
+        rs = _query_baostock('query_all_stock', day=day)
+        if rs.error_code != "0":
+            return {}
+        return {row[0].replace(".", ""): str(row[1]) for row in _drain_result_rows(rs) if len(row) > 1}
+    except Exception:
+        return {}
+    finally:
+        if not was_logged_in:
+            try:
+                logout_baostock()
+            except Exception:
+                pass
+
+
 def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None, 
-                               frequency='d', adjustflag='3', verbose=False):
+                               frequency='d', adjustflag='3', verbose=False, raise_errors=False):
     """
     使用baostock获取K线数据
     
@@ -279,12 +583,15 @@ def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None,
         frequency: 数据类型，默认为'd'（日K线）
                   'd'=日K线, 'w'=周K线, 'm'=月K线, '5'=5分钟K线, '15'=15分钟K线, 
                   '30'=30分钟K线, '60'=60分钟K线
-        adjustflag: 复权类型，默认为'3'（前复权）
+        adjustflag: 复权类型，默认为'3'（不复权）
                    '1'=后复权, '2'=前复权, '3'=不复权
         verbose: 是否输出详细信息
+        raise_errors: True 时查询失败（错误码、超时等异常）抛出异常，只有「区间内无数据」返回 None
+                      （多数据源路由据此区分故障与空结果，见 data_sources）
     
     返回:
-        pandas.DataFrame: K线数据，包含 date, open, high, low, close, volume, amount 等列
+        pandas.DataFrame: K线数据，包含 date, open, high, low, close, volume, amount 等列；
+        分钟线以 time（K 线结束时刻）为索引，只有 open/high/low/close/volume/amount 列
     """
     try:
         # 转换股票代码格式
@@ -310,64 +617,40 @@ def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None,
             print(f"    使用baostock获取数据: {bs_code}, {start_date} 到 {end_date}")
         
         _maybe_relogin_every_n_kline_requests()
-        # 确保已登录（全局只登录一次；上面周期性重登时已登录则此处为 no-op）
-        login_baostock()
 
-        # 查询K线数据（含估值字段 peTTM/pbMRQ，省去单独的估值抓取阶段）
-        # 设置 socket 超时防止 baostock 服务端不响应时无限阻塞
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
-        try:
-            rs = bs.query_history_k_data_plus(
-                bs_code,
-                "date,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,isST,peTTM,pbMRQ",
-                start_date=start_date,
-                end_date=end_date,
-                frequency=frequency,
-                adjustflag=adjustflag
-            )
-        except socket.timeout:
-            # socket 超时，强制重置连接状态，下次调用会重新登录
-            _BAOSTOCK_LOGGED_IN = False
-            try:
-                bs.logout()
-            except Exception:
-                pass
-            raise
-        finally:
-            socket.setdefaulttimeout(old_timeout)
+        # 查询K线数据（日线含估值字段 peTTM/pbMRQ，省去单独的估值抓取阶段）
+        # _query_baostock 负责登录、socket 超时，以及会话失效时的重登
+        if str(frequency) in MINUTE_FREQUENCIES:
+            fields = _MINUTE_KLINE_FIELDS
+        else:
+            fields = "date,open,high,low,close,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,isST,peTTM,pbMRQ"
+        rs = _query_baostock(
+            'query_history_k_data_plus',
+            bs_code,
+            fields,
+            start_date=start_date,
+            end_date=end_date,
+            frequency=frequency,
+            adjustflag=adjustflag
+        )
         
         if rs.error_code != '0':
             error_msg = rs.error_msg
             if verbose:
                 print(f"    baostock查询失败: {error_msg}")
+            if raise_errors:
+                raise RuntimeError(f"baostock query_history_k_data_plus 失败: {rs.error_code} {error_msg}")
             return None
         
-        # 转换为DataFrame
-        data_list = []
-        while (rs.error_code == '0') & rs.next():
-            data_list.append(rs.get_row_data())
+        # 整页取出结果行，再按列批量解析为数值 / category / 日期索引
+        data_list = _drain_result_rows(rs)
         
         if not data_list:
             if verbose:
                 print(f"    警告: 未获取到数据")
             return None
         
-        # 创建DataFrame
-        df = pd.DataFrame(data_list, columns=rs.fields)
-        
-        # 数据类型转换
-        numeric_columns = ['open', 'high', 'low', 'close', 'preclose', 'volume', 
-                          'amount', 'turn', 'pctChg', 'peTTM', 'pbMRQ']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # 设置日期索引
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            df.set_index('date', inplace=True)
-            df.sort_index(inplace=True)
+        df = _kline_rows_to_frame(data_list, rs.fields)
         
         # 重命名列以匹配现有代码
         column_mapping = {
@@ -375,6 +658,7 @@ def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None,
             'high': 'high',
             'low': 'low',
             'close': 'close',
+            'preclose': 'preclose',  # 昨收（除权除息日为除权参考价，kline_store 据此检测除权）
             'volume': 'volume',
             'amount': 'amount',
             'pctChg': 'change_rate',  # 涨跌幅
@@ -392,14 +676,6 @@ def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None,
         # 重命名列
         df.rename(columns=column_mapping, inplace=True)
         
-        # 计算涨跌额（如果close和preclose都存在）
-        if 'preclose' in df.columns and 'close' in df.columns:
-            df['change_amount'] = df['close'] - df['preclose']
-        
-        # 计算振幅（如果high和low都存在）
-        if 'high' in df.columns and 'low' in df.columns and 'preclose' in df.columns:
-            df['amplitude'] = ((df['high'] - df['low']) / df['preclose'] * 100).round(2)
-        
         if verbose:
             print(f"    获取到 {len(df)} 条K线数据")
         
@@ -410,6 +686,8 @@ def fetch_kline_data_baostock(stock_code, start_date=None, end_date=None,
             import traceback
             print(f"    获取K线数据失败: {str(e)}")
             print(f"    错误堆栈: {traceback.format_exc()}")
+        if raise_errors:
+            raise
         return None
 
 
@@ -436,6 +714,114 @@ def fetch_kline_data_baostock_simple(stock_code, start_date=None, end_date=None,
     )
 
 
+def fetch_intraday_bars_baostock(stock_code, start_date=None, end_date=None, frequency='5', verbose=False):
+    """
+    获取分钟 K 线（不复权；复权在读取分钟线仓库时按复权因子本地计算，见 intraday_store）
+
+    参数:
+        frequency: '5' / '15' / '30' / '60'
+
+    返回:
+        pandas.DataFrame: time 索引，open/high/low/close/volume/amount 列；失败返回 None
+    """
+    if str(frequency) not in MINUTE_FREQUENCIES:
+        raise ValueError(f"不支持的分钟线频率: {frequency}")
+    return fetch_kline_data_baostock(
+        stock_code=stock_code,
+        start_date=start_date,
+        end_date=end_date,
+        frequency=str(frequency),
+        adjustflag='3',
+        verbose=verbose
+    )
+
+
+def fetch_adjust_factors_baostock(stock_code, end_date=None):
+    """
+    获取单只股票上市以来的全部复权因子。
+
+    返回:
+        pandas.DataFrame | None: 以除权除息日（dividOperateDate）为索引，列 fore（前复权因子）/
+        back（后复权因子）；从未除权时为空表；请求失败返回 None
+    """
+    try:
+        bs_code = convert_stock_code_to_baostock(stock_code)
+        if end_date and len(end_date) == 8:
+            end_date = f"{end_date[:4]}-{end_date[4:6]}-{end_date[6:8]}"
+        rs = _query_baostock(
+            'query_adjust_factor',
+            bs_code,
+            start_date='1990-01-01',
+            end_date=end_date or datetime.now().strftime("%Y-%m-%d"),
+        )
+        if rs.error_code != '0':
+            return None
+        rows = _drain_result_rows(rs)
+    except Exception:
+        return None
+    raw = pd.DataFrame(rows, columns=rs.fields)
+    factors = pd.DataFrame(
+        {
+            'fore': pd.to_numeric(raw.get('foreAdjustFactor'), errors='coerce'),
+            'back': pd.to_numeric(raw.get('backAdjustFactor'), errors='coerce'),
+        },
+        dtype=float,
+    )
+    factors.index = pd.DatetimeIndex(pd.to_datetime(raw.get('dividOperateDate'), format='%Y-%m-%d'), name='date')
+    factors = factors[~factors.index.duplicated(keep='last')]
+    return factors.dropna().sort_index()
+
+
+def fetch_daily_kline_with_store(stock_code, start_date=None, end_date=None, verbose=False):
+    """
+    日线前复权 K 线：启用本地仓库（KLINE_STORE_ENABLE）时先查仓库，只增量拉取缺失区间；
+    否则等价于 fetch_kline_data_baostock_simple。
+    KLINE_STORE_LOCAL_ADJUST 时仓库保存不复权日线，前复权由复权因子在本地计算（见 kline_store.fetch_adjusted_bars）。
+
+    返回:
+        pandas.DataFrame: [start_date, end_date] 窗口内的 K 线，失败返回 None
+    """
+    # 录制 / 回放的是 baostock 请求本身，不经多数据源路由
+    use_router = BAOSTOCK_BACKEND == BACKEND_LIVE
+
+    def _fetch_raw(code, s, e):
+        if use_router:
+            # 写入仓库的 K 线只取字段完整的数据源（仓库只追加，缺字段的行不会再被补齐）
+            return kline_router().fetch(code, s, e, adjustflag='3', full_schema=True)
+        return fetch_kline_data_baostock(code, s, e, frequency='d', adjustflag='3', verbose=verbose)
+
+    # 录制模式绕过仓库：每只股票都完整请求一次，保证回放时任意窗口都有数据
+    if not KLINE_STORE_ENABLE or BAOSTOCK_BACKEND == BACKEND_RECORD:
+        if KLINE_STORE_ENABLE and KLINE_STORE_LOCAL_ADJUST:
+            # 录制与回放时仓库请求的口径一致：不复权日线 + 复权因子
+            raw = _fetch_raw(stock_code, start_date, end_date)
+            factors = fetch_adjust_factors_baostock(stock_code, end_date) if raw is not None else None
+            return adjust_bars(raw, factors, '2') if factors is not None else None
+        if use_router:
+            return kline_router().fetch(stock_code, start_date, end_date, adjustflag='2')
+        return fetch_kline_data_baostock_simple(stock_code, start_date, end_date, verbose=verbose)
+    if not start_date:
+        end_dt = datetime.strptime(end_date[:10].replace('-', ''), "%Y%m%d") if end_date else datetime.now()
+        start_date = end_dt.replace(year=end_dt.year - 1).strftime("%Y-%m-%d")
+
+    if KLINE_STORE_LOCAL_ADJUST:
+        df = fetch_adjusted_bars(
+            stock_code, start_date, end_date, _fetch_raw, fetch_adjust_factors_baostock, adjustflag='2'
+        )
+    else:
+        def _fetch(code, s, e):
+            if use_router:
+                return kline_router().fetch(code, s, e, adjustflag='2', full_schema=True)
+            return fetch_kline_data_baostock_simple(code, s, e, verbose=verbose)
+
+        df = fetch_bars_incremental(stock_code, start_date, end_date, _fetch, adjustflag='2')
+
+    if df is None and use_router and kline_router().has_partial_sources():
+        # 字段完整的数据源都失败：由缺字段的数据源直接顶上本次窗口，不写入仓库
+        return kline_router().fetch(stock_code, start_date, end_date, adjustflag='2', full_schema=False)
+    return df
+
+
 def get_stock_name_baostock(stock_code):
     """
     使用baostock获取股票名称
@@ -448,29 +834,12 @@ def get_stock_name_baostock(stock_code):
     """
     try:
         bs_code = convert_stock_code_to_baostock(stock_code)
-        # 确保已登录（全局只登录一次）
-        login_baostock()
-
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(BAOSTOCK_SOCKET_TIMEOUT)
-        try:
-            rs = bs.query_stock_basic(code=bs_code)
-        except socket.timeout:
-            _BAOSTOCK_LOGGED_IN = False
-            try:
-                bs.logout()
-            except Exception:
-                pass
-            return None
-        finally:
-            socket.setdefaulttimeout(old_timeout)
+        rs = _query_baostock('query_stock_basic', code=bs_code)
 
         if rs.error_code != '0':
             return None
 
-        data_list = []
-        while (rs.error_code == '0') & rs.next():
-            data_list.append(rs.get_row_data())
+        data_list = _drain_result_rows(rs)
 
         if data_list and len(data_list) > 0:
             # baostock返回的字段：code, code_name, ipoDate, outDate, type, status
@@ -481,11 +850,59 @@ def get_stock_name_baostock(stock_code):
         return None
 
 
-def fetch_stock_fundamental_worker(stock_code, latest_date=None):
+def _fetch_profit_row(bs_code, year, quarter):
+    """
+    One query_profit_data call: returns the first row as a dict, {} when the quarter
+    has no data, or None when the request failed (so it is not cached as missing).
+    """
+    rs = _query_baostock('query_profit_data', code=bs_code, year=year, quarter=quarter)
+    if rs.error_code != '0':
+        return None
+    rows = _drain_result_rows(rs)
+    return dict(zip(rs.fields, rows[0])) if rows else {}
+
+
+def latest_eps_ttm(stock_code, as_of=None):
+    """
+    获取截至 as_of 最近一个已披露季度的 epsTTM（从 as_of 所在年份的四季度起，最多向前查 8 个季度）。
+
+    PROFIT_CACHE_ENABLE 时已披露的季度从本地缓存（profit_cache）读取，只请求仍在披露期内的季度。
+
+    返回:
+        float | None: 最近已披露季度的 epsTTM；都未查到返回 None
+    """
+    bs_code = convert_stock_code_to_baostock(stock_code)
+    as_of = as_of or datetime.now()
+    report_year = as_of.year
+    quarters = [
+        (report_year,     4),
+        (report_year,     3),
+        (report_year,     2),
+        (report_year,     1),
+        (report_year - 1, 4),
+        (report_year - 1, 3),
+        (report_year - 1, 2),
+        (report_year - 1, 1),
+    ]
+    if PROFIT_CACHE_ENABLE and BAOSTOCK_BACKEND != BACKEND_RECORD:
+        found = profit_cache.latest_quarter_row(
+            bs_code, as_of.date(), lambda yr, qt: _fetch_profit_row(bs_code, yr, qt), quarters
+        )
+        return found[2]['eps_ttm'] if found else None
+    for yr, qt in quarters:
+        prow = _fetch_profit_row(bs_code, yr, qt)
+        if prow:
+            return prow.get('epsTTM')  # found the latest quarter, stop regardless of eps sign
+    return None
+
+
+def fetch_stock_fundamental_worker(stock_code, latest_date=None, stock_name=None):
     """
     Worker for ProcessPoolExecutor: fetch latest K-line price + PE (via epsTTM) for one stock.
     Returns a dict with all stock_detail fields, or None on failure.
     Safe to use in spawned subprocesses (each process logs in independently).
+    stock_name: pre-resolved name (see resolve_stock_names); query_stock_basic is only
+    called when it is missing.
     """
     import math
     from datetime import timedelta
@@ -500,7 +917,6 @@ def fetch_stock_fundamental_worker(stock_code, latest_date=None):
             return default
 
     try:
-        login_baostock()
         bs_code = convert_stock_code_to_baostock(stock_code)
 
         # Resolve end_date
@@ -514,7 +930,8 @@ def fetch_stock_fundamental_worker(stock_code, latest_date=None):
         start_date = (end_dt - timedelta(days=10)).strftime("%Y-%m-%d")
 
         # --- K-line: get the most recent trading day's data ---
-        rs = bs.query_history_k_data_plus(
+        rs = _query_baostock(
+            'query_history_k_data_plus',
             bs_code,
             "date,open,high,low,close,preclose,volume,amount,turn,pctChg",
             start_date=start_date,
@@ -523,9 +940,7 @@ def fetch_stock_fundamental_worker(stock_code, latest_date=None):
             adjustflag='3',
         )
         k_fields = rs.fields
-        krows = []
-        while rs.next():
-            krows.append(dict(zip(k_fields, rs.get_row_data())))
+        krows = [dict(zip(k_fields, row)) for row in _drain_result_rows(rs)]
 
         if not krows:
             return None
@@ -547,30 +962,12 @@ def fetch_stock_fundamental_worker(stock_code, latest_date=None):
 
         # --- PE = close / epsTTM from quarterly profit data ---
         pe = None
-        report_year = end_dt.year
-        for yr, qt in [
-            (report_year,     4),
-            (report_year,     3),
-            (report_year,     2),
-            (report_year,     1),
-            (report_year - 1, 4),
-            (report_year - 1, 3),
-            (report_year - 1, 2),
-            (report_year - 1, 1),
-        ]:
-            rs_p = bs.query_profit_data(code=bs_code, year=yr, quarter=qt)
-            p_fields = rs_p.fields
-            prows = []
-            while rs_p.next():
-                prows.append(dict(zip(p_fields, rs_p.get_row_data())))
-            if prows:
-                eps_ttm = safe_float(prows[0].get('epsTTM'))
-                if eps_ttm and eps_ttm > 0:
-                    pe = round(close / eps_ttm, 2)
-                break  # found the latest quarter, stop regardless of eps sign
+        eps_ttm = safe_float(latest_eps_ttm(stock_code, end_dt))
+        if eps_ttm and eps_ttm > 0:
+            pe = round(close / eps_ttm, 2)
 
         # --- Stock name ---
-        name = get_stock_name_baostock(stock_code) or stock_code
+        name = stock_name or get_stock_name_baostock(stock_code) or stock_code
 
         return {
             'stock_id':          stock_code,
@@ -595,33 +992,30 @@ def fetch_stock_fundamental_worker(stock_code, latest_date=None):
 def fetch_one_baostock_worker(stock_code, start_date, end_date, max_retries=3, list_name=None):
     """
     供多进程调用的 worker：在独立进程中拉取单只股票 K 线 + 名称，避免 baostock SDK 线程安全问题。
-    遇到 BrokenPipeError / 连接异常时自动重试（重新登录后再请求）。
+    K 线优先取本地仓库，只增量拉取缺失区间（见 kline_store）。
+    遇到 BrokenPipeError / 连接异常时自动重试（丢弃会话，下次请求时重新登录）；
+    熔断期间失败的股票在服务恢复后重试（见 circuit_breaker）。
     返回 (stock_code, stock_name, df)，df 为 None 表示拉取失败。
-    list_name: stock_list.txt 中的简称，在 query_stock_basic 失败时作为兜底。
+    list_name: 预先解析好的简称（stock_list.txt / resolve_stock_names）；仅在缺失时才调用 query_stock_basic。
     """
-    global _BAOSTOCK_LOGGED_IN
-
-    _sleep_inter_request_if_configured()
     for attempt in range(1, max_retries + 1):
         try:
-            login_baostock()
-            df = fetch_kline_data_baostock_simple(
+            df = fetch_daily_kline_with_store(
                 stock_code=stock_code,
                 start_date=start_date,
                 end_date=end_date,
                 verbose=False,
             )
             if df is None or df.empty:
+                if attempt < max_retries and baostock_breaker_paused():
+                    # 失败发生在熔断期间（服务不可用）：下一次请求会先等到恢复，再重试本只
+                    continue
                 return (stock_code, None, None)
-            name = get_stock_name_baostock(stock_code) or (list_name if list_name else None) or stock_code
+            name = list_name or get_stock_name_baostock(stock_code) or stock_code
             return (stock_code, name, df)
         except (BrokenPipeError, ConnectionError, OSError) as e:
             if attempt < max_retries:
-                _BAOSTOCK_LOGGED_IN = False
-                try:
-                    bs.logout()
-                except Exception:
-                    pass
+                _mark_session_broken(e)
                 time.sleep(1 * attempt)
             else:
                 return (stock_code, None, None)
@@ -645,10 +1039,17 @@ def fetch_and_compute_one_baostock_worker(
       2) 计算技术指标 + 信号分析（CPU）
     主进程只负责 I/O（写文件/SQLite），避免“先全量拉取再统一计算”的峰值与内存压力。
 
-    返回：compute_signals_for_stock 的 dict（包含 df/heat_score/kdj_analysis 等）。
+    返回：compute_signals_for_stock 的 dict（包含 df/heat_score/kdj_analysis 等），
+    另附 'session'：本进程 baostock 会话健康统计（见 get_session_health），
+    'fetch_elapsed'：拉取阶段耗时（秒，供主进程调节并发）。
     """
-    from .signal_compute_worker import compute_signals_for_stock
+    fetched = _fetch_for_compute(stock_code, start_date, end_date, max_retries, list_name)
+    return _compute_fetched(fetched, indicators_config, signal_filters, current_time)
 
+
+def _fetch_for_compute(stock_code, start_date, end_date, max_retries=3, list_name=None):
+    """流水线的拉取阶段：返回 (stock_code, code, name, df, fetch_elapsed)。"""
+    fetch_started = time.time()
     code, name, df = fetch_one_baostock_worker(
         stock_code=stock_code,
         start_date=start_date,
@@ -656,16 +1057,25 @@ def fetch_and_compute_one_baostock_worker(
         max_retries=max_retries,
         list_name=list_name,
     )
+    return stock_code, code, name, df, time.time() - fetch_started
+
 
+def _compute_fetched(fetched, indicators_config, signal_filters, current_time):
+    """流水线的计算阶段：对 _fetch_for_compute 的结果计算指标与信号（不发网络请求）。"""
+    from .signal_compute_worker import compute_signals_for_stock
+
+    stock_code, code, name, df, fetch_elapsed = fetched
     if df is None or getattr(df, "empty", True):
         return {
             'stock_code': stock_code,
             'stock_name': name or stock_code,
             'skip': True,
             'reason': 'K线拉取失败',
+            'session': get_session_health(),
+            'fetch_elapsed': fetch_elapsed,
         }
 
-    return compute_signals_for_stock(
+    res = compute_signals_for_stock(
         stock_code=code,
         stock_name=name or code,
         df=df,
@@ -673,3 +1083,83 @@ def fetch_and_compute_one_baostock_worker(
         signal_filters=signal_filters,
         current_time=current_time,
     )
+    res['session'] = get_session_health()
+    res['fetch_elapsed'] = fetch_elapsed
+    return res
+
+
+# 精简回传的 K 线保留的天数：主进程更新信号价格极值只看近 30 天插入的记录（见 update_price_extremes），多留一天防跨日
+_COMPACT_DF_DAYS = 31
+
+
+def _compact_result_df(df):
+    """
+    主进程写入所需的精简 K 线：近 _COMPACT_DF_DAYS 天（至少最后一根）× 运行日志 / 估值 CSV 字段。
+    完整指标 DataFrame（数百行 × 数十列）只在子进程内用于计算，不再序列化回主进程。
+    """
+    if df is None or getattr(df, "empty", True):
+        return df
+    columns = [c for c in JOURNAL_ROW_FIELDS if c in df.columns]
+    cutoff = pd.Timestamp(datetime.now() - timedelta(days=_COMPACT_DF_DAYS)).normalize()
+    keep = np.asarray(pd.to_datetime(df.index) >= cutoff)
+    keep[-1] = True
+    return df.loc[keep, columns].copy()
+
+
+def fetch_and_compute_chunk_baostock_worker(
+    stock_codes,
+    start_date,
+    end_date,
+    indicators_config,
+    signal_filters,
+    current_time,
+    max_retries=3,
+    list_names=None,
+):
+    """
+    并行流水线 worker（按块）：在同一个子进程中依次对 stock_codes 中的每只股票完成拉取 + 计算
+    （同 fetch_and_compute_one_baostock_worker），一次性返回整块结果。
+
+    参数序列化、结果回传与主进程唤醒按块摊薄；每只股票的结果中 'df' 精简为主进程写入所需的
+    最近若干行 × 估值字段（见 _compact_result_df）。块内单只股票出错只影响该只（记为出错的 skip），
+    其余股票照常处理。
+
+    BAOSTOCK_PIPELINE_PREFETCH=True 时，拉取在本进程的一个后台线程中进行：当前股票拉取完成即开始拉取
+    下一只，与当前股票的指标计算重叠。同一时刻最多一只在拉取、一只在计算，内存不随块大小增长；
+    所有网络请求仍由同一线程串行发出，共用本进程唯一的 baostock 会话。
+
+    返回：[result, ...]，顺序与 stock_codes 一致，每项格式同 fetch_and_compute_one_baostock_worker。
+    """
+    list_names = list_names or {}
+
+    def _fetch(stock_code):
+        return _fetch_for_compute(stock_code, start_date, end_date, max_retries, list_names.get(stock_code))
+
+    fetcher = ThreadPoolExecutor(max_workers=1) if BAOSTOCK_PIPELINE_PREFETCH and len(stock_codes) > 1 else None
+    upcoming = fetcher.submit(_fetch, stock_codes[0]) if fetcher is not None else None
+    results = []
+    try:
+        for i, stock_code in enumerate(stock_codes):
+            try:
+                try:
+                    fetched = upcoming.result() if upcoming is not None else _fetch(stock_code)
+                finally:
+                    # 预取下一只：与下面的计算重叠
+                    has_next = fetcher is not None and i + 1 < len(stock_codes)
+                    upcoming = fetcher.submit(_fetch, stock_codes[i + 1]) if has_next else None
+                res = _compute_fetched(fetched, indicators_config, signal_filters, current_time)
+                if res.get('df') is not None:
+                    res['df'] = _compact_result_df(res['df'])
+            except Exception as e:
+                res = {
+                    'stock_code': stock_code,
+                    'stock_name': list_names.get(stock_code) or stock_code,
+                    'skip': True,
+                    'reason': str(e),
+                    'session': get_session_health(),
+                }
+            results.append(res)
+    finally:
+        if fetcher is not None:
+            fetcher.shutdown(wait=True)
+    return results
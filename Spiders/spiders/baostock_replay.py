@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+baostock 录制 / 回放后端：离线、可重复地跑完整流水线（性能测试用）
+
+三种模式（BAOSTOCK_BACKEND，可用环境变量或 run.py --baostock-record / --baostock-replay 指定）：
+  - live：直连 baostock（默认）
+  - record：照常请求 baostock，同时把成功的响应写入 BAOSTOCK_REPLAY_DIR
+  - replay：不联网，从 BAOSTOCK_REPLAY_DIR 读取录制的响应，可选注入延迟 / 错误 / 卡死
+
+录制内容（BAOSTOCK_REPLAY_DIR 下）：
+  - kdata/<代码>_<频率>_<复权>_<字段摘要>.json：query_history_k_data_plus，
+    同一只股票多次请求按日期合并；回放时按请求的 [start_date, end_date] 过滤，
+    因此增量拉取（kline_store）的任意窗口都能回放
+  - trade_dates.json：query_trade_dates，合并后按日期区间过滤
+  - calls/<方法>/<参数摘要>.json：其余查询（query_all_stock / query_stock_basic /
+    query_profit_data 等）按完整参数精确匹配
+
+回放返回的对象与 baostock ResultData 接口一致（error_code / error_msg / fields / data /
+cur_row_num / next() / get_row_data() / get_data()），baostock_helper 无需区分。
+
+故障注入（仅 replay）：每次请求先等待 latency ± jitter 秒；按 error_rate 返回网络类错误码
+（走会话失效 → 重登 → 重试的真实路径）；按 stall_rate 卡住 stall_seconds 秒，超过 socket 超时则
+抛 socket.timeout。是否注入由 (seed, 方法, 参数, 第几次请求) 决定，同一输入每次运行结果相同。
+"""
+
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+import pandas as pd
+
+from .stock_config import (
+    BAOSTOCK_BACKEND,
+    BAOSTOCK_REPLAY_DIR,
+    BAOSTOCK_REPLAY_ERROR_RATE,
+    BAOSTOCK_REPLAY_JITTER,
+    BAOSTOCK_REPLAY_LATENCY,
+    BAOSTOCK_REPLAY_SEED,
+    BAOSTOCK_REPLAY_STALL_RATE,
+    BAOSTOCK_REPLAY_STALL_SECONDS,
+)
+
+BACKEND_LIVE = 'live'
+BACKEND_RECORD = 'record'
+BACKEND_REPLAY = 'replay'
+
+# 注入错误时返回的错误码：网络接收错误（100020xx，baostock_helper 视为会话失效）
+_INJECTED_ERROR_CODE = "10002007"
+_INJECTED_ERROR_MSG = "网络接收错误(回放注入)"
+
+_KDATA_METHOD = 'query_history_k_data_plus'
+_TRADE_DATES_METHOD = 'query_trade_dates'
+
+
+class RecordedResultData:
+    """与 baostock ResultData 接口一致的结果集（回放 / 注入错误时返回）。"""
+
+    def __init__(self, fields=None, data=None, error_code='0', error_msg='success'):
+        self.fields = list(fields or [])
+        self.data = [list(row) for row in (data or [])]
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self.cur_row_num = 0
+
+    def next(self):
+        return self.error_code == '0' and self.cur_row_num < len(self.data)
+
+    def get_row_data(self):
+        row = self.data[self.cur_row_num]
+        self.cur_row_num += 1
+        return row
+
+    def get_data(self):
+        return pd.DataFrame(self.data, columns=self.fields)
+
+
+def _digest(obj):
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _call_key(method_name, args, kwargs):
+    """把一次调用规范化为可哈希的参数描述（位置参数与关键字参数分开保存）。"""
+    return {'method': method_name, 'args': list(args), 'kwargs': dict(sorted(kwargs.items()))}
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, payload):
+    """原子写入（临时文件 + os.replace），多进程同时录制也不会留下半个文件。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _dash_date(d):
+    if not d:
+        return None
+    d = str(d)
+    if len(d) == 8 and d.isdigit():
+        return f"{d[:4]}-{d[4:6]}-{d[6:8]}"
+    return d[:10]
+
+
+def _filter_by_date(fields, rows, date_field, start_date, end_date):
+    if date_field not in fields:
+        return rows
+    idx = fields.index(date_field)
+    start_date, end_date = _dash_date(start_date), _dash_date(end_date)
+    return [
+        row for row in rows
+        if (not start_date or row[idx] >= start_date) and (not end_date or row[idx] <= end_date)
+    ]
+
+
+def _merge_rows(fields, old_rows, new_rows, date_field):
+    """按日期合并录制行（新请求覆盖旧值），保持日期升序。"""
+    if date_field not in fields:
+        return new_rows
+    idx = fields.index(date_field)
+    merged = {row[idx]: row for row in old_rows}
+    merged.update((row[idx], row) for row in new_rows)
+    return [merged[d] for d in sorted(merged)]
+
+
+def _drain_pages(rs):
+    """
+    取出 baostock 结果集全部分页的行（同 baostock_helper._drain_result_rows；调用方已持有会话锁）。
+    ResultData.next() 翻页时会用下一页替换 rs.data，录制必须在交给调用方之前取完所有页。
+    """
+    rows = []
+    while True:
+        data = rs.data or []
+        if rs.cur_row_num < len(data):
+            rows.extend(data[rs.cur_row_num:])
+            rs.cur_row_num = len(data)
+        if not rs.next():
+            return rows
+
+
+class _RecordStore:
+    """录制目录的读写：K 线与交易日按日期区间合并 / 过滤，其余调用按参数精确匹配。"""
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def _kdata_params(args, kwargs):
+        names = ('code', 'fields', 'start_date', 'end_date', 'frequency', 'adjustflag')
+        params = dict(zip(names, args))
+        params.update(kwargs)
+        params.setdefault('frequency', 'd')
+        params.setdefault('adjustflag', '3')
+        return params
+
+    def _kdata_path(self, params):
+        fields = str(params.get('fields', '')).replace(' ', '')
+        name = f"{params.get('code')}_{params['frequency']}_{params['adjustflag']}_{_digest(fields)[:8]}.json"
+        return os.path.join(self.root, 'kdata', name)
+
+    def _call_path(self, method_name, key):
+        return os.path.join(self.root, 'calls', method_name, f"{_digest(key)}.json")
+
+    def save(self, method_name, args, kwargs, rs):
+        fields = list(getattr(rs, 'fields', None) or [])
+        rows = [list(row) for row in (getattr(rs, 'data', None) or [])]
+        if method_name == _KDATA_METHOD:
+            path = self._kdata_path(self._kdata_params(args, kwargs))
+            old = _read_json(path) or {}
+            if old.get('fields') == fields:
+                rows = _merge_rows(fields, old.get('rows', []), rows, 'date')
+            _write_json(path, {'fields': fields, 'rows': rows})
+        elif method_name == _TRADE_DATES_METHOD:
+            path = os.path.join(self.root, 'trade_dates.json')
+            old = _read_json(path) or {}
+            if old.get('fields') == fields:
+                rows = _merge_rows(fields, old.get('rows', []), rows, 'calendar_date')
+            _write_json(path, {'fields': fields, 'rows': rows})
+        else:
+            key = _call_key(method_name, args, kwargs)
+            _write_json(self._call_path(method_name, key), {'call': key, 'fields': fields, 'rows': rows})
+
+    def load(self, method_name, args, kwargs):
+        """返回 RecordedResultData；未录制的调用返回空结果（等同于该参数下服务端无数据）。"""
+        if method_name == _KDATA_METHOD:
+            params = self._kdata_params(args, kwargs)
+            payload = _read_json(self._kdata_path(params)) or {}
+            fields = payload.get('fields') or str(params.get('fields', '')).replace(' ', '').split(',')
+            rows = _filter_by_date(fields, payload.get('rows', []), 'date',
+                                   params.get('start_date'), params.get('end_date'))
+            return RecordedResultData(fields, rows)
+        if method_name == _TRADE_DATES_METHOD:
+            params = dict(zip(('start_date', 'end_date'), args))
+            params.update(kwargs)
+            payload = _read_json(os.path.join(self.root, 'trade_dates.json')) or {}
+            fields = payload.get('fields') or ['calendar_date', 'is_trading_day']
+            rows = _filter_by_date(fields, payload.get('rows', []), 'calendar_date',
+                                   params.get('start_date'), params.get('end_date'))
+            return RecordedResultData(fields, rows)
+        payload = _read_json(self._call_path(method_name, _call_key(method_name, args, kwargs)))
+        if payload is None:
+            return RecordedResultData()
+        return RecordedResultData(payload.get('fields'), payload.get('rows'))
+
+
+class RecordingBackend:
+    """透传到真实 baostock，并把成功的查询结果写入录制目录。"""
+
+    mode = BACKEND_RECORD
+
+    def __init__(self, live_bs, root):
+        self._bs = live_bs
+        self._store = _RecordStore(root)
+
+    def login(self, *args, **kwargs):
+        return self._bs.login(*args, **kwargs)
+
+    def logout(self, *args, **kwargs):
+        return self._bs.logout(*args, **kwargs)
+
+    def __getattr__(self, method_name):
+        func = getattr(self._bs, method_name)
+        if not method_name.startswith('query_'):
+            return func
+
+        def _recorded(*args, **kwargs):
+            rs = func(*args, **kwargs)
+            if getattr(rs, 'error_code', None) != '0':
+                return rs
+            # 先取完全部分页（query_all_stock 等超过一页），录制并返回完整结果
+            rs = RecordedResultData(rs.fields, _drain_pages(rs), rs.error_code, rs.error_msg)
+            try:
+                self._store.save(method_name, args, kwargs, rs)
+            except OSError:
+                # 录制失败不影响正常拉取
+                pass
+            return rs
+
+        return _recorded
+
+
+class ReplayBackend:
+    """从录制目录回放 baostock 查询，按配置注入延迟 / 错误 / 卡死。"""
+
+    mode = BACKEND_REPLAY
+
+    def __init__(self, root, latency=0.0, jitter=0.0, error_rate=0.0,
+                 stall_rate=0.0, stall_seconds=0.0, seed=0):
+        self._store = _RecordStore(root)
+        self.latency = max(0.0, float(latency))
+        self.jitter = max(0.0, float(jitter))
+        self.error_rate = max(0.0, float(error_rate))
+        self.stall_rate = max(0.0, float(stall_rate))
+        self.stall_seconds = max(0.0, float(stall_seconds))
+        self.seed = int(seed)
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, method_name, args, kwargs):
+        """同一 (seed, 调用, 第几次) 得到同一随机序列：故障注入与调度顺序无关、可重复。"""
+        key = _digest(_call_key(method_name, args, kwargs))
+        with self._lock:
+            n = self._attempts.get(key, 0)
+            self._attempts[key] = n + 1
+        return random.Random(f"{self.seed}:{key}:{n}")
+
+    def _inject(self, rng):
+        """按配置等待 / 卡死；返回 True 表示本次请求应返回注入的错误码。"""
+        delay = self.latency
+        if self.jitter:
+            delay = max(0.0, delay + rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+        if self.stall_rate and rng.random() < self.stall_rate:
+            timeout = socket.getdefaulttimeout()
+            if timeout is not None and self.stall_seconds >= timeout:
+                time.sleep(timeout)
+                raise socket.timeout("timed out (回放注入卡死)")
+            time.sleep(self.stall_seconds)
+        return bool(self.error_rate) and rng.random() < self.error_rate
+
+    def login(self, *args, **kwargs):
+        return RecordedResultData()
+
+    def logout(self, *args, **kwargs):
+        return RecordedResultData()
+
+    def __getattr__(self, method_name):
+        if not method_name.startswith('query_'):
+            raise AttributeError(method_name)
+
+        def _replayed(*args, **kwargs):
+            if self._inject(self._rng(method_name, args, kwargs)):
+                return RecordedResultData(error_code=_INJECTED_ERROR_CODE, error_msg=_INJECTED_ERROR_MSG)
+            return self._store.load(method_name, args, kwargs)
+
+        return _replayed
+
+
+def create_backend(live_bs, mode=None, root=None):
+    """
+    按模式返回 baostock 后端：live 原样返回 live_bs，record / replay 返回对应包装。
+
+    参数:
+        live_bs: 真实的 baostock 模块
+        mode: 'live' / 'record' / 'replay'，默认取 BAOSTOCK_BACKEND
+        root: 录制目录，默认取 BAOSTOCK_REPLAY_DIR
+    """
+    mode = (mode or BAOSTOCK_BACKEND or BACKEND_LIVE).lower()
+    root = root or BAOSTOCK_REPLAY_DIR
+    if mode == BACKEND_RECORD:
+        return RecordingBackend(live_bs, root)
+    if mode == BACKEND_REPLAY:
+        return ReplayBackend(
+            root,
+            latency=BAOSTOCK_REPLAY_LATENCY,
+            jitter=BAOSTOCK_REPLAY_JITTER,
+            error_rate=BAOSTOCK_REPLAY_ERROR_RATE,
+            stall_rate=BAOSTOCK_REPLAY_STALL_RATE,
+            stall_seconds=BAOSTOCK_REPLAY_STALL_SECONDS,
+            seed=BAOSTOCK_REPLAY_SEED,
+        )
+    if mode != BACKEND_LIVE:
+        raise ValueError(f"未知的 BAOSTOCK_BACKEND: {mode}（可选 live / record / replay）")
+    return live_bs
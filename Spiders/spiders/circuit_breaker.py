@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跨进程熔断：baostock 服务不可用时所有拉取进程一起暂停，定期放行一个探测请求，恢复后自动继续
+
+没有熔断时，服务端宕机 / 拒绝连接会让每个子进程各自对每只股票耗尽重试与 socket 超时，
+一次故障的代价被放大为「超时 × 股票数」。这里把请求结果分为：
+  - 网络类失败：socket 超时 / 连接异常、网络类错误码（100020xx）→ 计入失败
+  - 其余（成功、数据类错误码、未登录等服务端有响应的情况）→ 计入成功
+状态机（状态保存在 BAOSTOCK_BREAKER_STATE_FILE，fcntl 文件锁互斥，所有进程共享）：
+  - closed：近 window 秒内请求数 ≥ min_calls 且失败占比 ≥ failure_ratio → open
+  - open：所有请求在发出前阻塞等待，暂停 pause 秒后进入 half_open
+  - half_open：只放行一个探测请求（其余继续等待）；成功 → closed，失败 → open 且暂停时长翻倍（不超过 max_pause）
+连续熔断超过 give_up_seconds 后不再等待：请求直接抛出 BaostockUnavailable（ConnectionError），
+由调用方按拉取失败处理；探测仍按间隔进行，服务恢复后自动关闭。
+
+无 fcntl 的平台（Windows）退化为进程内熔断。
+"""
+
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from .stock_config import (
+    BAOSTOCK_BREAKER_ENABLE,
+    BAOSTOCK_BREAKER_FAILURE_RATIO,
+    BAOSTOCK_BREAKER_GIVE_UP_SECONDS,
+    BAOSTOCK_BREAKER_MAX_PAUSE,
+    BAOSTOCK_BREAKER_MIN_CALLS,
+    BAOSTOCK_BREAKER_PAUSE,
+    BAOSTOCK_BREAKER_STATE_FILE,
+    BAOSTOCK_BREAKER_WINDOW,
+)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 等待期间重新检查状态的间隔（秒）
+_POLL_SECONDS = 1.0
+
+
+class BaostockUnavailable(ConnectionError):
+    """熔断持续超过 give_up_seconds：不再等待，请求直接失败。"""
+
+
+class CircuitBreaker:
+    """基于文件锁的跨进程熔断器；同一 state_file 的所有实例共享同一状态。"""
+
+    def __init__(self, state_file, window=60, min_calls=10, failure_ratio=0.5,
+                 pause=5.0, max_pause=120.0, give_up_seconds=1800, probe_timeout=130.0):
+        self.state_file = state_file
+        self.window = float(window)
+        self.min_calls = int(min_calls)
+        self.failure_ratio = float(failure_ratio)
+        self.pause = float(pause)
+        self.max_pause = max(float(max_pause), self.pause)
+        self.give_up_seconds = float(give_up_seconds)
+        self.probe_timeout = float(probe_timeout)
+        self._local_state = None  # 无 fcntl 时的进程内状态
+
+    def _initial(self):
+        return {'state': CLOSED, 'buckets': {}, 'opened_at': None, 'open_until': None,
+                'backoff': self.pause, 'probe_pid': None, 'probe_deadline': None,
+                'trips': 0, 'updated': time.time()}
+
+    def _update(self, fn, write=True):
+        """在锁内读取状态、调用 fn(state, now) 修改并写回（write=False 时只读），返回 fn 的返回值。"""
+        if fcntl is not None:
+            try:
+                return self._update_shared(fn, write)
+            except OSError:
+                pass  # 状态文件不可写（只读目录等）时退化为进程内熔断
+        if self._local_state is None:
+            self._local_state = self._initial()
+        return fn(self._local_state, time.time())
+
+    def _update_shared(self, fn, write):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(self.state_file, "a+") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or 'null') or self._initial()
+                except ValueError:
+                    state = self._initial()
+                now = time.time()
+                # 上次运行遗留的熔断状态：长时间无人更新则视为已恢复
+                if state['state'] != CLOSED and now - state.get('updated', 0) > self.max_pause + self.probe_timeout:
+                    state = self._initial()
+                result = fn(state, now)
+                if write:
+                    state['updated'] = now
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return result
+
+    def _trip(self, state, now, backoff):
+        if state['state'] == CLOSED:
+            state['opened_at'] = now
+            state['trips'] = state.get('trips', 0) + 1
+        state['state'] = OPEN
+        state['backoff'] = min(self.max_pause, backoff)
+        state['open_until'] = now + state['backoff']
+        state['probe_pid'] = None
+        state['probe_deadline'] = None
+        state['buckets'] = {}
+
+    def _close(self, state):
+        trips = state.get('trips', 0)
+        state.update(self._initial())
+        state['trips'] = trips
+
+    def before_request(self):
+        """请求发出前调用：熔断期间阻塞等待；half_open 时只有持有探测权的进程会返回。"""
+        pid = os.getpid()
+
+        def _check(state, now):
+            if state['state'] == CLOSED:
+                return 0.0
+            if state['state'] == OPEN and now >= state['open_until']:
+                state['state'] = HALF_OPEN
+                state['probe_pid'] = pid
+                state['probe_deadline'] = now + self.probe_timeout
+                return 0.0
+            if state['state'] == HALF_OPEN:
+                if state['probe_pid'] == pid:
+                    return 0.0
+                if now > (state['probe_deadline'] or 0):
+                    # 探测进程未回报（被杀 / 卡死）：由本进程接手探测
+                    state['probe_pid'] = pid
+                    state['probe_deadline'] = now + self.probe_timeout
+                    return 0.0
+            if self.give_up_seconds > 0 and now - (state['opened_at'] or now) > self.give_up_seconds:
+                return None
+            return max(0.0, (state['open_until'] or now) - now) or _POLL_SECONDS
+
+        while True:
+            wait = self._update(_check)
+            if wait is None:
+                raise BaostockUnavailable("baostock 熔断中（服务持续不可用），请求直接失败")
+            if wait <= 0:
+                return
+            time.sleep(min(wait, _POLL_SECONDS))
+
+    def record(self, ok):
+        """回报一次请求结果：ok=False 表示网络类失败。"""
+        pid = os.getpid()
+
+        def _record(state, now):
+            if state['state'] == HALF_OPEN and state['probe_pid'] == pid:
+                if ok:
+                    self._close(state)
+                else:
+                    self._trip(state, now, state['backoff'] * 2)
+                return
+            if state['state'] != CLOSED:
+                return  # 熔断前已发出的请求：不影响状态
+            buckets = state['buckets']
+            second = str(int(now))
+            counts = buckets.setdefault(second, [0, 0])
+            counts[0 if ok else 1] += 1
+            horizon = now - self.window
+            for key in [k for k in buckets if int(k) < horizon]:
+                del buckets[key]
+            if ok:
+                return
+            total = sum(a + b for a, b in buckets.values())
+            failed = sum(b for _, b in buckets.values())
+            if total >= self.min_calls and failed >= total * self.failure_ratio:
+                self._trip(state, now, self.pause)
+
+        self._update(_record)
+
+    def snapshot(self):
+        """当前状态（只读副本）：{'state', 'open_until', 'trips', ...}。"""
+        return self._update(lambda state, now: dict(state, buckets=None), write=False)
+
+
+_BAOSTOCK_BREAKER = None
+
+
+def baostock_breaker():
+    """全局共享的 baostock 熔断器；BAOSTOCK_BREAKER_ENABLE=False 时返回 None。"""
+    global _BAOSTOCK_BREAKER
+    if not BAOSTOCK_BREAKER_ENABLE:
+        return None
+    if _BAOSTOCK_BREAKER is None:
+        from .baostock_helper import BAOSTOCK_SOCKET_TIMEOUT
+        _BAOSTOCK_BREAKER = CircuitBreaker(
+            BAOSTOCK_BREAKER_STATE_FILE,
+            window=BAOSTOCK_BREAKER_WINDOW,
+            min_calls=BAOSTOCK_BREAKER_MIN_CALLS,
+            failure_ratio=BAOSTOCK_BREAKER_FAILURE_RATIO,
+            pause=BAOSTOCK_BREAKER_PAUSE,
+            max_pause=BAOSTOCK_BREAKER_MAX_PAUSE,
+            give_up_seconds=BAOSTOCK_BREAKER_GIVE_UP_SECONDS,
+            probe_timeout=BAOSTOCK_SOCKET_TIMEOUT + 10,
+        )
+    return _BAOSTOCK_BREAKER
+
+
+def baostock_breaker_paused():
+    """主进程用：熔断器当前是否处于暂停（open / half_open）状态。"""
+    breaker = baostock_breaker()
+    if breaker is None:
+        return False
+    try:
+        return breaker.snapshot()['state'] != CLOSED
+    except OSError:
+        return False
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+日线 K 线多数据源：统一输出结构，按健康度与延迟选源，失败切换，慢请求时竞速
+
+数据源（KLINE_SOURCES 中按名称配置）：
+  - 'baostock'：fetch_kline_data_baostock（主数据源，字段最全；查询失败抛异常，见 raise_errors）
+  - 'eastmoney'：东方财富 K 线接口（KLINE_API，urllib 直连，无估值 / 停牌 / ST 字段，full_schema=False）
+  - 'local:<目录>'：本地替身数据源，读取 <目录>/<代码>.pkl 或 <代码>.csv 中的 K 线（测试与回放用）
+所有数据源的输出都经 normalize_kline_frame 统一为 fetch_kline_data_baostock 的结构：
+date 索引（升序、无重复）+ KLINE_COLUMNS 列，数据源缺少的列为空值。
+缺字段（full_schema=False）的 K 线会让 ST / 停牌 / 估值过滤失效，不能写入只追加的本地仓库：
+仓库路径只向字段完整的数据源请求，都失败时才由缺字段的数据源直接顶上（见 fetch_daily_kline_with_store）。
+
+KlineSourceRouter 的选源规则：
+  - 冷却中的数据源（连续失败后按指数退避暂停）排在最后，仅在其余数据源都失败时才尝试
+  - 其余字段完整的数据源在前、缺字段的在后，同类之间按平滑延迟升序（尚无样本的按配置顺序优先，保证每个数据源都会被试到）
+  - 首选源失败（抛异常）或无数据即依次切换到下一个；只有异常计入失败与冷却
+  - 竞速（KLINE_SOURCE_RACE）：首选源超过「平滑延迟 × 倍数」（不低于 MIN_SECONDS）仍未返回时，
+    同时向下一个数据源发出请求，先返回有效数据者生效；慢的一方完成后仍计入健康统计
+竞速时每个数据源固定在自己的单线程执行器上调用，同一数据源不会被并发调用（baostock 会话非线程安全）。
+统计与执行器按进程维护（fork 出的子进程各自重建）。
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .stock_config import (
+    HEADERS,
+    KLINE_API,
+    KLINE_SOURCE_COOLDOWN,
+    KLINE_SOURCE_MAX_COOLDOWN,
+    KLINE_SOURCE_RACE,
+    KLINE_SOURCE_RACE_MIN_SECONDS,
+    KLINE_SOURCE_RACE_MULTIPLIER,
+    KLINE_SOURCES,
+    STOCK_PREFIX_MAP,
+)
+
+# 统一的日线列（与 fetch_kline_data_baostock 的输出一致）
+KLINE_COLUMNS = (
+    'open', 'high', 'low', 'close', 'preclose', 'volume', 'amount', 'change_rate', 'turnover',
+    'trade_status', 'is_st', 'peTTM', 'pbMRQ',
+)
+_STATUS_COLUMNS = ('trade_status', 'is_st')
+_STATUS_DTYPE = pd.CategoricalDtype(['0', '1'])
+
+# baostock adjustflag → 东方财富 fqt
+_EASTMONEY_FQT = {'3': KLINE_API['fqt']['none'], '2': KLINE_API['fqt']['forward'], '1': KLINE_API['fqt']['backward']}
+# 东方财富 K 线字段顺序（fields2=f51..f61）
+_EASTMONEY_FIELDS = ('date', 'open', 'close', 'high', 'low', 'volume', 'amount',
+                     'amplitude', 'change_rate', 'change_amount', 'turnover')
+
+
+def normalize_kline_frame(df):
+    """把任一数据源的日线转为统一结构；无数据返回 None。"""
+    if df is None or getattr(df, 'empty', True):
+        return None
+    if (tuple(df.columns) == KLINE_COLUMNS and isinstance(df.index, pd.DatetimeIndex)
+            and df.index.is_unique and df.index.is_monotonic_increasing
+            and all(df[col].dtype == _STATUS_DTYPE for col in _STATUS_COLUMNS)):
+        return df  # 已是统一结构（baostock 日线）
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df = df.copy()
+        df.index = pd.to_datetime(df.index)
+    df = df[~df.index.duplicated(keep='last')]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    data = {}
+    for col in KLINE_COLUMNS:
+        if col in _STATUS_COLUMNS:
+            if col in df.columns:
+                values = df[col]
+                if values.dtype != _STATUS_DTYPE:
+                    if values.dtype.kind in 'iuf':
+                        values = values.astype('Int64')  # 1.0 → '1'
+                    values = pd.Categorical(values.astype('string').to_numpy(dtype=object), dtype=_STATUS_DTYPE)
+                data[col] = values
+            else:
+                data[col] = pd.Categorical([None] * len(df), dtype=_STATUS_DTYPE)
+        elif col in df.columns:
+            data[col] = df[col].to_numpy()
+        else:
+            data[col] = np.full(len(df), np.nan)
+    return pd.DataFrame(data, index=pd.DatetimeIndex(df.index, name='date'))
+
+
+class KlineSource(ABC):
+    """
+    数据源接口：fetch() 返回统一结构的日线 DataFrame，区间内无数据返回 None，请求失败抛异常。
+    full_schema：是否提供 KLINE_COLUMNS 的全部字段（估值 / 停牌 / ST）。
+    """
+
+    name = 'base'
+    full_schema = True
+
+    @abstractmethod
+    def fetch(self, stock_code, start_date, end_date, adjustflag='2'):
+        """返回 [start_date, end_date] 的日线；无数据返回 None，失败抛异常。"""
+
+
+class BaostockKlineSource(KlineSource):
+    name = 'baostock'
+
+    def fetch(self, stock_code, start_date, end_date, adjustflag='2'):
+        from .baostock_helper import fetch_kline_data_baostock
+        return fetch_kline_data_baostock(
+            stock_code, start_date, end_date, frequency='d', adjustflag=adjustflag, raise_errors=True
+        )
+
+
+def _dash(d):
+    d = str(d)
+    return f"{d[:4]}-{d[4:6]}-{d[6:8]}" if len(d) == 8 and d.isdigit() else d[:10]
+
+
+def _eastmoney_secid(stock_code):
+    prefix = stock_code[:2]
+    if prefix in ('sh', 'sz'):
+        return f"{STOCK_PREFIX_MAP[prefix]}.{stock_code[2:]}"
+    if prefix == 'bj':
+        return f"0.{stock_code[2:]}"
+    return f"{'1' if stock_code.startswith('6') else '0'}.{stock_code}"
+
+
+class EastmoneyKlineSource(KlineSource):
+    name = 'eastmoney'
+    full_schema = False
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def fetch(self, stock_code, start_date, end_date, adjustflag='2'):
+        params = {
+            'secid': _eastmoney_secid(stock_code),
+            'fields1': 'f1,f2,f3,f4,f5,f6',
+            'fields2': KLINE_API['fields'],
+            'klt': KLINE_API['klt']['daily'],
+            'fqt': _EASTMONEY_FQT.get(str(adjustflag), KLINE_API['fqt']['forward']),
+            'ut': KLINE_API['ut'],
+            'beg': _dash(start_date).replace('-', '') if start_date else '0',
+            'end': _dash(end_date).replace('-', '') if end_date else '20500101',
+            'lmt': '1000',
+        }
+        url = f"{KLINE_API['base_url']}?" + "&".join(f"{k}={v}" for k, v in params.items())
+        req = urllib.request.Request(url, headers=HEADERS)
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode('utf-8'))
+        klines = (data.get('data') or {}).get('klines') or []
+        if not klines:
+            return None
+        rows = [line.split(',') for line in klines]
+        columns = dict(zip(_EASTMONEY_FIELDS, zip(*rows)))
+        df = pd.DataFrame(
+            {col: pd.to_numeric(pd.Series(columns[col]), errors='coerce').to_numpy()
+             for col in ('open', 'high', 'low', 'close', 'volume', 'amount', 'change_rate', 'change_amount', 'turnover')},
+            index=pd.to_datetime(pd.Series(columns['date']), format='%Y-%m-%d'),
+        )
+        # 东方财富不直接给昨收：收盘价 - 涨跌额
+        df['preclose'] = df['close'] - df.pop('change_amount')
+        # 东方财富成交量单位为手，统一为股
+        df['volume'] = df['volume'] * 100
+        return normalize_kline_frame(df)
+
+
+class LocalKlineSource(KlineSource):
+    """
+    本地替身数据源：<目录>/<代码>.pkl（DataFrame 或 kline_store 的 payload）或 <代码>.csv（首列为日期）。
+    latency / error_rate 用于模拟慢源与故障源；full_schema=False 模拟缺字段的数据源。
+    """
+
+    def __init__(self, directory, name=None, latency=0.0, error_rate=0.0, seed=0, full_schema=True):
+        self.directory = directory
+        self.name = name or f"local:{directory}"
+        self.full_schema = bool(full_schema)
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self._rng = np.random.default_rng(seed)
+
+    def _load(self, stock_code):
+        pkl = os.path.join(self.directory, f"{stock_code}.pkl")
+        if os.path.exists(pkl):
+            obj = pd.read_pickle(pkl)
+            return obj.get('df') if isinstance(obj, dict) else obj
+        csv = os.path.join(self.directory, f"{stock_code}.csv")
+        if os.path.exists(csv):
+            return pd.read_csv(csv, index_col=0, parse_dates=True)
+        return None
+
+    def fetch(self, stock_code, start_date, end_date, adjustflag='2'):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.error_rate > 0 and self._rng.random() < self.error_rate:
+            raise ConnectionError(f"{self.name} 模拟故障")
+        df = normalize_kline_frame(self._load(stock_code))
+        if df is None:
+            return None
+        if start_date:
+            df = df[df.index >= pd.Timestamp(_dash(start_date))]
+        if end_date:
+            df = df[df.index <= pd.Timestamp(_dash(end_date))]
+        return df if not df.empty else None
+
+
+def create_source(spec):
+    """按配置名称创建数据源：'baostock' / 'eastmoney' / 'local:<目录>'。"""
+    spec = str(spec).strip()
+    if spec == 'baostock':
+        return BaostockKlineSource()
+    if spec == 'eastmoney':
+        return EastmoneyKlineSource()
+    if spec.startswith('local:'):
+        return LocalKlineSource(spec[len('local:'):])
+    raise ValueError(f"未知的 K 线数据源: {spec}")
+
+
+class SourceStats:
+    """单个数据源的健康统计：平滑延迟、连续失败次数与冷却截止时间。"""
+
+    def __init__(self, ewma_alpha=0.2):
+        self.ewma_alpha = float(ewma_alpha)
+        self.latency = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.wins = 0  # 竞速中先返回的次数
+
+    def on_success(self, elapsed):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        if self.latency is None:
+            self.latency = float(elapsed)
+        else:
+            self.latency = self.ewma_alpha * float(elapsed) + (1 - self.ewma_alpha) * self.latency
+
+    def on_failure(self, cooldown, max_cooldown, now=None):
+        self.failures += 1
+        self.consecutive_failures += 1
+        pause = min(float(max_cooldown), float(cooldown) * 2 ** (self.consecutive_failures - 1))
+        self.cooldown_until = (time.time() if now is None else now) + pause
+
+    def cooling_down(self, now=None):
+        return (time.time() if now is None else now) < self.cooldown_until
+
+
+class KlineSourceRouter:
+    """按健康度 / 延迟在多个数据源之间选择、切换与竞速（见模块说明）。"""
+
+    def __init__(self, sources, race=True, race_min_seconds=3.0, race_multiplier=3.0,
+                 cooldown=30.0, max_cooldown=600.0):
+        self.sources = list(sources)
+        self.race = bool(race) and len(self.sources) > 1
+        self.race_min_seconds = float(race_min_seconds)
+        self.race_multiplier = float(race_multiplier)
+        self.cooldown = float(cooldown)
+        self.max_cooldown = float(max_cooldown)
+        self.stats = {s.name: SourceStats() for s in self.sources}
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def _ordered(self, full_schema=None):
+        """选源顺序；full_schema 为 True / False 时只取字段完整 / 缺字段的数据源。"""
+        now = time.time()
+        ranked = []
+        for pos, source in enumerate(self.sources):
+            if full_schema is not None and source.full_schema != full_schema:
+                continue
+            st = self.stats[source.name]
+            # 冷却中排最后；字段完整的在前（缺字段的再快也只作后备）；无样本的按配置顺序优先
+            ranked.append((st.cooling_down(now), not source.full_schema, st.latency is not None,
+                           st.latency or 0.0, pos, source))
+        return [item[-1] for item in sorted(ranked, key=lambda x: x[:5])]
+
+    def has_partial_sources(self):
+        return any(not source.full_schema for source in self.sources)
+
+    def _race_budget(self, source):
+        latency = self.stats[source.name].latency
+        if latency is None:
+            return self.race_min_seconds
+        return max(self.race_min_seconds, latency * self.race_multiplier)
+
+    def _call(self, source, stock_code, start_date, end_date, adjustflag):
+        """调用数据源并记入健康统计，返回统一结构的 DataFrame 或 None。"""
+        started = time.time()
+        try:
+            df = normalize_kline_frame(source.fetch(stock_code, start_date, end_date, adjustflag))
+        except Exception:
+            with self._lock:
+                self.stats[source.name].on_failure(self.cooldown, self.max_cooldown)
+            return None
+        # 无数据（停牌 / 区间内无交易 / 数据源未收录）不计为故障，只切换到下一个数据源
+        if df is not None:
+            with self._lock:
+                self.stats[source.name].on_success(time.time() - started)
+        return df
+
+    def _executor(self, source):
+        executor = self._executors.get(source.name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"kline-{source.name}")
+            self._executors[source.name] = executor
+        return executor
+
+    def fetch(self, stock_code, start_date, end_date, adjustflag='2', full_schema=None):
+        """
+        按选源规则获取日线；所有数据源都失败返回 None。
+        full_schema：True 只用字段完整的数据源（写入仓库的路径），False 只用缺字段的数据源，None 不限。
+        """
+        ordered = self._ordered(full_schema)
+        if not self.race or len(ordered) < 2:
+            for source in ordered:
+                df = self._call(source, stock_code, start_date, end_date, adjustflag)
+                if df is not None:
+                    return df
+            return None
+
+        args = (stock_code, start_date, end_date, adjustflag)
+        running = {}
+        remaining = list(ordered)
+        newest = None
+        while remaining or running:
+            if not running:
+                # 无在途请求（起始 / 前面的都失败了）：切换到下一个数据源
+                newest = remaining.pop(0)
+                running[self._executor(newest).submit(self._call, newest, *args)] = newest
+            # 最近发出的请求超过预算仍未返回时，追加下一个数据源竞速
+            timeout = self._race_budget(newest) if remaining else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                newest = remaining.pop(0)
+                running[self._executor(newest).submit(self._call, newest, *args)] = newest
+                continue
+            for future in done:
+                source = running.pop(future)
+                df = future.result()
+                if df is not None:
+                    if running:
+                        with self._lock:
+                            self.stats[source.name].wins += 1
+                    return df
+        return None
+
+    def summary(self):
+        parts = []
+        for source in self.sources:
+            st = self.stats[source.name]
+            latency = f"{st.latency:.2f}s" if st.latency is not None else "-"
+            parts.append(f"{source.name}: 成功 {st.successes} / 失败 {st.failures}，平滑延迟 {latency}，竞速胜出 {st.wins}")
+        return "；".join(parts)
+
+
+# 当前进程的路由：(pid, router)；fork 出的子进程不复用父进程的执行器线程
+_ROUTER = None
+
+
+def kline_router():
+    """按 KLINE_SOURCES 配置创建的进程级路由。"""
+    global _ROUTER
+    if _ROUTER is None or _ROUTER[0] != os.getpid():
+        router = KlineSourceRouter(
+            [create_source(spec) for spec in KLINE_SOURCES],
+            race=KLINE_SOURCE_RACE,
+            race_min_seconds=KLINE_SOURCE_RACE_MIN_SECONDS,
+            race_multiplier=KLINE_SOURCE_RACE_MULTIPLIER,
+            cooldown=KLINE_SOURCE_COOLDOWN,
+            max_cooldown=KLINE_SOURCE_MAX_COOLDOWN,
+        )
+        _ROUTER = (os.getpid(), router)
+    return _ROUTER[1]
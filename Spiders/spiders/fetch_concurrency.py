@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+baostock 拉取并发的自适应控制（AIMD：加性增、乘性减）
+
+固定进程数只能靠经验猜（实测 8 稳定、12 大量 Broken pipe），而服务端承受能力每天不同。
+这里在运行时按观察到的结果动态调整「同时在途的拉取任务数」：
+  - 每完成约 limit 个健康任务，limit + 1（加性增，逐步试探上限）
+  - 出现超时 / 卡死 / 断连 / 拉取失败，或平滑延迟明显劣化（超过基线的若干倍）时，
+    limit × decrease_factor（乘性减，迅速退让）
+  - 两次下调之间至少间隔 limit 个完成结果，避免同一波故障被重复惩罚
+
+进程池按 max_limit 创建，实际在途任务数由 limit 控制，因此调整无需重建进程池。
+
+HedgePolicy：对超过耗时预算（近期完成耗时的高分位 × 倍数）的任务在空闲 worker 上再提交一份，
+先完成者生效，单个卡住的 socket 只耽误几秒而不是等到 worker_timeout。
+
+RetryQueue：瞬时失败（拉取失败 / 超时 / 卡死）的股票按各自的指数退避时间重新放回进程池，
+与正常任务交错执行，不再等主流程结束后集中重试。
+"""
+
+import heapq
+import math
+import time
+from collections import deque
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发控制器：主进程在每个任务完成时回报结果，按 limit 决定补充多少在途任务。"""
+
+    def __init__(self, initial, min_limit=1, max_limit=8, decrease_factor=0.5,
+                 latency_ratio=3.0, min_samples=5, ewma_alpha=0.2):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.decrease_factor = float(decrease_factor)
+        self.latency_ratio = float(latency_ratio)
+        self.min_samples = int(min_samples)
+        self.ewma_alpha = float(ewma_alpha)
+
+        self._limit = float(min(self.max_limit, max(self.min_limit, int(initial))))
+        self._ewma = None          # 平滑后的单任务延迟（秒）
+        self._baseline = None      # 观察到的最佳平滑延迟，作为「健康」基线
+        self._samples = 0
+        self._since_decrease = self.limit  # 距上次下调已完成的任务数（初始允许立即下调）
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        """当前允许的在途任务数（整数）。"""
+        return int(self._limit)
+
+    def _set_limit(self, value):
+        old = self.limit
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), value))
+        return old, self.limit
+
+    def _decrease(self):
+        if self._since_decrease < max(1, self.limit):
+            return None
+        self._since_decrease = 0
+        old, new = self._set_limit(math.floor(self._limit * self.decrease_factor))
+        if old == new:
+            return None
+        self.decreases += 1
+        return (old, new)
+
+    def on_success(self, latency=None):
+        """
+        记录一次健康完成。
+
+        参数:
+            latency: 该任务的网络拉取耗时（秒），None 表示未知（只计数不参与延迟判断）
+
+        返回:
+            (old, new) | None: limit 发生变化时返回变化前后值
+        """
+        self._since_decrease += 1
+        if latency is not None and latency >= 0:
+            self._samples += 1
+            if self._ewma is None:
+                self._ewma = float(latency)
+            else:
+                self._ewma = self.ewma_alpha * float(latency) + (1 - self.ewma_alpha) * self._ewma
+            if self._samples >= self.min_samples:
+                if self._baseline is None or self._ewma < self._baseline:
+                    self._baseline = self._ewma
+                else:
+                    # 基线缓慢向当前延迟漂移：长期整体变慢（非并发所致）时不至于一直卡在最小并发
+                    self._baseline += 0.01 * (self._ewma - self._baseline)
+                if self._ewma > self._baseline * self.latency_ratio:
+                    return self._decrease()
+
+        old = self.limit
+        self._set_limit(self._limit + 1.0 / max(1.0, self._limit))
+        if self.limit != old:
+            self.increases += 1
+            return (old, self.limit)
+        return None
+
+    def on_failure(self, kind='error'):
+        """
+        记录一次失败（kind：'timeout' / 'stuck' / 'broken' / 'error'，仅用于日志区分）。
+
+        返回:
+            (old, new) | None: limit 发生变化时返回变化前后值
+        """
+        self._since_decrease += 1
+        return self._decrease()
+
+    def summary(self):
+        ewma = f"{self._ewma:.2f}s" if self._ewma is not None else "-"
+        return (f"当前并发 {self.limit}（范围 {self.min_limit}~{self.max_limit}），"
+                f"上调 {self.increases} 次，下调 {self.decreases} 次，平滑延迟 {ewma}")
+
+
+class HedgePolicy:
+    """
+    对冲（推测执行）策略：单个任务耗时超过「近期完成耗时的 percentile 分位 × multiplier」（且不低于
+    min_budget 秒）时，在另一个空闲 worker 上再提交一份，先完成者生效。
+
+    样本不足 min_samples 时不对冲；对冲总数不超过已提交任务数的 max_ratio，避免服务端整体变慢时
+    大量对冲反而加重负载。
+    """
+
+    def __init__(self, percentile=95.0, multiplier=2.0, min_samples=20, min_budget=10.0,
+                 max_ratio=0.1, window=200):
+        self.percentile = float(percentile)
+        self.multiplier = float(multiplier)
+        self.min_samples = int(min_samples)
+        self.min_budget = float(min_budget)
+        self.max_ratio = float(max_ratio)
+        self._durations = deque(maxlen=int(window))
+        self.hedges = 0
+        self.wins = 0   # 对冲副本先于原任务完成的次数
+
+    def observe(self, duration):
+        """记录一次正常完成任务的耗时（秒，提交到完成）。"""
+        if duration is not None and duration >= 0:
+            self._durations.append(float(duration))
+
+    def budget(self):
+        """当前的耗时预算（秒）；样本不足返回 None。"""
+        if len(self._durations) < self.min_samples:
+            return None
+        ordered = sorted(self._durations)
+        idx = min(len(ordered) - 1, int(math.ceil(self.percentile / 100.0 * len(ordered))) - 1)
+        return max(self.min_budget, ordered[max(0, idx)] * self.multiplier)
+
+    def allow(self, submitted):
+        """按已提交任务数判断是否还能再对冲一次。"""
+        return self.hedges < max(1, int(submitted * self.max_ratio))
+
+    def on_hedge(self):
+        self.hedges += 1
+
+    def on_hedge_won(self):
+        self.wins += 1
+
+    def summary(self):
+        budget = self.budget()
+        budget_str = f"{budget:.1f}s" if budget is not None else "-"
+        return f"对冲 {self.hedges} 次，其中副本先完成 {self.wins} 次，当前预算 {budget_str}"
+
+
+class RetryQueue:
+    """
+    瞬时失败股票的重试队列（按到期时间排序的小顶堆）。
+
+    第 n 次重试在失败后 base_delay × 2^(n-1) 秒（不超过 max_delay）到期；每只股票最多重试
+    max_attempts 次，之后 schedule() 返回 None，由调用方按最终失败处理。
+    """
+
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = int(max_attempts)
+        self.base_delay = float(base_delay)
+        self.max_delay = max(float(max_delay), self.base_delay)
+        self._heap = []       # (到期时间, 股票代码)
+        self._waiting = set()
+        self.attempts = {}    # 股票代码 -> 已安排的重试次数
+        self.given_up = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, code):
+        return code in self._waiting
+
+    def schedule(self, code, now=None):
+        """
+        安排一次重试。
+
+        返回:
+            float | None: 距到期的秒数；重试次数已用完返回 None
+        """
+        attempt = self.attempts.get(code, 0) + 1
+        if attempt > self.max_attempts:
+            self.given_up += 1
+            return None
+        self.attempts[code] = attempt
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        now = time.time() if now is None else now
+        heapq.heappush(self._heap, (now + delay, code))
+        self._waiting.add(code)
+        return delay
+
+    def pop_due(self, max_items, now=None):
+        """取出至多 max_items 只已到期的股票（最早到期的优先）。"""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and len(due) < max_items and self._heap[0][0] <= now:
+            _, code = heapq.heappop(self._heap)
+            self._waiting.discard(code)
+            due.append(code)
+        return due
+
+    def next_due_in(self, now=None):
+        """距最早一只到期的秒数（已到期为 0）；队列为空返回 None。"""
+        if not self._heap:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, self._heap[0][0] - now)
+
+    def summary(self):
+        retries = sum(self.attempts.values())
+        return (f"{len(self.attempts)} 只股票共重试 {retries} 次，"
+                f"{self.given_up} 只重试 {self.max_attempts} 次仍失败")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按股票持久化的拉取耗时 / 失败历史，用于安排拉取顺序
+
+按股票列表顺序提交时，个别一贯慢或不稳定的股票往往排在后面才暴露，拖出长尾并进入多轮末尾重试。
+这里跨运行记录每只股票的：
+  - ewma：拉取耗时的指数平滑（秒）
+  - failures：按运行衰减的失败计数（每次记录先乘以衰减系数，失败再 +1）
+schedule() 按「预期代价 = ewma + failures × 失败惩罚秒数」找出已知的慢股票（代价位于前 straggler_ratio），
+排在队列最前面并与快股票 1:1 交错：慢任务尽早开始，又不会同时占满所有 worker。
+
+状态保存为 JSON（FETCH_HISTORY_FILE），原子写入；文件缺失或损坏时按原顺序调度。
+"""
+
+import json
+import os
+import time
+
+from .stock_config import (
+    FETCH_HISTORY_FAILURE_PENALTY,
+    FETCH_HISTORY_FILE,
+    FETCH_STRAGGLER_RATIO,
+)
+
+_HISTORY_VERSION = 1
+
+
+class FetchHistory:
+    """每只股票的拉取耗时 EWMA 与衰减失败计数；主进程记录，运行结束时 save()。"""
+
+    def __init__(self, path=FETCH_HISTORY_FILE, ewma_alpha=0.3, failure_decay=0.7,
+                 failure_penalty=FETCH_HISTORY_FAILURE_PENALTY, straggler_ratio=FETCH_STRAGGLER_RATIO):
+        self.path = path
+        self.ewma_alpha = float(ewma_alpha)
+        self.failure_decay = float(failure_decay)
+        self.failure_penalty = float(failure_penalty)
+        self.straggler_ratio = float(straggler_ratio)
+        self._stats = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path=FETCH_HISTORY_FILE, **kwargs):
+        history = cls(path, **kwargs)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return history
+        if isinstance(payload, dict) and payload.get('version') == _HISTORY_VERSION:
+            history._stats = payload.get('stocks') or {}
+        return history
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': _HISTORY_VERSION, 'stocks': self._stats}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def record(self, stock_code, latency=None, failed=False):
+        """
+        记录一次拉取结果。
+
+        参数:
+            latency: 拉取耗时（秒），None 表示未知（如卡死被放弃）
+            failed: 是否为瞬时失败（拉取失败 / 超时 / 卡死）
+        """
+        entry = self._stats.setdefault(stock_code, {'ewma': None, 'failures': 0.0})
+        if latency is not None and latency >= 0:
+            if entry['ewma'] is None:
+                entry['ewma'] = float(latency)
+            else:
+                entry['ewma'] = self.ewma_alpha * float(latency) + (1 - self.ewma_alpha) * entry['ewma']
+        entry['failures'] = entry['failures'] * self.failure_decay + (1.0 if failed else 0.0)
+        entry['updated'] = int(time.time())
+        self._dirty = True
+
+    def cost(self, stock_code, default=0.0):
+        """预期代价（秒）：平滑耗时 + 失败惩罚；无历史返回 default。"""
+        entry = self._stats.get(stock_code)
+        if not entry:
+            return default
+        ewma = entry.get('ewma')
+        return (default if ewma is None else ewma) + entry.get('failures', 0.0) * self.failure_penalty
+
+    def schedule(self, codes):
+        """
+        返回 (新顺序, 慢股票数)：已知慢股票（代价前 straggler_ratio 且高于中位数）按代价从高到低
+        排在最前并与快股票交错，其余保持原顺序。
+        """
+        codes = list(codes)
+        known = sorted(self.cost(c) for c in codes if c in self._stats)
+        n_slow = int(len(codes) * self.straggler_ratio)
+        if len(known) < 2 or n_slow <= 0:
+            return codes, 0
+        median = known[len(known) // 2]
+        ranked = sorted((c for c in codes if c in self._stats), key=self.cost, reverse=True)
+        slow = [c for c in ranked[:n_slow] if self.cost(c) > median]
+        if not slow:
+            return codes, 0
+        slow_set = set(slow)
+        fast = [c for c in codes if c not in slow_set]
+        ordered = []
+        for i, code in enumerate(slow):
+            ordered.append(code)
+            if i < len(fast):
+                ordered.append(fast[i])
+        ordered.extend(fast[len(slow):])
+        return ordered, len(slow)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+纯 NumPy 指标引擎：一次取出 high / low / close / volume 连续数组，单遍算完 INDICATORS_CONFIG 中的全部指标
+
+TechnicalIndicators.calculate_all 逐个指标构造 ta 对象与 pandas Series，每只股票要分配几十个中间 Series，
+其中 ADX / ATR 还逐行做 Series 下标访问。这里：
+  - 滑动窗口类（SMA / BOLL / KDJ 极值 / VWAP）用 sliding_window_view 在 C 层按窗口归约；
+    WMA / CCI 与 TechnicalIndicators 共用 weighted_moving_average / rolling_deviation_mean
+  - 递推类（EMA / MACD / RSI 的 ewm、ATR、DMI 的 Wilder 平滑）在 Python float 上逐根递推，
+    公式与 pandas ewm(adjust=False) / ta 的实现逐步一致
+  - 全部列先放进 dict，最后一次性拼接成 DataFrame（避免逐列插入造成的碎片化与复制）
+输出的列名、列顺序、dtype 与 TechnicalIndicators.calculate_all 一致，数值差异在浮点舍入量级（≤1e-9 相对误差）。
+OHLCV 含 NaN / inf 时（缺失处理与 ta 的 rolling 语义不同）退回 ta 实现。
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .stock_config import INDICATOR_ENGINE
+from .technical_indicators import TechnicalIndicators, rolling_deviation_mean, weighted_moving_average
+
+# ta VolumeWeightedAveragePrice 的默认窗口
+_VWAP_WINDOW = 14
+
+
+# 滑动窗口类辅助函数均沿最后一维计算：一维为单只股票，二维（股票 × K 线）供 indicator_panel 整体计算
+
+def _shift(x, n=1):
+    out = np.empty(x.shape, dtype=np.float64)
+    out[..., :n] = np.nan
+    out[..., n:] = x[..., :-n]
+    return out
+
+
+def _rolling(x, window, reduce):
+    """窗口完整时取 reduce(窗口视图)，其余为 NaN（同 rolling(window, min_periods=window)）。"""
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = reduce(sliding_window_view(x, window, axis=-1))
+    return out
+
+
+def _rolling_mean(x, window):
+    return _rolling(x, window, lambda w: w.mean(axis=-1))
+
+
+def _rolling_sum(x, window):
+    return _rolling(x, window, lambda w: w.sum(axis=-1))
+
+
+def _rolling_std(x, window):
+    """总体标准差（ddof=0）；窗口内全部相等时为 0（与 pandas 一致，不留舍入残差）。"""
+    std = np.sqrt(rolling_deviation_mean(x, window, np.square))
+    if x.shape[-1] >= window:
+        view = sliding_window_view(x, window, axis=-1)
+        std[..., window - 1:][view.max(axis=-1) == view.min(axis=-1)] = 0.0
+    return std
+
+
+def _ewm(x, com, min_periods):
+    """
+    pandas ewm(com=..., adjust=False, min_periods=...).mean() 的逐步等价实现（含 NaN 起点：
+    从第一个有效值开始递推，有效值个数不足 min_periods 时为 NaN）。
+    span / alpha 参数按 pandas 的换算先转为 com 再传入，保证舍入一致。
+    """
+    alpha = 1.0 / (1.0 + com)
+    old_wt = 1.0 - alpha
+    denom = old_wt + alpha
+    values = x.tolist()
+    out = [np.nan] * len(values)
+    weighted = np.nan
+    nobs = 0
+    for i, cur in enumerate(values):
+        is_obs = cur == cur
+        nobs += is_obs
+        if weighted == weighted:
+            if is_obs and weighted != cur:
+                weighted = (old_wt * weighted + alpha * cur) / denom
+        elif is_obs:
+            weighted = cur
+        if nobs >= min_periods:
+            out[i] = weighted
+    return np.array(out, dtype=np.float64)
+
+
+def _ema(x, span):
+    """ta 的 _ema：ewm(span=span, min_periods=span, adjust=False)。"""
+    return _ewm(x, (span - 1) / 2.0, span)
+
+
+def _wilder_sum(values, window, first):
+    """ta ADXIndicator 的平滑和：s[0]=first，s[i]=s[i-1]-s[i-1]/window+values[window+i]，末位保持 0。"""
+    length = len(values) - (window - 1)
+    out = [0.0] * length
+    out[0] = first
+    prev = first
+    w = float(window)
+    for i in range(1, length - 1):
+        prev = prev - (prev / w) + values[window + i]
+        out[i] = prev
+    return np.array(out, dtype=np.float64)
+
+
+def _kdj(cols, high, low, close, period, signal):
+    smin = _rolling(low, period, lambda w: w.min(axis=-1))
+    smax = _rolling(high, period, lambda w: w.max(axis=-1))
+    k = 100 * (close - smin) / (smax - smin)
+    d = _rolling_mean(k, signal)
+    cols[f'K_{period}_{signal}'] = k
+    cols[f'D_{period}_{signal}'] = d
+    cols[f'J_{period}_{signal}'] = 3 * k - 2 * d
+
+
+def _macd(cols, close, fast, slow, signal):
+    macd = _ema(close, fast) - _ema(close, slow)
+    macd_signal = _ema(macd, signal)
+    cols[f'MACD_{fast}_{slow}_{signal}'] = macd
+    cols[f'MACDs_{fast}_{slow}_{signal}'] = macd_signal
+    cols[f'MACDh_{fast}_{slow}_{signal}'] = macd - macd_signal
+
+
+def _rsi(cols, close, periods):
+    diff = close - _shift(close)
+    up = np.where(diff > 0, diff, 0.0)
+    down = -np.where(diff < 0, diff, 0.0)
+    for period in periods:
+        if len(close) >= period:
+            # ta：ewm(alpha=1/period)，pandas 换算为 com = 1/alpha - 1
+            com = 1 / (1 / period) - 1
+            emaup = _ewm(up, com, period)
+            emadn = _ewm(down, com, period)
+            cols[f'RSI_{period}'] = np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+
+
+def _boll(cols, close, period, std):
+    mavg = _rolling_mean(close, period)
+    mstd = _rolling_std(close, period)
+    hband = mavg + std * mstd
+    lband = mavg - std * mstd
+    width = hband - lband
+    cols[f'BBL_{period}_{std}.0'] = lband
+    cols[f'BBU_{period}_{std}.0'] = hband
+    cols[f'BBM_{period}_{std}.0'] = mavg
+    cols[f'BBB_{period}_{std}.0'] = width
+    cols[f'BBP_{period}_{std}.0'] = (close - lband) / width
+
+
+def _atr(close, high, low, prev_close, window):
+    true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    atr = [0.0] * len(close)
+    prev = float(true_range[:window].mean())
+    atr[window - 1] = prev
+    tr = true_range.tolist()
+    w = float(window)
+    for i in range(window, len(atr)):
+        prev = (prev * (window - 1) + tr[i]) / w
+        atr[i] = prev
+    return np.array(atr, dtype=np.float64)
+
+
+def _dmi(cols, high, low, prev_close, length):
+    n = len(high)
+    diff_dm = np.fmax(high, prev_close) - np.fmin(low, prev_close)
+    diff_dm[0] = np.nan  # ta：np.amax / np.amin 遇 NaN（首行前收盘）得 NaN
+    diff_up = high - _shift(high)
+    diff_down = _shift(low) - low
+    pos = np.abs(((diff_up > diff_down) & (diff_up > 0)) * diff_up)
+    neg = np.abs(((diff_down > diff_up) & (diff_down > 0)) * diff_down)
+
+    trs = _wilder_sum(diff_dm.tolist(), length, float(diff_dm[1:length + 1].sum()))
+    dip = _wilder_sum(pos.tolist(), length, float(pos[1:length + 1].sum()))
+    din = _wilder_sum(neg.tolist(), length, float(neg[1:length + 1].sum()))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nonzero = trs != 0
+        dip_pct = np.where(nonzero, 100 * (dip / trs), 0.0)
+        din_pct = np.where(nonzero, 100 * (din / trs), 0.0)
+        total = dip_pct + din_pct
+        dx = np.where(total != 0, 100 * np.abs((dip_pct - din_pct) / total), 0.0)
+
+    dx_values = dx.tolist()
+    adx = [0.0] * len(trs)
+    prev = float(dx[0:length].mean())
+    adx[length] = prev
+    w = float(length)
+    for i in range(length + 1, len(adx)):
+        prev = ((prev * (length - 1)) + dx_values[i - 1]) / w
+        adx[i] = prev
+    adx = np.concatenate((np.zeros(length - 1), np.array(adx, dtype=np.float64)))
+
+    # ta 的 adx_pos / adx_neg 从第 1 个平滑值开始、错位 length 根写入，末个平滑值不输出
+    plus = np.zeros(n)
+    minus = np.zeros(n)
+    plus[length + 1:length + len(trs) - 1] = dip_pct[1:len(trs) - 1]
+    minus[length + 1:length + len(trs) - 1] = din_pct[1:len(trs) - 1]
+
+    cols[f'ADX_{length}'] = adx
+    cols[f'ADXr_{length}'] = adx
+    cols[f'DMP_{length}'] = plus
+    cols[f'DMN_{length}'] = minus
+
+
+def _cci(high, low, close, length):
+    tp = (high + low + close) / 3
+    ma = _rolling_mean(tp, length)
+    md = rolling_deviation_mean(tp, length)
+    return (tp - ma) / (0.015 * md)
+
+
+def compute_columns(high, low, close, volume, config):
+    """
+    在连续数组上计算 config（INDICATORS_CONFIG 结构）中的全部指标，返回 {列名: ndarray}（列顺序同 calculate_all）。
+    各指标的最少 K 线数要求与 TechnicalIndicators 的对应方法一致。
+    """
+    n = len(close)
+    prev_close = _shift(close)
+    cols = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period, signal = config['kdj']['period'], config['kdj']['signal']
+        if n >= period + signal:
+            _kdj(cols, high, low, close, period, signal)
+
+        fast, slow, signal = config['macd']['fast'], config['macd']['slow'], config['macd']['signal']
+        if n >= slow + signal:
+            _macd(cols, close, fast, slow, signal)
+
+        periods = config['rsi']['periods']
+        if n >= (max(periods) if periods else 24):
+            _rsi(cols, close, periods)
+
+        period, std = config['boll']['period'], config['boll']['std']
+        if n >= period:
+            _boll(cols, close, period, std)
+
+        if 'ma' in config:
+            for period in config['ma']['periods']:
+                if n >= period:
+                    cols[f'SMA_{period}'] = _rolling_mean(close, period)
+        if 'ema' in config:
+            for period in config['ema']['periods']:
+                if n >= period:
+                    cols[f'EMA_{period}'] = _ema(close, period)
+        if 'wma' in config:
+            for period in config['wma']['periods']:
+                if n >= period:
+                    cols[f'WMA_{period}'] = weighted_moving_average(close, period)
+        if 'vwap' in config:
+            typical = (high + low + close) / 3.0
+            cols['VWAP'] = _rolling_sum(typical * volume, _VWAP_WINDOW) / _rolling_sum(volume, _VWAP_WINDOW)
+        if 'atr' in config:
+            period = config['atr']['period']
+            if n >= period:
+                cols[f'ATRr_{period}'] = _atr(close, high, low, prev_close, period)
+        if 'dmi' in config:
+            length = config['dmi']['length']
+            if n >= length * 2:
+                _dmi(cols, high, low, prev_close, length)
+        if 'cci' in config:
+            length = config['cci']['length']
+            if n >= length:
+                # 与 TechnicalIndicators.calculate_cci 一致：列名固定为 CCI_20
+                cols['CCI_20'] = _cci(high, low, close, length)
+        if 'obv' in config and n >= 1:
+            cols['OBV'] = np.where(close < prev_close, -volume, volume).cumsum()
+        if 'roc' in config:
+            length = config['roc']['length']
+            if n >= length + 1:
+                base = _shift(close, length)
+                cols[f'ROC_{length}'] = ((close - base) / base) * 100
+
+    return cols
+
+
+def attach_columns(df, cols):
+    """把 compute_columns 的结果（或同索引的指标 DataFrame 列表，见 indicator_panel）一次性拼接到 df 之后。"""
+    if len(cols) == 0:
+        return df
+    # copy=False：各列数组直接作为独立块挂到结果上，不再整体复制一次
+    pieces = cols if isinstance(cols, list) else [pd.DataFrame(cols, index=df.index, copy=False)]
+    # 已存在的同名列（重复计算）以新值覆盖，保持原列位置
+    existing = set(df.columns).intersection(c for piece in pieces for c in piece.columns)
+    if existing:
+        df = df.copy()
+        for k, piece in enumerate(pieces):
+            overlap = [c for c in piece.columns if c in existing]
+            if overlap:
+                df[overlap] = piece[overlap]
+                pieces[k] = piece.drop(columns=overlap)
+    return pd.concat([df, *pieces], axis=1)
+
+
+def compute_all(df, config):
+    """按 config 计算全部指标，等价于 TechnicalIndicators.calculate_all。"""
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    cols = compute_columns(
+        df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64),
+        df['close'].to_numpy(dtype=np.float64),
+        df['volume'].to_numpy(),
+        config,
+    )
+    return attach_columns(df, cols)
+
+
+def _finite_inputs(df):
+    for col in ('high', 'low', 'close', 'volume'):
+        values = df[col].to_numpy()
+        if values.dtype.kind == 'f' and not np.isfinite(values).all():
+            return False
+    return True
+
+
+def calculate_indicators(df, config, engine=None):
+    """
+    指标计算入口：engine（默认 INDICATOR_ENGINE）为 'numpy' 时用本模块，'ta' 时用 TechnicalIndicators.calculate_all。
+    """
+    engine = engine or INDICATOR_ENGINE
+    if engine == 'numpy' and _finite_inputs(df):
+        return compute_all(df, config)
+    return TechnicalIndicators.calculate_all(df, config)
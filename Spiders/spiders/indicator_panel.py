@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+截面面板指标计算：把全市场的日线排成「股票 × 交易日」二维数组，一次算完 INDICATORS_CONFIG 中的全部指标
+
+逐只计算时每只股票只有约 250 根 K 线，耗时主要花在每次调用的固定开销上（建数组、Python 层递推、拼 DataFrame）。
+这里：
+  - build_panel：按全部股票的交易日并集对齐成 high / low / close / volume 二维数组（无 K 线处为 NaN），
+    mask 标记每只股票在每个交易日是否有 K 线（停牌、上市前均为 False）
+  - 指标按每只股票自己的 K 线序列计算（停牌日不算一根 K 线，与逐只计算一致）：计算前按 mask 把每只股票的
+    K 线向右压实对齐到最后一列，左侧补 NaN——所有股票的最新一根落在同一列
+  - 滑动窗口类直接复用 indicator_engine 的辅助函数（沿最后一维计算），窗口触及补位时为 NaN，与逐只计算的预热段一致
+  - 递推类（EMA / MACD / RSI、ATR、DMI）按列推进、每步对全部股票做向量运算；各条 ewm 序列叠成一个数组一起推进，
+    每根 K 线只有一轮 NumPy 调用。逐元素运算与单只股票的 Python float 递推是同样的 IEEE 运算，结果逐位一致
+  - 各指标的最少 K 线数要求按每只股票自己的 K 线数判断，与 indicator_engine.compute_columns 输出的列一致
+OHLCV 含 NaN / inf、日期重复的股票，以及 INDICATOR_ENGINE 不是 'numpy' 时，逐只调用 calculate_indicators。
+"""
+
+import numpy as np
+import pandas as pd
+
+from .indicator_engine import (
+    _VWAP_WINDOW, _boll, _cci, _kdj, _rolling_mean, _rolling_sum, _shift,
+    attach_columns, calculate_indicators,
+)
+from .stock_config import INDICATOR_ENGINE
+from .technical_indicators import weighted_moving_average
+
+_INPUT_COLUMNS = ('high', 'low', 'close', 'volume')
+
+
+class IndicatorPanel:
+    """
+    日期对齐的面板：codes（S 只）、dates（T 个交易日，全部股票日期的并集）、
+    high / low / close / volume（S×T float64，无 K 线处为 NaN）、mask（S×T bool，有 K 线为 True）。
+    """
+
+    def __init__(self, codes, dates, arrays, mask):
+        self.codes = codes
+        self.dates = dates
+        self.high, self.low, self.close, self.volume = arrays
+        self.mask = mask
+
+    def compact(self):
+        """
+        按 mask 把每只股票的 K 线向右压实：返回 (high, low, close, volume, counts)，
+        数组为 S×W（W 为最长的 K 线数），第 i 只股票的 K 线依次占据最后 counts[i] 列，其余为 NaN。
+        """
+        counts = self.mask.sum(axis=1)
+        width = int(counts.max()) if len(counts) else 0
+        rows, src = np.nonzero(self.mask)
+        # 每只股票第 k 根 K 线落在第 width - count + k 列
+        dst = (width - counts)[rows] + (np.cumsum(self.mask, axis=1)[rows, src] - 1)
+        out = []
+        for values in (self.high, self.low, self.close, self.volume):
+            bars = np.full((len(self.codes), width), np.nan)
+            bars[rows, dst] = values[rows, src]
+            out.append(bars)
+        return (*out, counts)
+
+
+def build_panel(frames):
+    """
+    frames: [(code, df)]，df 为按日期索引的日线（需含 high / low / close / volume，已按日期升序、无重复日期）。
+    返回 IndicatorPanel。
+    """
+    codes = [code for code, _ in frames]
+    stamps = [df.index.asi8 for _, df in frames]
+    dates = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+    # 全部 K 线的 (股票行, 交易日列) 一次算好，各输入列整体散布到 S×T 数组
+    rows = np.repeat(np.arange(len(codes)), [len(stamp) for stamp in stamps])
+    pos = np.searchsorted(dates, np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+    mask = np.zeros((len(codes), len(dates)), dtype=bool)
+    mask[rows, pos] = True
+    arrays = []
+    for col in _INPUT_COLUMNS:
+        values = np.full((len(codes), len(dates)), np.nan)
+        if stamps:
+            values[rows, pos] = np.concatenate([df[col].to_numpy(dtype=np.float64) for _, df in frames])
+        arrays.append(values)
+    return IndicatorPanel(codes, pd.DatetimeIndex(dates.astype('datetime64[ns]')), arrays, mask)
+
+
+def _ewm_rows(x, com, min_periods):
+    """
+    R 条序列（R×W）同时做 indicator_engine._ewm 的递推；com / min_periods 为每行的参数（长度 R）。
+    左侧补位的 NaN 与单只序列开头的 NaN 一样：从第一个有效值开始递推。
+    """
+    alpha = 1.0 / (1.0 + com)
+    old_wt = 1.0 - alpha
+    denom = old_wt + alpha
+    # 按列推进：转成 W×R 让每一步取连续内存
+    cols = np.ascontiguousarray(x.T)
+    out = np.full(cols.shape, np.nan)
+    weighted = np.full(cols.shape[1], np.nan)
+    nobs = np.zeros(cols.shape[1], dtype=np.int64)
+    for c in range(cols.shape[0]):
+        cur = cols[c]
+        is_obs = cur == cur
+        nobs += is_obs
+        has = weighted == weighted
+        step = (old_wt * weighted + alpha * cur) / denom
+        weighted = np.where(has & is_obs & (weighted != cur), step, weighted)
+        weighted = np.where(~has & is_obs, cur, weighted)
+        out[c] = np.where(nobs >= min_periods, weighted, np.nan)
+    return out.T
+
+
+def _ewm_batch(series):
+    """series: [(x, com, min_periods)]，各 x 为 S×W；叠成一个数组一起递推，按顺序返回结果。"""
+    if not series:
+        return []
+    stacked = np.concatenate([x for x, _, _ in series])
+    com = np.concatenate([np.full(len(x), com) for x, com, _ in series])
+    min_periods = np.concatenate([np.full(len(x), m) for x, _, m in series])
+    return np.split(_ewm_rows(stacked, com, min_periods), len(series))
+
+
+def _window_at(x, first, window):
+    """每行从 first[i] 起连续 window 个值（S×window，越界行取末列，其值不会被使用）。"""
+    idx = np.minimum(first[:, None] + np.arange(window), x.shape[1] - 1)
+    return x[np.arange(len(x))[:, None], idx]
+
+
+def _atr(high, low, close, prev_close, starts, window):
+    """indicator_engine._atr 的面板版本：第 window-1 根取 TR 均值，之后 Wilder 递推，之前为 0。"""
+    true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    first = starts + window - 1
+    init = _window_at(true_range, starts, window).mean(axis=1)
+    atr = np.zeros(high.shape)
+    prev = np.full(len(high), np.nan)
+    tr = np.ascontiguousarray(true_range.T)
+    for c in range(high.shape[1]):
+        prev = np.where(first == c, init, np.where(first < c, (prev * (window - 1) + tr[c]) / window, prev))
+        atr[:, c] = np.where(first <= c, prev, 0.0)
+    return atr
+
+
+def _dmi(cols, high, low, prev_close, starts, length):
+    """
+    indicator_engine._dmi 的面板版本。按每只股票的第 j 根（j = 列 - starts）：
+    trs / dip / din 在 j=length 取前 length 根之和，之后 Wilder 递推；DMP / DMN 从 j=length+1 起输出，
+    ADX 在 j=2*length-1 取 dx 均值，之后递推；其余位置为 0。
+    """
+    diff_dm = np.fmax(high, prev_close) - np.fmin(low, prev_close)
+    diff_up = high - _shift(high)
+    diff_down = _shift(low) - low
+    pos = np.abs(((diff_up > diff_down) & (diff_up > 0)) * diff_up)
+    neg = np.abs(((diff_down > diff_up) & (diff_down > 0)) * diff_down)
+
+    # trs / dip / din 叠成 3S 行一起递推
+    values = np.concatenate((diff_dm, pos, neg))
+    first = np.tile(starts + length, 3)
+    init = _window_at(values, first - length + 1, length).sum(axis=1)
+    smoothed = np.zeros(values.shape)
+    prev = np.full(len(values), np.nan)
+    w = float(length)
+    by_col = np.ascontiguousarray(values.T)
+    for c in range(values.shape[1]):
+        prev = np.where(first == c, init, np.where(first < c, prev - (prev / w) + by_col[c], prev))
+        smoothed[:, c] = np.where(first <= c, prev, 0.0)
+    trs, dip, din = np.split(smoothed, 3)
+
+    nonzero = trs != 0
+    dip_pct = np.where(nonzero, 100 * (dip / trs), 0.0)
+    din_pct = np.where(nonzero, 100 * (din / trs), 0.0)
+    total = dip_pct + din_pct
+    dx = np.where(total != 0, 100 * np.abs((dip_pct - din_pct) / total), 0.0)
+
+    adx_first = starts + 2 * length - 1
+    adx_init = _window_at(dx, starts + length, length).mean(axis=1)
+    adx = np.zeros(dx.shape)
+    prev = np.full(len(dx), np.nan)
+    dx_by_col = np.ascontiguousarray(dx.T)
+    for c in range(dx.shape[1]):
+        prev = np.where(adx_first == c, adx_init,
+                        np.where(adx_first < c, ((prev * (length - 1)) + dx_by_col[c]) / w, prev))
+        adx[:, c] = np.where(adx_first <= c, prev, 0.0)
+
+    written = np.arange(dx.shape[1]) >= (starts + length + 1)[:, None]
+    cols[f'ADX_{length}'] = adx
+    cols[f'ADXr_{length}'] = adx
+    cols[f'DMP_{length}'] = np.where(written, dip_pct, 0.0)
+    cols[f'DMN_{length}'] = np.where(written, din_pct, 0.0)
+
+
+def compute_panel(high, low, close, volume, counts, config):
+    """
+    在压实后的面板（见 IndicatorPanel.compact）上计算 config 中的全部指标。
+    返回 [(最少 K 线数, {列名: S×W 数组})]，按 compute_columns 的列顺序；K 线数不足的股票不输出该组列。
+    """
+    width = close.shape[1]
+    starts = width - counts
+    prev_close = _shift(close)
+    groups = []
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 递推类 ewm 先统一排队，一次推进
+        series = []
+        fast, slow, macd_signal = config['macd']['fast'], config['macd']['slow'], config['macd']['signal']
+        series.append((close, (fast - 1) / 2.0, fast))
+        series.append((close, (slow - 1) / 2.0, slow))
+        periods = config['rsi']['periods']
+        diff = close - prev_close
+        # 补位处置为 NaN，使递推从每只股票的第一根开始（第一根的 diff 为 NaN → 0，与逐只计算一致）
+        padded = np.isnan(close)
+        up = np.where(padded, np.nan, np.where(diff > 0, diff, 0.0))
+        down = np.where(padded, np.nan, -np.where(diff < 0, diff, 0.0))
+        for period in periods:
+            com = 1 / (1 / period) - 1
+            series.append((up, com, period))
+            series.append((down, com, period))
+        ema_periods = config['ema']['periods'] if 'ema' in config else []
+        for period in ema_periods:
+            series.append((close, (period - 1) / 2.0, period))
+        smoothed = _ewm_batch(series)
+
+        cols = {}
+        period, signal = config['kdj']['period'], config['kdj']['signal']
+        _kdj(cols, high, low, close, period, signal)
+        groups.append((period + signal, cols))
+
+        macd = smoothed[0] - smoothed[1]
+        macd_sig = _ewm_batch([(macd, (macd_signal - 1) / 2.0, macd_signal)])[0]
+        groups.append((slow + macd_signal, {
+            f'MACD_{fast}_{slow}_{macd_signal}': macd,
+            f'MACDs_{fast}_{slow}_{macd_signal}': macd_sig,
+            f'MACDh_{fast}_{slow}_{macd_signal}': macd - macd_sig,
+        }))
+
+        cols = {}
+        for k, period in enumerate(periods):
+            emaup, emadn = smoothed[2 + 2 * k], smoothed[3 + 2 * k]
+            cols[f'RSI_{period}'] = np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+        groups.append((max(periods) if periods else 24, cols))
+
+        cols = {}
+        period, std = config['boll']['period'], config['boll']['std']
+        _boll(cols, close, period, std)
+        groups.append((period, cols))
+
+        if 'ma' in config:
+            for period in config['ma']['periods']:
+                groups.append((period, {f'SMA_{period}': _rolling_mean(close, period)}))
+        for k, period in enumerate(ema_periods):
+            groups.append((period, {f'EMA_{period}': smoothed[2 + 2 * len(periods) + k]}))
+        if 'wma' in config:
+            for period in config['wma']['periods']:
+                groups.append((period, {f'WMA_{period}': weighted_moving_average(close, period)}))
+        if 'vwap' in config:
+            typical = (high + low + close) / 3.0
+            vwap = _rolling_sum(typical * volume, _VWAP_WINDOW) / _rolling_sum(volume, _VWAP_WINDOW)
+            groups.append((0, {'VWAP': vwap}))
+        if 'atr' in config:
+            period = config['atr']['period']
+            groups.append((period, {f'ATRr_{period}': _atr(high, low, close, prev_close, starts, period)}))
+        if 'dmi' in config:
+            length = config['dmi']['length']
+            cols = {}
+            _dmi(cols, high, low, prev_close, starts, length)
+            groups.append((length * 2, cols))
+        if 'cci' in config:
+            length = config['cci']['length']
+            groups.append((length, {'CCI_20': _cci(high, low, close, length)}))
+        if 'obv' in config:
+            flow = np.where(close < prev_close, -volume, volume)
+            groups.append((1, {'OBV': np.where(np.isnan(close), 0.0, flow).cumsum(axis=1)}))
+        if 'roc' in config:
+            length = config['roc']['length']
+            base = _shift(close, length)
+            groups.append((length + 1, {f'ROC_{length}': ((close - base) / base) * 100}))
+
+    return groups
+
+
+def _block_layout(groups, included, int_obv):
+    """
+    结果列的分块方式：[(列 Index, [S×W 数组], 是否整数 OBV)]。连续的浮点列拼成一个块；
+    逐只计算时整数成交量的 OBV 为整数列，在 OBV 处断开单独成块。
+    """
+    layout = []
+    run = []
+
+    def flush():
+        if run:
+            layout.append((pd.Index([name for name, _ in run]), [values for _, values in run], False))
+            run.clear()
+
+    for (_, group), ok in zip(groups, included):
+        if not ok:
+            continue
+        for name, values in group.items():
+            if name == 'OBV' and int_obv:
+                flush()
+                layout.append((pd.Index([name]), [values], True))
+            else:
+                run.append((name, values))
+    flush()
+    return layout
+
+
+def _prepare(df):
+    """日期索引转为 DatetimeIndex 并按日期升序（与 compute_signals_for_stock / compute_all 的处理一致）。"""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df = df.set_axis(pd.to_datetime(df.index), axis=0)
+    return df if df.index.is_monotonic_increasing else df.sort_index()
+
+
+def calculate_panel_indicators(frames, config, engine=None):
+    """
+    对一批股票整体计算指标：frames 为 [(code, df)]，返回 {code: 带指标列的 DataFrame}，
+    每只的结果与 calculate_indicators(df, config) 相同（列、列顺序、dtype）。
+    """
+    engine = engine or INDICATOR_ENGINE
+    frames = [(code, _prepare(df)) for code, df in frames]
+    if engine != 'numpy':
+        return {code: calculate_indicators(df, config, engine=engine) for code, df in frames}
+    results = {}
+    eligible = []
+    for code, df in frames:
+        if df.index.is_unique:
+            eligible.append((code, df))
+        else:
+            results[code] = calculate_indicators(df, config, engine=engine)
+    if not eligible:
+        return results
+
+    panel = build_panel(eligible)
+    # 有 K 线处出现 NaN / inf 的股票（逐只计算会退回 ta 实现）不用面板结果
+    finite = np.ones(len(eligible), dtype=bool)
+    for values in (panel.high, panel.low, panel.close, panel.volume):
+        finite &= (np.isfinite(values) | ~panel.mask).all(axis=1)
+    high, low, close, volume, counts = panel.compact()
+    groups = compute_panel(high, low, close, volume, counts, config)
+    width = close.shape[1]
+    # 绝大多数股票的 K 线数都满足全部指标要求，分块方式按 (满足的指标组, 成交量是否整数) 缓存
+    layouts = {}
+    for i, (code, df) in enumerate(eligible):
+        if not finite[i]:
+            results[code] = calculate_indicators(df, config, engine=engine)
+            continue
+        n = int(counts[i])
+        volume_dtype = df['volume'].dtype
+        key = (tuple(n >= min_bars for min_bars, _ in groups), volume_dtype.kind in 'iu')
+        if key not in layouts:
+            layouts[key] = _block_layout(groups, *key)
+        pieces = []
+        for columns, arrays, is_obv in layouts[key]:
+            if is_obv:
+                data = arrays[0][i, width - n:].astype(volume_dtype)[:, None]
+            else:
+                data = np.stack([values[i, width - n:] for values in arrays], axis=1)
+            pieces.append(pd.DataFrame(data, index=df.index, columns=columns, copy=False))
+        results[code] = attach_columns(df, pieces)
+    return results
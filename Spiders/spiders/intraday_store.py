@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分钟线仓库：5/15/30/60 分钟 K 线按股票持久化，只追加新 K 线，按时间区间快速读取
+
+5 分钟线每天 48 根，是日线的 48 倍，不能沿用日线仓库「每只股票一个 pickle、整体读写」的方式。
+这里按 股票 / 频率 / 自然月 分块（INTRADAY_STORE_DIR/<频率>/<代码>/<YYYYMM>.npz）：
+  - 每块为 np.savez_compressed 的列式数组：time（K 线结束时刻，int64 纳秒）及各数值列
+  - 只追加：早于仓库最后一根的 K 线被忽略；已结束月份的块不再改写，只有最后一个月的块会被重写
+  - 读取 [start, end]：只打开区间涉及的月份、只解压需要的列，块内按 time 二分定位
+  - 超过 INTRADAY_STORE_RETENTION_DAYS 的月份整块删除
+仓库保存不复权 K 线（与日线仓库的本地复权一致，除权不会改写已存数据）；读取时可按
+日线仓库中的复权因子（kline_store.load_factors）派生前复权 / 后复权价格。
+
+写入采用「临时文件 + os.replace」，进程被杀也不会留下半个文件。
+"""
+
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .kline_store import _has_trading_day_after, _to_dash_date, adjust_bars, load_factors
+from .stock_config import INTRADAY_STORE_DIR, INTRADAY_STORE_RETENTION_DAYS
+
+# 每个交易日的分钟数（9:30-11:30、13:00-15:00）
+_MINUTES_PER_DAY = 240
+# 收盘时刻：最后一根分钟线的结束时间
+_CLOSE_TIME = (15, 0)
+
+
+def bars_per_day(frequency):
+    return _MINUTES_PER_DAY // int(frequency)
+
+
+def _chunk_dir(stock_code, frequency):
+    return os.path.join(INTRADAY_STORE_DIR, str(frequency), stock_code)
+
+
+def _months(stock_code, frequency):
+    """仓库中已有的月份（'YYYYMM'，升序）。"""
+    try:
+        names = os.listdir(_chunk_dir(stock_code, frequency))
+    except OSError:
+        return []
+    return sorted(n[:-4] for n in names if n.endswith('.npz') and n[:-4].isdigit())
+
+
+def _chunk_path(stock_code, frequency, month):
+    return os.path.join(_chunk_dir(stock_code, frequency), f"{month}.npz")
+
+
+def _read_chunk(path, columns=None):
+    """读取一个月份块：{列名: ndarray}；columns 为 None 时读取全部列（time 总会读取）。"""
+    with np.load(path, allow_pickle=False) as npz:
+        names = npz.files if columns is None else ['time'] + [c for c in columns if c in npz.files and c != 'time']
+        return {name: npz[name] for name in names}
+
+
+def _write_chunk(path, arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def last_bar_time(stock_code, frequency):
+    """仓库中最后一根 K 线的时刻（pd.Timestamp），仓库为空返回 None。"""
+    months = _months(stock_code, frequency)
+    if not months:
+        return None
+    try:
+        times = _read_chunk(_chunk_path(stock_code, frequency, months[-1]), columns=())['time']
+    except Exception:
+        return None
+    return pd.Timestamp(int(times[-1])) if len(times) else None
+
+
+def append_bars(stock_code, frequency, df):
+    """
+    追加分钟 K 线（time 索引，数值列）；不晚于仓库最后一根的 K 线被忽略。
+
+    返回:
+        int: 实际追加的 K 线数
+    """
+    if df is None or df.empty:
+        return 0
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    last = last_bar_time(stock_code, frequency)
+    if last is not None:
+        df = df[df.index > last]
+    if df.empty:
+        return 0
+
+    times = df.index.to_numpy(dtype='datetime64[ns]')
+    months = pd.DatetimeIndex(times).strftime('%Y%m')
+    for month in pd.unique(months):
+        mask = months == month
+        new = {'time': times[mask].astype(np.int64)}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype.kind in 'iuf':
+                new[col] = values[mask]
+        path = _chunk_path(stock_code, frequency, month)
+        if os.path.exists(path):
+            old = _read_chunk(path)
+            merged = {}
+            for col in old.keys() | new.keys():
+                a = old.get(col, np.full(len(old['time']), np.nan))
+                b = new.get(col, np.full(len(new['time']), np.nan))
+                merged[col] = np.concatenate([a, b])
+            new = merged
+        _write_chunk(path, new)
+    _prune(stock_code, frequency, pd.Timestamp(times[-1]))
+    return int(len(times))
+
+
+def _prune(stock_code, frequency, last_time):
+    """删除早于保留期的月份块。"""
+    keep_from = (last_time - timedelta(days=int(INTRADAY_STORE_RETENTION_DAYS))).strftime('%Y%m')
+    for month in _months(stock_code, frequency):
+        if month >= keep_from:
+            break
+        try:
+            os.remove(_chunk_path(stock_code, frequency, month))
+        except OSError:
+            pass
+
+
+def load_intraday_bars(stock_code, frequency, start_date=None, end_date=None, columns=None, adjustflag='3',
+                       factors=None):
+    """
+    按时间区间读取分钟 K 线。
+
+    参数:
+        start_date / end_date: 'YYYYMMDD' / 'YYYY-MM-DD'（含当天全部 K 线），None 表示不限
+        columns: 需要的列（默认全部），只解压这些列
+        adjustflag: '3'=不复权（仓库原样）, '2'=前复权, '1'=后复权
+        factors: 复权因子（同 kline_store.load_factors()['factors']）；None 时取日线仓库中的复权因子
+
+    返回:
+        pandas.DataFrame | None: time 索引；区间内无数据、或需要复权却没有复权因子时返回 None
+        （不把不复权价格当作复权价格返回）
+    """
+    if adjustflag != '3' and factors is None:
+        payload = load_factors(stock_code)
+        if payload is None:
+            return None
+        factors = payload['factors']
+    start = pd.Timestamp(_to_dash_date(start_date)) if start_date else None
+    end = pd.Timestamp(_to_dash_date(end_date)) + timedelta(days=1) if end_date else None
+    parts = []
+    for month in _months(stock_code, frequency):
+        if start is not None and month < start.strftime('%Y%m'):
+            continue
+        if end is not None and month > end.strftime('%Y%m'):
+            break
+        try:
+            chunk = _read_chunk(_chunk_path(stock_code, frequency, month), columns)
+        except Exception:
+            continue
+        times = chunk['time']
+        lo = 0 if start is None else int(np.searchsorted(times, start.value, side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, end.value, side='left'))
+        if hi > lo:
+            parts.append({name: values[lo:hi] for name, values in chunk.items()})
+    if not parts:
+        return None
+
+    names = [name for name in parts[-1] if name != 'time']
+    data = {
+        name: np.concatenate([p.get(name, np.full(len(p['time']), np.nan)) for p in parts])
+        for name in names
+    }
+    index = pd.DatetimeIndex(np.concatenate([p['time'] for p in parts]).astype('datetime64[ns]'), name='time')
+    df = pd.DataFrame(data, index=index)
+    if adjustflag != '3':
+        df = adjust_bars(df, factors, adjustflag)
+    return df
+
+
+def fetch_intraday_incremental(stock_code, frequency, start_date, end_date, fetch_fn):
+    """
+    只向数据源请求仓库最后一根 K 线之后的分钟线并追加。
+
+    参数:
+        fetch_fn: fetch_fn(stock_code, start_date, end_date) -> DataFrame | None（不复权分钟线，time 索引）
+
+    返回:
+        int | None: 追加的 K 线数；请求失败返回 None
+    """
+    end_date = _to_dash_date(end_date)
+    last = last_bar_time(stock_code, frequency)
+    if last is None:
+        fetch_from = _to_dash_date(start_date)
+    else:
+        fetch_from = last.strftime("%Y-%m-%d")
+        # 最后一根已是收盘 K 线且之后到目标日没有交易日：无需请求
+        closed = (last.hour, last.minute) >= _CLOSE_TIME
+        if fetch_from > end_date or (closed and not _has_trading_day_after(fetch_from, end_date)):
+            return 0
+    fetched = fetch_fn(stock_code, fetch_from, end_date)
+    if fetched is None:
+        return None
+    return append_bars(stock_code, frequency, fetched)
+
+
+def intraday_signal_filters(signal_filters, frequency):
+    """
+    日线信号过滤参数 → 分钟线：历史长度、均值窗口、成功判定窗口等均按 K 线根数计，原样沿用；
+    日均成交额门槛按每日 K 线根数折算为每根的均额（分钟线没有换手率，换手率门槛不生效）。
+    """
+    filters = dict(signal_filters)
+    liquidity = dict(filters.get('liquidity') or {})
+    if liquidity.get('min_avg_amount'):
+        liquidity['min_avg_amount'] = float(liquidity['min_avg_amount']) / bars_per_day(frequency)
+    filters['liquidity'] = liquidity
+    return filters
+
+
+def compute_intraday_signals(stock_code, stock_name, frequency, start_date, end_date,
+                             indicators_config, signal_filters, current_time, fetch_factors_fn=None):
+    """
+    在分钟线仓库的 K 线上计算指标与信号（前复权），返回格式同 compute_signals_for_stock。
+
+    参数:
+        fetch_factors_fn: fetch_factors_fn(stock_code, end_date) -> 复权因子 DataFrame | None；
+            日线仓库中没有该股票的复权因子时用它请求（只用于本次计算，不写入日线仓库）
+
+    返回:
+        dict: 区间内无数据、或拿不到复权因子时返回 skip 结果
+    """
+    from .signal_compute_worker import compute_signals_for_stock
+
+    payload = load_factors(stock_code)
+    factors = payload['factors'] if payload is not None else None
+    if factors is None and fetch_factors_fn is not None:
+        factors = fetch_factors_fn(stock_code, _to_dash_date(end_date))
+    if factors is None:
+        return {
+            'stock_code': stock_code,
+            'stock_name': stock_name,
+            'skip': True,
+            'reason': '缺少复权因子',
+        }
+    df = load_intraday_bars(stock_code, frequency, start_date, end_date, adjustflag='2', factors=factors)
+    if df is None:
+        return {
+            'stock_code': stock_code,
+            'stock_name': stock_name,
+            'skip': True,
+            'reason': '无分钟线数据',
+        }
+    return compute_signals_for_stock(
+        stock_code=stock_code,
+        stock_name=stock_name,
+        df=df,
+        indicators_config=indicators_config,
+        signal_filters=intraday_signal_filters(signal_filters, frequency),
+        current_time=current_time,
+    )
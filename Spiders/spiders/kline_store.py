@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地 K 线仓库：按股票把日线持久化到磁盘，每日只增量拉取缺失区间
+
+每只股票一个 pickle 文件（KLINE_STORE_DIR/<代码>_<复权>.pkl），内容为
+{'version', 'adjustflag', 'covered_from', 'updated_at', 'df'}：
+  - covered_from：仓库已完整覆盖的最早日期（首次全量拉取的起点）
+  - df：与 fetch_kline_data_baostock 返回值同结构的 DataFrame（date 索引）
+
+增量规则（fetch_bars_incremental）：
+  1) 仓库为空 / 文件损坏 → 全量拉取 [start, end] 并写入（冷启动即完成“播种”）
+  2) 请求窗口早于 covered_from → 补拉头部缺口并合并
+  3) 请求窗口晚于仓库最后一根 K 线 → 只拉取 [最后一根, end]，
+     首根与仓库重叠，用于校验前复权价格是否被除权改写；不一致则整段重拉
+  4) 窗口已被仓库完整覆盖，或最后一根 K 线之后到目标日没有交易日（按本地交易日历）→ 不发任何请求
+
+本地复权（fetch_adjusted_bars）：仓库保存不复权日线（adjustflag='3'，历史不会被除权改写），
+另存一份 baostock 复权因子（<代码>_factors.pkl），前复权 / 后复权在本地按因子派生：
+  - 价格列 × 对应日期生效的因子（除权除息日当天起生效，直到下一次除权）
+  - 新 K 线的昨收（preclose，交易所公布的除权参考价）与前一根收盘价不一致 → 发生了除权除息，只刷新一次复权因子
+
+写入采用「临时文件 + os.replace」，进程被杀也不会留下半个文件。
+"""
+
+import os
+import pickle
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .stock_config import KLINE_STORE_DIR, KLINE_STORE_RETENTION_DAYS
+from .trade_calendar import count_trading_days
+
+# 2：K 线含 preclose 列（除权除息检测用）；旧版本仓库视为失效，首次运行重新全量拉取
+_STORE_VERSION = 2
+
+# 重叠 K 线收盘价允许的相对误差（超过即认为复权口径已变化）
+_OVERLAP_TOLERANCE = 1e-6
+
+_FACTOR_VERSION = 1
+# 昨收与前一根收盘价允许的相对误差：除权参考价按 0.01 元取整，一分钱的小额分红在千元股价上也有 5e-6 的相对差
+_PRECLOSE_TOLERANCE = 1e-6
+# 除权日已出现在行情中、但复权因子尚未收录时，最多等待的日历天数
+_FACTOR_LAG_DAYS = 7
+# 复权时需要乘以因子的价格列（成交量 / 涨跌幅 / 估值不受复权影响）
+_PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'preclose')
+
+
+def _to_dash_date(d):
+    """'YYYYMMDD' / 'YYYY-MM-DD' / datetime → 'YYYY-MM-DD'。"""
+    if d is None:
+        return None
+    if isinstance(d, datetime):
+        return d.strftime("%Y-%m-%d")
+    d = str(d)
+    if len(d) == 8 and d.isdigit():
+        return f"{d[:4]}-{d[4:6]}-{d[6:8]}"
+    return d[:10]
+
+
+def _store_path(stock_code, adjustflag):
+    return os.path.join(KLINE_STORE_DIR, f"{stock_code}_{adjustflag}.pkl")
+
+
+def load_bars(stock_code, adjustflag='2'):
+    """
+    读取仓库中的 K 线。
+
+    返回:
+        dict | None: {'covered_from', 'updated_at', 'df'}；不存在或文件损坏返回 None
+    """
+    path = _store_path(stock_code, adjustflag)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or payload.get('version') != _STORE_VERSION:
+        return None
+    df = payload.get('df')
+    if df is None or getattr(df, 'empty', True):
+        return None
+    return payload
+
+
+def save_bars(stock_code, df, covered_from, adjustflag='2'):
+    """原子写入仓库（临时文件 + os.replace），并按保留天数裁剪过旧的 K 线。"""
+    if df is None or df.empty:
+        return
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    keep_from = df.index[-1] - timedelta(days=int(KLINE_STORE_RETENTION_DAYS))
+    if df.index[0] < keep_from:
+        df = df[df.index >= keep_from]
+        covered_from = max(_to_dash_date(covered_from), keep_from.strftime("%Y-%m-%d"))
+    payload = {
+        'version': _STORE_VERSION,
+        'adjustflag': adjustflag,
+        'covered_from': _to_dash_date(covered_from),
+        'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'df': df,
+    }
+    _write_payload(_store_path(stock_code, adjustflag), payload)
+
+
+def _write_payload(path, payload):
+    os.makedirs(KLINE_STORE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def _overlap_consistent(stored_df, fetched_df):
+    """重叠日期的收盘价一致才认为复权口径未变；fetched 中缺少重叠日期也视为不一致。"""
+    common = stored_df.index.intersection(fetched_df.index)
+    if len(common) == 0:
+        return False
+    old = stored_df.loc[common, 'close']
+    new = fetched_df.loc[common, 'close']
+    diff = (old - new).abs()
+    scale = old.abs().where(old.abs() > 0, 1.0)
+    return bool(((diff / scale) <= _OVERLAP_TOLERANCE).all())
+
+
+def _merge(stored_df, fetched_df):
+    merged = pd.concat([stored_df, fetched_df])
+    merged = merged[~merged.index.duplicated(keep='last')]
+    return merged.sort_index()
+
+
+def _window(df, start_date, end_date):
+    start_ts = pd.Timestamp(start_date)
+    end_ts = pd.Timestamp(end_date)
+    out = df[(df.index >= start_ts) & (df.index <= end_ts)]
+    return out.copy() if not out.empty else None
+
+
+def _has_trading_day_after(last_date, end_date):
+    """(last_date, end_date] 内是否有交易日；交易日历未覆盖时保守地认为有。"""
+    next_day = (pd.Timestamp(last_date) + timedelta(days=1)).strftime("%Y-%m-%d")
+    return count_trading_days(next_day, end_date) != 0
+
+
+def fetch_bars_incremental(stock_code, start_date, end_date, fetch_fn, adjustflag='2'):
+    """
+    先查本地仓库，只向数据源请求缺失的日期区间，合并后写回仓库。
+
+    参数:
+        stock_code: 股票代码，如 'sh603288'
+        start_date / end_date: 'YYYYMMDD' 或 'YYYY-MM-DD'
+        fetch_fn: fetch_fn(stock_code, start_date, end_date) -> DataFrame | None，
+                  返回值结构须与 fetch_kline_data_baostock 一致
+        adjustflag: 复权类型，不同复权口径分别存储
+
+    返回:
+        pandas.DataFrame | None: [start_date, end_date] 窗口内的 K 线（与直接全量拉取等价）；
+        None 表示拉取失败或无数据
+    """
+    start_date = _to_dash_date(start_date)
+    end_date = _to_dash_date(end_date) or datetime.now().strftime("%Y-%m-%d")
+
+    payload = load_bars(stock_code, adjustflag)
+    if payload is None:
+        df = fetch_fn(stock_code, start_date, end_date)
+        if df is None or df.empty:
+            return None
+        save_bars(stock_code, df, start_date, adjustflag)
+        return _window(df, start_date, end_date)
+
+    stored = payload['df']
+    covered_from = payload.get('covered_from') or stored.index[0].strftime("%Y-%m-%d")
+    last_date = stored.index[-1].strftime("%Y-%m-%d")
+    changed = False
+
+    # 头部缺口：窗口起点早于仓库覆盖范围（如首次以更长窗口运行）
+    if start_date < covered_from:
+        head = fetch_fn(stock_code, start_date, stored.index[0].strftime("%Y-%m-%d"))
+        if head is None or head.empty:
+            return None
+        if not _overlap_consistent(stored, head):
+            full = fetch_fn(stock_code, start_date, max(end_date, last_date))
+            if full is None or full.empty:
+                return None
+            save_bars(stock_code, full, start_date, adjustflag)
+            return _window(full, start_date, end_date)
+        stored = _merge(stored, head)
+        covered_from = start_date
+        changed = True
+
+    # 尾部增量：从仓库最后一根 K 线（含）拉到目标日，重叠的一根用于复权校验；
+    # 交易日历确认其间没有交易日（周末 / 节假日运行）时无需请求
+    if end_date > last_date and _has_trading_day_after(last_date, end_date):
+        tail = fetch_fn(stock_code, last_date, end_date)
+        if tail is None or tail.empty:
+            return None
+        if not _overlap_consistent(stored, tail):
+            # 除权除息等导致前复权历史被整体改写：整段重拉
+            full = fetch_fn(stock_code, min(start_date, covered_from), end_date)
+            if full is None or full.empty:
+                return None
+            save_bars(stock_code, full, min(start_date, covered_from), adjustflag)
+            return _window(full, start_date, end_date)
+        stored = _merge(stored, tail)
+        changed = True
+
+    if changed:
+        save_bars(stock_code, stored, covered_from, adjustflag)
+    return _window(stored, start_date, end_date)
+
+
+def _factor_path(stock_code):
+    return os.path.join(KLINE_STORE_DIR, f"{stock_code}_factors.pkl")
+
+
+def load_factors(stock_code):
+    """
+    读取复权因子。
+
+    返回:
+        dict | None: {'checked_to', 'updated_at', 'factors'}；factors 为以除权除息日为索引、
+        含 fore / back 两列的 DataFrame（无除权记录时为空表）
+    """
+    path = _factor_path(stock_code)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(payload, dict) or payload.get('version') != _FACTOR_VERSION:
+        return None
+    if payload.get('factors') is None:
+        return None
+    return payload
+
+
+def save_factors(stock_code, factors, checked_to):
+    """checked_to：该日期（含）之前的除权除息已确认包含在 factors 中。"""
+    _write_payload(_factor_path(stock_code), {
+        'version': _FACTOR_VERSION,
+        'checked_to': _to_dash_date(checked_to),
+        'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'factors': factors.sort_index(),
+    })
+
+
+def _corporate_action_dates(raw_df, since=None):
+    """
+    不复权 K 线中发生除权除息的日期（晚于 since）：当日昨收 preclose ≠ 前一根收盘价（相对误差）。
+    缺少昨收的行（数据源未提供）退回按 close / (1 + 涨跌幅) 反推。
+    """
+    if raw_df is None or len(raw_df) < 2:
+        return []
+    close = raw_df['close'].to_numpy(dtype=float)
+    preclose = np.full(len(raw_df) - 1, np.nan)
+    if 'preclose' in raw_df.columns:
+        preclose = raw_df['preclose'].to_numpy(dtype=float, copy=True)[1:]
+    missing = np.isnan(preclose)
+    if missing.any() and 'change_rate' in raw_df.columns:
+        rate = raw_df['change_rate'].to_numpy(dtype=float)[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            preclose[missing] = close[1:][missing] / (1.0 + rate[missing] / 100.0)
+    prev_close = close[:-1]
+    with np.errstate(invalid='ignore'):
+        jumped = np.abs(preclose - prev_close) > _PRECLOSE_TOLERANCE * np.abs(prev_close)
+    jumped &= np.isfinite(preclose)
+    dates = raw_df.index[1:][jumped]
+    if since is not None:
+        dates = dates[dates > pd.Timestamp(since)]
+    return list(dates)
+
+
+def adjust_bars(raw_df, factors, adjustflag='2'):
+    """
+    由不复权 K 线和复权因子计算复权 K 线。
+
+    参数:
+        raw_df: 不复权 K 线（date 索引）
+        factors: load_factors()['factors']，列 fore（前复权因子）/ back（后复权因子）
+        adjustflag: '1'=后复权, '2'=前复权, '3'=不复权（原样返回副本）
+
+    返回:
+        pandas.DataFrame: 结构与 raw_df 相同，价格列已复权
+    """
+    df = raw_df.copy()
+    if adjustflag == '3' or df.empty:
+        return df
+    column = 'fore' if adjustflag == '2' else 'back'
+    if factors is None or factors.empty:
+        return df
+    event_days = factors.index.to_numpy(dtype='datetime64[ns]')
+    values = factors[column].to_numpy(dtype=float)
+    # 首次除权之前：后复权因子为 1，前复权因子按 前/后 的固定比例推出
+    before_first = 1.0 if column == 'back' else float(factors['fore'].iloc[0] / factors['back'].iloc[0])
+    pos = np.searchsorted(event_days, df.index.to_numpy(dtype='datetime64[ns]'), side='right') - 1
+    factor = np.where(pos >= 0, values[np.maximum(pos, 0)], before_first)
+    for col in _PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].to_numpy(dtype=float) * factor
+    return df
+
+
+def fetch_adjusted_bars(stock_code, start_date, end_date, fetch_raw_fn, fetch_factors_fn, adjustflag='2'):
+    """
+    不复权 K 线走仓库增量拉取，复权在本地完成；仅在发现新的除权除息时刷新复权因子。
+
+    参数:
+        fetch_raw_fn: fetch_raw_fn(stock_code, start_date, end_date) -> 不复权 DataFrame | None
+        fetch_factors_fn: fetch_factors_fn(stock_code, end_date) -> 复权因子 DataFrame | None（None 表示请求失败）
+        adjustflag: 返回的复权类型（'1' / '2' / '3'）
+
+    返回:
+        pandas.DataFrame | None: [start_date, end_date] 窗口内的复权 K 线
+    """
+    raw = fetch_bars_incremental(stock_code, start_date, end_date, fetch_raw_fn, adjustflag='3')
+    if raw is None or adjustflag == '3':
+        return raw
+
+    payload = load_factors(stock_code)
+    checked_to = payload.get('checked_to') if payload else None
+    stale = (
+        payload is None
+        or checked_to is None
+        or pd.Timestamp(checked_to) < raw.index[0] - timedelta(days=1)
+        or bool(_corporate_action_dates(raw, checked_to))
+    )
+    if not stale:
+        return adjust_bars(raw, payload['factors'], adjustflag)
+
+    factors = fetch_factors_fn(stock_code, _to_dash_date(end_date))
+    if factors is None:
+        return None
+    # 数据源的复权因子可能晚于行情更新：近期尚未收录的除权日之后不算已确认，下次运行再刷新；
+    # 更早仍未收录的视为误判（如上市首日），不再反复刷新
+    recent = raw.index[-1] - timedelta(days=_FACTOR_LAG_DAYS)
+    missing = [d for d in _corporate_action_dates(raw, recent) if d not in factors.index]
+    if missing:
+        checked_to = (min(missing) - timedelta(days=1)).strftime("%Y-%m-%d")
+    else:
+        checked_to = raw.index[-1].strftime("%Y-%m-%d")
+    save_factors(stock_code, factors, checked_to)
+    return adjust_bars(raw, factors, adjustflag)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+季度财务数据缓存：query_profit_data 的结果按 (股票, 年, 季度) 持久化到 SQLite（PROFIT_CACHE_FILE）
+
+季度财报每年最多更新四次，逐日重复请求是浪费。按定期报告披露日历判断是否需要请求：
+  - 季度尚未结束：不可能有数据，不请求
+  - 已缓存有数据的季度：不再请求（已发布的财报视为定稿）
+  - 已缓存无数据的季度：仍在披露期内（季度结束 ~ 法定截止日 + 数据源延迟）时每 PROFIT_CACHE_RECHECK_DAYS 天重查一次；
+    过了披露期仍无数据（未上市 / 未披露）不再请求
+法定截止日：一季报 4-30、半年报 8-31、三季报 10-31、年报次年 4-30。
+
+请求失败（错误码非 0）不写缓存，下次照常请求。多个进程池子进程并发读写，使用 WAL 与忙等待超时。
+"""
+
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from .stock_config import PROFIT_CACHE_FILE, PROFIT_CACHE_RECHECK_DAYS
+
+# 数据源（baostock）收录财报相对法定截止日的延迟（天）
+_PUBLISH_LAG_DAYS = 15
+# 各季度报告的法定披露截止日：(相对报告年份的年偏移, 月, 日)
+_REPORT_DEADLINES = {1: (0, 4, 30), 2: (0, 8, 31), 3: (0, 10, 31), 4: (1, 4, 30)}
+_QUARTER_END = {1: (3, 31), 2: (6, 30), 3: (9, 30), 4: (12, 31)}
+
+# 当前进程的连接：(pid, connection)；fork 出的子进程不复用父进程的连接
+_CONN = None
+
+
+def _connect():
+    global _CONN
+    if _CONN is not None and _CONN[0] == os.getpid():
+        return _CONN[1]
+    os.makedirs(os.path.dirname(PROFIT_CACHE_FILE) or '.', exist_ok=True)
+    conn = sqlite3.connect(PROFIT_CACHE_FILE, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS profit_quarter (
+            stock_code TEXT,
+            year INTEGER,
+            quarter INTEGER,
+            has_data INTEGER,
+            eps_ttm REAL,
+            row_json TEXT,
+            fetched_at TEXT,
+            PRIMARY KEY (stock_code, year, quarter)
+        )
+    ''')
+    conn.commit()
+    _CONN = (os.getpid(), conn)
+    return conn
+
+
+def quarter_end(year, quarter):
+    month, day = _QUARTER_END[quarter]
+    return date(year, month, day)
+
+
+def report_deadline(year, quarter):
+    """该季度报告在数据源中应当出现的最晚日期（法定截止日 + 数据源延迟）。"""
+    offset, month, day = _REPORT_DEADLINES[quarter]
+    return date(year + offset, month, day) + timedelta(days=_PUBLISH_LAG_DAYS)
+
+
+def _as_date(d):
+    if d is None:
+        return date.today()
+    if isinstance(d, datetime):
+        return d.date()
+    return d
+
+
+def get_quarter(stock_code, year, quarter):
+    """返回缓存项 {'has_data', 'eps_ttm', 'row', 'fetched_at'}，未缓存返回 None。"""
+    cur = _connect().execute(
+        'SELECT has_data, eps_ttm, row_json, fetched_at FROM profit_quarter '
+        'WHERE stock_code = ? AND year = ? AND quarter = ?',
+        (stock_code, int(year), int(quarter)),
+    )
+    item = cur.fetchone()
+    if item is None:
+        return None
+    return {
+        'has_data': bool(item[0]),
+        'eps_ttm': item[1],
+        'row': json.loads(item[2]) if item[2] else None,
+        'fetched_at': item[3],
+    }
+
+
+def put_quarter(stock_code, year, quarter, row, eps_ttm=None):
+    """写入一个季度的请求结果；row 为 None 表示数据源暂无该季度数据。"""
+    conn = _connect()
+    conn.execute(
+        'INSERT OR REPLACE INTO profit_quarter '
+        '(stock_code, year, quarter, has_data, eps_ttm, row_json, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (
+            stock_code, int(year), int(quarter), 1 if row else 0, eps_ttm,
+            json.dumps(row, ensure_ascii=False) if row else None,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        ),
+    )
+    conn.commit()
+
+
+def needs_fetch(entry, year, quarter, as_of=None, today=None):
+    """
+    按披露日历判断是否需要请求该季度。
+
+    参数:
+        entry: get_quarter() 的返回值（None 表示未缓存）
+        as_of: 查询基准日（通常为目标交易日），决定季度是否已结束、是否已过披露期
+        today: 当前日期（决定距上次重查是否已满 PROFIT_CACHE_RECHECK_DAYS 天）
+    """
+    as_of = _as_date(as_of)
+    if quarter_end(year, quarter) >= as_of:
+        return False
+    if entry is None:
+        return True
+    if entry['has_data']:
+        return False
+    fetched = datetime.strptime(entry['fetched_at'][:10], "%Y-%m-%d").date()
+    # 上次请求时已过披露期仍无数据：不会再出现
+    if fetched > report_deadline(year, quarter):
+        return False
+    return (_as_date(today) - fetched).days >= int(PROFIT_CACHE_RECHECK_DAYS)
+
+
+def latest_quarter_row(stock_code, as_of, fetch_fn, quarters):
+    """
+    按 quarters 顺序（从新到旧）找到第一个有数据的季度，只请求缓存无法确定的季度。
+
+    参数:
+        stock_code: 缓存键（如 'sh.600000'）
+        fetch_fn: fetch_fn(year, quarter) -> dict（有数据）| {}（无数据）| None（请求失败）
+        quarters: [(year, quarter), ...]，从新到旧
+
+    返回:
+        (year, quarter, entry) | None：entry 同 get_quarter()
+    """
+    for year, quarter in quarters:
+        entry = get_quarter(stock_code, year, quarter)
+        if needs_fetch(entry, year, quarter, as_of):
+            row = fetch_fn(year, quarter)
+            if row is None:
+                continue
+            eps_ttm = _safe_eps(row.get('epsTTM')) if row else None
+            put_quarter(stock_code, year, quarter, row or None, eps_ttm)
+            entry = {'has_data': bool(row), 'eps_ttm': eps_ttm, 'row': row or None, 'fetched_at': None}
+        if entry is not None and entry['has_data']:
+            return year, quarter, entry
+    return None
+
+
+def _safe_eps(v):
+    try:
+        return float(v) if v not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
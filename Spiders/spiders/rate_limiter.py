@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+跨进程令牌桶限流：所有 baostock 请求（各拉取子进程 + 独立脚本）共用同一个全局速率上限
+
+状态保存在一个小文件中（"令牌数 上次补充时间戳"），每次取令牌时用 fcntl 文件锁互斥读写：
+  - 令牌按 rate（个/秒）持续补充，最多积攒 burst 个
+  - 有令牌则立即取走；没有则计算需等待的时间，释放锁后休眠再重试
+这样无论开几个进程，总请求速率都不超过 rate，短时突发不超过 burst。
+
+无 fcntl 的平台（Windows）退化为进程内令牌桶，仅限制单进程速率。
+"""
+
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from .stock_config import (
+    BAOSTOCK_RATE_LIMIT_BURST,
+    BAOSTOCK_RATE_LIMIT_RPS,
+    BAOSTOCK_RATE_LIMIT_STATE_FILE,
+)
+
+
+class TokenBucket:
+    """基于文件锁的跨进程令牌桶；同一 state_file 的所有实例共享同一个桶。"""
+
+    def __init__(self, rate, burst, state_file):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.state_file = state_file
+        # 无 fcntl 时的进程内状态
+        self._local_tokens = self.burst
+        self._local_ts = time.time()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _take(self, tokens, last_ts, now):
+        """补充令牌并尝试取一个；返回 (新令牌数, 需等待秒数)。"""
+        tokens = min(self.burst, tokens + max(0.0, now - last_ts) * self.rate)
+        if tokens >= 1.0:
+            return tokens - 1.0, 0.0
+        return tokens, (1.0 - tokens) / self.rate
+
+    def _acquire_local(self):
+        while True:
+            now = time.time()
+            self._local_tokens, wait = self._take(self._local_tokens, self._local_ts, now)
+            self._local_ts = now
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _acquire_shared(self):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        while True:
+            with open(self.state_file, "a+") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read().split()
+                    now = time.time()
+                    try:
+                        tokens, last_ts = float(raw[0]), float(raw[1])
+                    except (IndexError, ValueError):
+                        tokens, last_ts = self.burst, now
+                    tokens, wait = self._take(tokens, last_ts, now)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(f"{tokens:.6f} {now:.6f}")
+                    f.flush()
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def acquire(self):
+        """取一个令牌，必要时阻塞等待；rate<=0 时不限流。"""
+        if not self.enabled:
+            return
+        if fcntl is None:
+            self._acquire_local()
+            return
+        try:
+            self._acquire_shared()
+        except OSError:
+            # 状态文件不可写（只读目录等）时退化为进程内限流，不影响拉取
+            self._acquire_local()
+
+
+_BAOSTOCK_BUCKET = None
+
+
+def acquire_baostock_token():
+    """所有 baostock 请求发出前调用：从全局共享令牌桶取一个令牌。"""
+    global _BAOSTOCK_BUCKET
+    if _BAOSTOCK_BUCKET is None:
+        _BAOSTOCK_BUCKET = TokenBucket(
+            BAOSTOCK_RATE_LIMIT_RPS,
+            BAOSTOCK_RATE_LIMIT_BURST,
+            BAOSTOCK_RATE_LIMIT_STATE_FILE,
+        )
+    _BAOSTOCK_BUCKET.acquire()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按运行日期记录的运行日志（journal），进程中途被杀后同一日期重跑可从断点继续
+
+每个运行日期一个 jsonl 文件（RUN_JOURNAL_DIR/<YYYYMMDD>.jsonl），逐行追加并 fsync：
+  - 首行 {'type': 'run', 'signal_file', 'offset', 'started'}：本次运行的信号文件及表头结束位置
+  - {'type': 'stock', 'code', 'status', 'offset', 'name', 'row'}：单只股票的结果已写入信号文件和数据库
+      status：'done'（完成，含被过滤）/ 'error'（计算出错，不重试）/ 'failed'（瞬时失败，续跑时重试）
+      offset：写完该股票后信号文件的字节长度
+      row：最后一根 K 线的估值字段（续跑时用于生成 stock_detail_data.csv）
+  - {'type': 'finished'}：本次运行正常结束
+
+续跑（resume）：journal 存在、未标记 finished、且信号文件不短于最后记录的 offset 时，
+把信号文件截断到该 offset（丢弃崩溃时写了一半、尚未记入 journal 的股票块），跳过已完成的股票。
+数据库写入按股票幂等（INSERT OR IGNORE / 先删后插），被截断的股票重做不会产生重复记录。
+已正常结束的运行不续跑：同一日期再次运行视为有意重跑，从头开始。
+"""
+
+import json
+import numbers
+import os
+import time
+
+import pandas as pd
+
+from .stock_config import RUN_JOURNAL_DIR
+
+# 记录到 journal 的最后一根 K 线字段（_export_valuation_csv 所需）
+JOURNAL_ROW_FIELDS = (
+    'close', 'change_rate', 'volume', 'amount', 'high', 'low', 'open', 'turnover', 'peTTM', 'pbMRQ',
+)
+# 续跑时视为已完成、不再处理的状态
+_FINAL_STATUSES = ('done', 'error')
+
+
+def _row_to_dict(df):
+    """DataFrame 最后一行的估值字段 → 可 JSON 序列化的 dict；无数据返回 None。"""
+    if df is None or getattr(df, 'empty', True):
+        return None
+    last = df.iloc[-1]
+    row = {}
+    for field in JOURNAL_ROW_FIELDS:
+        value = last.get(field)
+        if value is None or pd.isna(value):
+            row[field] = None
+        else:
+            try:
+                # 整数列（成交量）保持整数，续跑生成的 CSV 与一次跑完的一致
+                row[field] = int(value) if isinstance(value, numbers.Integral) else float(value)
+            except (TypeError, ValueError):
+                row[field] = None
+    return row
+
+
+class RunJournal:
+    """单个运行日期的 journal：open() 决定续跑或新建，record() 逐只追加。"""
+
+    def __init__(self, path, signal_file):
+        self.path = path
+        self.signal_file = signal_file
+        self.entries = {}
+        self.resumed = False
+        self._file = None
+
+    @classmethod
+    def open(cls, run_date, signal_file, resume=True):
+        """
+        打开 run_date 的 journal。
+
+        参数:
+            run_date: 'YYYYMMDD'
+            signal_file: 本次运行的信号文件路径
+            resume: False 时忽略已有 journal，从头开始
+
+        返回:
+            RunJournal：resumed 为 True 表示续跑（信号文件已截断到最后记录的位置，调用方不应再重写表头）
+        """
+        journal = cls(os.path.join(RUN_JOURNAL_DIR, f"{run_date}.jsonl"), signal_file)
+        if resume and journal._load_for_resume():
+            journal.resumed = True
+        return journal
+
+    def _load_for_resume(self):
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return False
+
+        header = None
+        entries = {}
+        last_offset = None
+        valid_end = 0
+        pos = 0
+        for line in raw.splitlines(keepends=True):
+            pos += len(line)
+            if not line.endswith(b'\n'):
+                break  # 崩溃时写了一半的最后一行
+            try:
+                item = json.loads(line)
+            except ValueError:
+                break
+            valid_end = pos
+            kind = item.get('type')
+            if kind == 'run':
+                header = item
+                last_offset = item.get('offset')
+            elif kind == 'stock' and header is not None:
+                entries[item['code']] = item
+                last_offset = item.get('offset', last_offset)
+            elif kind == 'finished':
+                return False
+
+        if header is None or header.get('signal_file') != os.path.basename(self.signal_file):
+            return False
+        try:
+            size = os.path.getsize(self.signal_file)
+        except OSError:
+            return False
+        if last_offset is None or size < last_offset:
+            return False
+
+        # 丢弃尾部残缺行与信号文件中未记入 journal 的内容
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid_end)
+        with open(self.signal_file, 'r+b') as f:
+            f.truncate(last_offset)
+        self.entries = entries
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return True
+
+    def start(self):
+        """新建 journal（覆盖旧文件），记录信号文件表头结束位置；须在写完信号文件表头后调用。"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._append({
+            'type': 'run',
+            'signal_file': os.path.basename(self.signal_file),
+            'offset': os.path.getsize(self.signal_file),
+            'started': time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def _append(self, item):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, stock_code, status, stock_name=None, df=None):
+        """记录单只股票已处理完毕（信号文件与数据库均已写入）。"""
+        item = {
+            'type': 'stock',
+            'code': stock_code,
+            'status': status,
+            'offset': os.path.getsize(self.signal_file),
+            'name': stock_name,
+            'row': _row_to_dict(df),
+        }
+        self.entries[stock_code] = item
+        self._append(item)
+
+    def finish(self):
+        """标记本次运行正常结束：之后同一日期再运行时从头开始。"""
+        self._append({'type': 'finished', 'finished': time.strftime("%Y-%m-%d %H:%M:%S")})
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+    def completed_codes(self):
+        return {code for code, item in self.entries.items() if item.get('status') in _FINAL_STATUSES}
+
+    def resumed_results(self):
+        """已完成股票的 {code: (code, name, 单行 DataFrame | None)}，格式同 run() 中的 results。"""
+        results = {}
+        for code, item in self.entries.items():
+            if item.get('status') not in _FINAL_STATUSES:
+                continue
+            row = item.get('row')
+            df = pd.DataFrame([row], dtype=object) if row else None
+            results[code] = (code, item.get('name') or code, df)
+        return results
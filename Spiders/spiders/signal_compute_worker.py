@@ -6,7 +6,8 @@
 
 import pandas as pd
 import bisect
-from .technical_indicators import TechnicalIndicators
+from .indicator_engine import calculate_indicators
+from .trade_calendar import is_trading_day
 
 
 # ---------------------------------------------------------------------------
@@ -438,7 +439,7 @@ def _analyze_signals(df, stock_code, current_time, signal_filters):
 
     if len(df) >= 4:
         df.index = pd.to_datetime(df.index)
-        trading_days = df[df.index.dayofweek < 5].index
+        trading_days = df.index[is_trading_day(df.index)]
         last_3_trading_days = trading_days[-3:]
         last_3_days = df.loc[last_3_trading_days].copy()
 
@@ -665,9 +666,11 @@ def _detect_signals(df, current_row, prev_row, i, is_recent=False):
 # 顶层 worker 入口 —— ProcessPoolExecutor 调用此函数
 # ---------------------------------------------------------------------------
 
-def compute_signals_for_stock(stock_code, stock_name, df, indicators_config, signal_filters, current_time):
+def compute_signals_for_stock(stock_code, stock_name, df, indicators_config, signal_filters, current_time,
+                              indicators_ready=False):
     """
     在子进程中执行的 worker 函数。
+    indicators_ready：df 已带全部指标列（面板模式整体算好，见 indicator_panel），不再计算指标。
     返回 dict:
       - stock_code, stock_name
       - kdj_analysis: analyze_signals 的完整返回
@@ -703,7 +706,8 @@ def compute_signals_for_stock(stock_code, stock_name, df, indicators_config, sig
 
         last_close_price = df.iloc[-1]['close']
 
-        df = TechnicalIndicators.calculate_all(df, indicators_config)
+        if not indicators_ready:
+            df = calculate_indicators(df, indicators_config)
         kdj_analysis = _analyze_signals(df, stock_code, current_time, signal_filters)
 
         # 量能热度分：不再作为硬门槛，仅作为信号输出的排序/展示权重
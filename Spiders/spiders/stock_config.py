@@ -69,19 +69,161 @@ DATA_SOURCE = 'baostock'  # 默认使用 baostock
 # 实测 8 进程稳定；12 进程会出现大量 Broken pipe，不建议超过 8
 BAOSTOCK_FETCH_WORKERS = 3
 
+# 自适应并发（AIMD）：以 BAOSTOCK_FETCH_WORKERS 为初始在途任务数，运行时按延迟/超时/断连动态升降，
+# 在 [BAOSTOCK_MIN_FETCH_WORKERS, BAOSTOCK_MAX_FETCH_WORKERS] 内收敛到当天服务端能承受的最高吞吐
+# 仅作用于并行流水线模式；False：固定使用 BAOSTOCK_FETCH_WORKERS
+BAOSTOCK_ADAPTIVE_CONCURRENCY = True
+BAOSTOCK_MIN_FETCH_WORKERS = 1
+# 上限即进程池大小（每个进程一个 baostock 会话）；实测 12 进程会大量 Broken pipe，不建议超过 8
+BAOSTOCK_MAX_FETCH_WORKERS = 8
+
+# 对冲执行（仅并行流水线）：单只股票耗时超过「近期完成耗时的 P 分位 × 倍数」（不低于 MIN_SECONDS）时，
+# 在空闲 worker 上再提交一份，先完成者生效；样本少于 MIN_SAMPLES 时不对冲，对冲总数不超过已提交数 × MAX_RATIO
+BAOSTOCK_HEDGE_ENABLE = True
+BAOSTOCK_HEDGE_PERCENTILE = 95
+BAOSTOCK_HEDGE_MULTIPLIER = 2.0
+BAOSTOCK_HEDGE_MIN_SAMPLES = 20
+BAOSTOCK_HEDGE_MIN_SECONDS = 10.0
+BAOSTOCK_HEDGE_MAX_RATIO = 0.1
+# 为对冲副本预留的 worker 数：预留计入 BAOSTOCK_MAX_FETCH_WORKERS 之内，常规任务最多占「上限 - 预留」个 worker，
+# 否则并发已满（固定并发、或自适应并发已到上限）时永远没有空闲 worker，对冲不会触发；
+# 0 表示不预留（对冲只在并发未满时发生）。预留的 worker 与其他 worker 一样在进程池创建时启动并登录 baostock，
+# 进程池总数（即会话数）不超过 BAOSTOCK_MAX_FETCH_WORKERS
+BAOSTOCK_HEDGE_RESERVED_WORKERS = 1
+
+# 失败重试队列（仅并行流水线）：拉取失败 / 超时 / 卡死的股票在 BASE_DELAY × 2^(n-1) 秒（不超过 MAX_DELAY）后
+# 重新提交到同一进程池，与正常任务交错执行；每只最多重试 MAX_ATTEMPTS 次，仍失败则放弃
+BAOSTOCK_RETRY_MAX_ATTEMPTS = 5
+BAOSTOCK_RETRY_BASE_DELAY = 2.0
+BAOSTOCK_RETRY_MAX_DELAY = 60.0
+
+# 日线 K 线数据源（data_sources.py）：按顺序列出可用数据源，运行时按健康度与平滑延迟选源，失败自动切换
+#   'baostock'：字段最全（含估值 / 停牌 / ST）；'eastmoney'：东方财富 K 线接口（缺少的字段为空值）；
+#   'local:<目录>'：本地替身数据源（<目录>/<代码>.pkl 或 .csv），用于测试与回放
+# 逗号分隔，可用环境变量 KLINE_SOURCES 覆盖；默认只用 baostock（与旧行为一致）
+KLINE_SOURCES = [s.strip() for s in os.environ.get('KLINE_SOURCES', 'baostock').split(',') if s.strip()]
+# 竞速：首选源超过「平滑延迟 × MULTIPLIER」（不低于 MIN_SECONDS）仍未返回时，同时请求下一个数据源，先返回者生效
+KLINE_SOURCE_RACE = True
+KLINE_SOURCE_RACE_MIN_SECONDS = 5.0
+KLINE_SOURCE_RACE_MULTIPLIER = 3.0
+# 数据源连续失败后的冷却：COOLDOWN × 2^(n-1) 秒（不超过 MAX_COOLDOWN），冷却中的数据源排在最后
+KLINE_SOURCE_COOLDOWN = 30.0
+KLINE_SOURCE_MAX_COOLDOWN = 600.0
+
 # 每个子进程内，每 N 次 K 线 query_history_k_data_plus 后强制 logout+login（0 表示关闭）
-# 不宜过小（如 <30）：过于频繁重登易被服务端断连；建议 50～150
-BAOSTOCK_RELOGIN_EVERY_N_REQUESTS = 40
+# 进程池子进程已在 initializer 中预登录，且仅在出现未登录/网络类错误码时才重登，默认关闭周期性重登；
+# 若服务端会主动掐断长会话，可设为 50～150（不宜 <30：过于频繁重登易被服务端断连）
+BAOSTOCK_RELOGIN_EVERY_N_REQUESTS = 0
+
+# 本地缓存根目录（项目根目录下 cache/，已加入 .gitignore）：K 线仓库、限流状态等
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'cache'
+)
+# 回放（BAOSTOCK_BACKEND=replay，见下方）不读写生产缓存：CACHE_DIR 改指向录制目录下的 scratch/，
+# K 线仓库、利润缓存、交易日历、拉取历史、运行日志等都落在这里；信号报告、stock_signals.db 与
+# stock_detail_data.csv 也写到 REPLAY_SCRATCH_DIR。run.py --baostock-replay 每次启动前清空它，保证回放耗时可重复
+_PRODUCTION_CACHE_DIR = CACHE_DIR
+REPLAY_SCRATCH_DIR = None
+if os.environ.get('BAOSTOCK_BACKEND', 'live').lower() == 'replay':
+    REPLAY_SCRATCH_DIR = os.path.join(
+        os.environ.get('BAOSTOCK_REPLAY_DIR') or os.path.join(_PRODUCTION_CACHE_DIR, 'baostock_replay'), 'scratch'
+    )
+    CACHE_DIR = REPLAY_SCRATCH_DIR
+
+# 全局限流（跨进程令牌桶）：所有拉取子进程与独立脚本（backfill_prices / fill_stock_detail_data 等）
+# 共用同一个桶，总请求速率不超过 RPS，短时突发不超过 BURST；替代原先每个进程各自 sleep+jitter
+# 请求包括登录与每次查询；仍频繁 Broken pipe 时调低 RPS 即可（0 表示不限流）
+BAOSTOCK_RATE_LIMIT_RPS = 10.0
+BAOSTOCK_RATE_LIMIT_BURST = 10
+# 令牌桶共享状态文件（fcntl 文件锁保护）
+BAOSTOCK_RATE_LIMIT_STATE_FILE = os.path.join(CACHE_DIR, 'baostock_rate_limit.state')
+
+# 熔断（circuit_breaker.py）：所有拉取子进程与独立脚本共享。近 WINDOW 秒内请求数 ≥ MIN_CALLS 且网络类失败
+# （超时 / 连接异常 / 100020xx 错误码）占比 ≥ FAILURE_RATIO 时，全部暂停拉取 PAUSE 秒，到期只放行一个探测请求：
+# 成功即恢复，失败则暂停时长翻倍（最多 MAX_PAUSE）；持续熔断超过 GIVE_UP_SECONDS 后请求直接失败、不再等待
+BAOSTOCK_BREAKER_ENABLE = True
+BAOSTOCK_BREAKER_WINDOW = 60
+BAOSTOCK_BREAKER_MIN_CALLS = 10
+BAOSTOCK_BREAKER_FAILURE_RATIO = 0.5
+BAOSTOCK_BREAKER_PAUSE = 5.0
+BAOSTOCK_BREAKER_MAX_PAUSE = 120.0
+BAOSTOCK_BREAKER_GIVE_UP_SECONDS = 1800
+BAOSTOCK_BREAKER_STATE_FILE = os.path.join(CACHE_DIR, 'baostock_breaker.state')
+
+# 拉取顺序按历史调度（fetch_history.py）：跨运行记录每只股票的拉取耗时与失败次数，
+# 已知的慢 / 不稳定股票（预期代价前 FETCH_STRAGGLER_RATIO）最先提交并与快股票交错，缩短运行尾部
+FETCH_HISTORY_ENABLE = True
+FETCH_HISTORY_FILE = os.path.join(CACHE_DIR, 'fetch_history.json')
+FETCH_STRAGGLER_RATIO = 0.1
+# 预期代价中每次（衰减后）失败折算的秒数
+FETCH_HISTORY_FAILURE_PENALTY = 30.0
 
-# 每只股票任务开始前休眠（秒），减轻多进程同时打满连接；仍频繁 Broken pipe 时可试 0.15～0.35
-BAOSTOCK_INTER_REQUEST_SLEEP_SEC = 0.2
-# 在上一项基础上再随机加 [0, jitter) 秒，错开唤醒；可与 sleep 二选一或组合
-BAOSTOCK_INTER_REQUEST_JITTER_SEC = 0.2
+# baostock 后端（性能测试用录制 / 回放，见 baostock_replay.py）：
+# 'live' 直连；'record' 直连并把响应录制到 BAOSTOCK_REPLAY_DIR；'replay' 不联网，从录制目录回放
+# 均可用同名环境变量覆盖（子进程继承环境变量）；run.py --baostock-record / --baostock-replay 会设置它们
+BAOSTOCK_BACKEND = os.environ.get('BAOSTOCK_BACKEND', 'live')
+BAOSTOCK_REPLAY_DIR = os.environ.get('BAOSTOCK_REPLAY_DIR') or os.path.join(_PRODUCTION_CACHE_DIR, 'baostock_replay')
+# 回放故障注入：每次请求固定延迟 ± 抖动（秒）、返回网络错误码的概率、卡死概率与卡死时长（秒，
+# 不小于 BAOSTOCK_SOCKET_TIMEOUT 时按超时抛出）；SEED 固定时同样的请求序列得到同样的故障
+BAOSTOCK_REPLAY_LATENCY = float(os.environ.get('BAOSTOCK_REPLAY_LATENCY', 0))
+BAOSTOCK_REPLAY_JITTER = float(os.environ.get('BAOSTOCK_REPLAY_JITTER', 0))
+BAOSTOCK_REPLAY_ERROR_RATE = float(os.environ.get('BAOSTOCK_REPLAY_ERROR_RATE', 0))
+BAOSTOCK_REPLAY_STALL_RATE = float(os.environ.get('BAOSTOCK_REPLAY_STALL_RATE', 0))
+BAOSTOCK_REPLAY_STALL_SECONDS = float(os.environ.get('BAOSTOCK_REPLAY_STALL_SECONDS', 0))
+BAOSTOCK_REPLAY_SEED = int(os.environ.get('BAOSTOCK_REPLAY_SEED', 0))
 
 # baostock 并行模式是否在子进程内“拉取后立即计算信号”（流水线模式）
 # True：每个子进程 fetch K线 -> 计算指标/信号 -> 返回结果给主进程做 I/O（写文件/SQLite/导出）
 # False：维持旧模式（先拉完全部，再单独开计算进程池）
 BAOSTOCK_PIPELINE_FETCH_AND_COMPUTE = True
+# 流水线每个任务处理的股票数：一个 future 依次拉取+计算 N 只，结果只回传主进程写入所需的精简 K 线，
+# 参数序列化、结果回传与主进程唤醒按块摊薄；块内单只出错不影响其余股票。1：每只股票一个任务（旧行为）
+BAOSTOCK_PIPELINE_CHUNK_SIZE = 8
+# 块内预取：子进程在后台线程拉取下一只股票的 K 线，同时计算当前股票的指标与信号（网络等待与 CPU 计算重叠）
+# 最多预取一只，不增加进程数与 baostock 会话；块大小为 1 时无可预取。False：块内逐只先拉取后计算
+BAOSTOCK_PIPELINE_PREFETCH = True
+
+# 本地 K 线仓库（增量拉取）：每只股票的日线持久化到 KLINE_STORE_DIR，
+# 之后每日只请求「仓库最后一根 K 线 ~ 目标日」的缺失区间（重叠的一根用于校验前复权是否被除权改写）
+# False：每次都全量拉取一年日线（旧行为）
+KLINE_STORE_ENABLE = True
+# 仓库目录（cache/kline）
+KLINE_STORE_DIR = os.path.join(CACHE_DIR, 'kline')
+# 仓库最多保留的日历天数（需覆盖信号计算窗口 365 天）
+KLINE_STORE_RETENTION_DAYS = 730
+# 本地复权：仓库只保存不复权日线 + baostock 复权因子（query_adjust_factor），前复权价格在本地计算；
+# 除权除息只需刷新一次复权因子，无需整段重拉历史。False：仓库直接保存 baostock 前复权日线（旧行为）。
+# 与 baostock 前复权的一致性只有合成数据测试（tests/test_kline_store.py），尚未对照真实行情核验，默认关闭
+KLINE_STORE_LOCAL_ADJUST = False
+
+# 分钟线仓库（intraday_store.py，scripts/data/ingest_intraday_bars.py 写入）：5/15/30/60 分钟 K 线（不复权）
+# 按 股票 / 频率 / 自然月 分块压缩存储（npz），只追加新 K 线，按时间区间读取只解压涉及的月份与列；
+# 复权在读取时按日线仓库的复权因子本地计算。超过 RETENTION_DAYS 的月份整块删除
+INTRADAY_STORE_DIR = os.path.join(CACHE_DIR, 'intraday')
+INTRADAY_STORE_RETENTION_DAYS = 365
+
+# 季度财务数据缓存（profit_cache.py）：query_profit_data 结果按 (股票, 年, 季度) 存入 SQLite，
+# 已发布的季度不再请求；仍在披露期内且暂无数据的季度每 PROFIT_CACHE_RECHECK_DAYS 天重查一次
+# False：每只股票每次都逐季度请求（旧行为）
+PROFIT_CACHE_ENABLE = True
+PROFIT_CACHE_FILE = os.path.join(CACHE_DIR, 'profit_data.db')
+PROFIT_CACHE_RECHECK_DAYS = 1
+
+# 全市场预筛（universe_gate.py，仅并行流水线）：提交任务前用本地 K 线仓库 + 一次 query_all_stock 交易状态，
+# 找出必然因数据量不足 / 流动性门槛被跳过的股票（仓库已含最近交易日，或最近交易日停牌），不再拉取与计算；
+# 结论与 worker 完全一致，无法精确判定的股票照常提交。False：全部提交（旧行为）
+UNIVERSE_PREGATE_ENABLE = True
+
+# 运行日志（run_journal.py）：逐只记录已写入信号文件/数据库的股票，进程中途被杀后同一日期重跑时断点续跑
+# （run.py --fresh 忽略日志从头开始）；False：每次都从头开始（旧行为）
+RUN_JOURNAL_ENABLE = True
+RUN_JOURNAL_DIR = os.path.join(CACHE_DIR, 'run_journal')
+
+# 本地交易日历（trade_calendar.py）：每个日历日是否交易日，增量刷新，所有模块共用，替代逐次 query_trade_dates
+# 和「周一至周五」近似
+TRADE_CALENDAR_FILE = os.path.join(CACHE_DIR, 'trade_calendar.csv')
+# 首次播种时向前覆盖的日历天数（之后只增量补尾部；需要更早日期时按需补头部）
+TRADE_CALENDAR_HISTORY_DAYS = 1095
 
 # K 线拉取完成后，信号计算（指标+analyze_signals）的并行进程数；0 表示串行
 # 纯 CPU 计算，与 baostock 无关；设为 CPU 核数即可（过多会增加内存和 pickle 开销）
@@ -129,6 +271,14 @@ KLINE_FIELD_MAPPING = {
 }
 
 # 技术指标
+# 指标计算引擎：'numpy'：indicator_engine 单遍计算（连续数组 + 滑动窗口视图，数值与 ta 实现一致）；
+# 'ta'：TechnicalIndicators.calculate_all 逐个指标经 ta 库计算（旧实现）
+INDICATOR_ENGINE = 'numpy'
+# 指标面板模式（indicator_panel.py，仅 numpy 引擎）：先拉完全部股票的 K 线，再在主进程把全市场排成「股票 × 交易日」
+# 二维数组一次算完全部指标（结果与逐只计算逐位一致），随后逐只分析信号，不再开计算进程池。
+# 开启后不走 BAOSTOCK_PIPELINE_FETCH_AND_COMPUTE 流水线；默认关闭
+INDICATOR_PANEL = False
+
 # 技术指标配置
 INDICATORS_CONFIG = {
     'kdj': {
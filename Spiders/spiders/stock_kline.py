@@ -9,6 +9,28 @@ from .stock_config import (
     SIGNAL_FILTERS,
     BAOSTOCK_FETCH_WORKERS,
     BAOSTOCK_PIPELINE_FETCH_AND_COMPUTE,
+    BAOSTOCK_PIPELINE_CHUNK_SIZE,
+    INDICATOR_PANEL,
+    BAOSTOCK_ADAPTIVE_CONCURRENCY,
+    BAOSTOCK_MIN_FETCH_WORKERS,
+    BAOSTOCK_MAX_FETCH_WORKERS,
+    FETCH_HISTORY_ENABLE,
+    RUN_JOURNAL_ENABLE,
+    BAOSTOCK_HEDGE_ENABLE,
+    BAOSTOCK_HEDGE_PERCENTILE,
+    BAOSTOCK_HEDGE_MULTIPLIER,
+    BAOSTOCK_HEDGE_MIN_SAMPLES,
+    BAOSTOCK_HEDGE_MIN_SECONDS,
+    BAOSTOCK_HEDGE_MAX_RATIO,
+    BAOSTOCK_HEDGE_RESERVED_WORKERS,
+    BAOSTOCK_RETRY_MAX_ATTEMPTS,
+    BAOSTOCK_RETRY_BASE_DELAY,
+    BAOSTOCK_RETRY_MAX_DELAY,
+    BAOSTOCK_BACKEND,
+    KLINE_STORE_ENABLE,
+    KLINE_STORE_LOCAL_ADJUST,
+    UNIVERSE_PREGATE_ENABLE,
+    REPLAY_SCRATCH_DIR,
 )
 from .baostock_helper import (
     fetch_kline_data_baostock_simple,
@@ -17,7 +39,12 @@ from .baostock_helper import (
     logout_baostock,
     fetch_one_baostock_worker,
     fetch_and_compute_one_baostock_worker,
+    fetch_and_compute_chunk_baostock_worker,
     read_stock_list_txt,
+    resolve_stock_names,
+    init_baostock_worker,
+    ensure_trade_calendar,
+    get_trade_status_baostock,
 )
 from .signal_compute_worker import (
     _success_return_threshold_pct,
@@ -28,12 +55,32 @@ from .signal_compute_worker import (
 )
 from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED, CancelledError
 from concurrent.futures.process import BrokenProcessPool
-from .technical_indicators import TechnicalIndicators
+from .indicator_engine import calculate_indicators
+from .fetch_concurrency import AdaptiveConcurrency, HedgePolicy, RetryQueue
+from .fetch_history import FetchHistory
+from .run_journal import RunJournal
+from .trade_calendar import is_trading_day, previous_trading_days
+from .universe_gate import pregate_reason
+from .circuit_breaker import baostock_breaker_paused
+from .baostock_replay import BACKEND_RECORD
 from common.log import get_logger
 import sqlite3
 import bisect
 import time
-import signal
+
+
+def _is_transient_skip(reason):
+    """skip 结果是否为可重试的瞬时失败（K线拉取/超时/取消/卡死）。
+
+    流动性不足、换手率不足、数据量不足N天、估值过滤及非瞬时异常都属
+    确定性/过滤类 skip，重试无意义，不应进入重试队列。
+    """
+    reason = reason or ''
+    if reason in ('K线拉取失败', '超时', '已取消'):
+        return True
+    if '卡死' in reason:
+        return True
+    return False
 
 
 def _min_distinct_signal_types_for_output():
@@ -90,7 +137,7 @@ class StockKlineSpider:
     
     def __init__(self, stock_codes=None, use_file=False, stock_file='stock_list.txt',
                  kline_type='daily', fq_type='forward', start_date=None, end_date=None,
-                 calc_indicators=True, progress=None):
+                 calc_indicators=True, progress=None, resume=True):
         self.logger = get_logger(__name__)
         
         # 获取指定日期或当前日期
@@ -128,18 +175,34 @@ class StockKlineSpider:
         self.progress = progress
         self._progress_task = None
         self._progress_seen = set()
+        self._session_health = {}  # 子进程 pid -> 最近一次回报的 baostock 会话健康统计
         self.kline_data = {}  # 用于临时存储K线数据
         self.fundamental_map = self._load_fundamental_cache()
         
         # 添加信号输出文件的路径
         self.signal_file = f'kdj_signals_{self.current_date.strftime("%Y%m%d")}.txt'
-        # 清空信号文件
-        with open(self.signal_file, 'w', encoding='utf-8') as f:
-            f.write(f"股票信号分析报告 - {self.current_time}\n")
-            f.write("=" * 80 + "\n\n")
+        if REPLAY_SCRATCH_DIR:
+            # 回放不覆盖生产的信号报告 / 数据库（见 stock_config.REPLAY_SCRATCH_DIR）
+            os.makedirs(REPLAY_SCRATCH_DIR, exist_ok=True)
+            self.signal_file = os.path.join(REPLAY_SCRATCH_DIR, self.signal_file)
+        # 运行日志：同一日期上次运行中途退出时续跑（信号文件截断到最后记录的位置，不再清空）
+        self.journal = None
+        if RUN_JOURNAL_ENABLE:
+            self.journal = RunJournal.open(self.current_date.strftime("%Y%m%d"), self.signal_file, resume=resume)
+        if self.journal is not None and self.journal.resumed:
+            self.logger.warning(
+                f"检测到 {self.current_time} 未完成的运行日志，断点续跑（已记录 {len(self.journal.entries)} 只）"
+            )
+        else:
+            # 清空信号文件
+            with open(self.signal_file, 'w', encoding='utf-8') as f:
+                f.write(f"股票信号分析报告 - {self.current_time}\n")
+                f.write("=" * 80 + "\n\n")
+            if self.journal is not None:
+                self.journal.start()
         
         # 初始化数据库连接
-        self.conn = sqlite3.connect('stock_signals.db')
+        self.conn = sqlite3.connect(os.path.join(REPLAY_SCRATCH_DIR or '', 'stock_signals.db'))
         self.cursor = self.conn.cursor()
         self.create_table()
 
@@ -147,18 +210,21 @@ class StockKlineSpider:
         """从 K 线拉取结果中提取最后一行的 PE/PB，写入 stock_detail_data.csv（兼容下游）。"""
         import csv as csv_mod
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        out_path = os.path.join(project_root, 'stock_detail_data.csv')
+        out_path = os.path.join(REPLAY_SCRATCH_DIR or project_root, 'stock_detail_data.csv')
         fields = [
             'stock_id', 'stock_name', 'new_price', 'percentage_change', 'price_change',
             'trading_volume', 'trading_value', 'highest_price', 'lowest_price',
             'opening_price', 'closing_price', 'turnover_rate', 'pe', 'pb',
         ]
+        # 续跑时合并上次运行已完成股票的最后一根 K 线（记录在运行日志中）
+        if self.journal is not None and self.journal.resumed:
+            results = {**self.journal.resumed_results(), **results}
         rows_written = 0
         try:
             with open(out_path, 'w', encoding='utf-8', newline='') as f:
                 writer = csv_mod.writer(f)
                 writer.writerow(fields)
-                for code in self.stock_codes:
+                for code in (getattr(self, '_all_stock_codes', None) or self.stock_codes):
                     if code not in results:
                         continue
                     s_code, s_name, df = results[code]
@@ -640,11 +706,90 @@ class StockKlineSpider:
         self._progress_seen.add(code)
         self.progress.update(self._progress_task, advance=1)
 
+    def _record_session_health(self, res):
+        """记录 worker 随结果回报的会话健康统计（按子进程 pid 覆盖为最新值）。"""
+        health = res.get('session') if isinstance(res, dict) else None
+        if health and health.get('pid'):
+            self._session_health[health['pid']] = health
+
+    def _log_session_health(self):
+        """汇总打印各子进程 baostock 会话情况：登录/重登次数应与进程数同量级，而非与股票数同量级。"""
+        if not self._session_health:
+            return
+        stats = list(self._session_health.values())
+        logins = sum(h.get('logins', 0) for h in stats)
+        relogins = sum(h.get('relogins', 0) for h in stats)
+        requests = sum(h.get('requests', 0) for h in stats)
+        failures = sum(h.get('failures', 0) for h in stats)
+        self.logger.warning(
+            f"baostock 会话：{len(stats)} 个子进程，登录 {logins} 次，失败后重登 {relogins} 次，"
+            f"会话失效 {failures} 次，请求 {requests} 次"
+        )
+
     def run(self):
+        """拉取全部股票并计算信号；存在同一日期未完成的运行日志时只处理尚未完成的股票。"""
+        all_codes = self.stock_codes
+        self._all_stock_codes = all_codes
+        if self.journal is not None and self.journal.resumed:
+            completed = self.journal.completed_codes()
+            self.stock_codes = [c for c in all_codes if c not in completed]
+            self.logger.warning(
+                f"断点续跑：跳过已完成 {len(all_codes) - len(self.stock_codes)} 只，剩余 {len(self.stock_codes)} 只"
+            )
+        try:
+            if self.stock_codes:
+                self._run_stocks()
+            else:
+                self._export_valuation_csv({})
+        finally:
+            self.stock_codes = all_codes
+        if self.journal is not None:
+            self.journal.finish()
+
+    def _pregate_universe(self, codes):
+        """
+        流水线提交前的全市场预筛（见 universe_gate）：返回 {股票代码: skip 原因}，
+        仅包含能用本地仓库精确判定、worker 必然会跳过的股票。
+        """
+        if not (UNIVERSE_PREGATE_ENABLE and KLINE_STORE_ENABLE) or BAOSTOCK_BACKEND == BACKEND_RECORD:
+            return {}
+        recent = previous_trading_days(self.end_date, 1)
+        if not recent:
+            return {}
+        trade_status = get_trade_status_baostock(recent[0])
+        adjustflag = '3' if KLINE_STORE_LOCAL_ADJUST else '2'
+        gated = {}
+        for code in codes:
+            try:
+                reason = pregate_reason(
+                    code, self.start_date, self.end_date, SIGNAL_FILTERS, trade_status.get(code), adjustflag
+                )
+            except Exception as e:
+                self.logger.warning(f"预筛 {code} 出错，照常提交: {e}")
+                reason = None
+            if reason:
+                gated[code] = reason
+        return gated
+
+    def _journal_result(self, stock_code, status, stock_name=None, df=None):
+        """单只股票的信号文件与数据库写入完成后记入运行日志（供中途退出后续跑）。"""
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(stock_code, status, stock_name, df)
+        except OSError as e:
+            self.logger.warning(f"写入运行日志失败 {stock_code}: {e}")
+
+    def _run_stocks(self):
         # 多进程并行：每个进程独立连接 baostock，互不干扰，可真正并行
         workers = max(1, int(BAOSTOCK_FETCH_WORKERS))
         total = len(self.stock_codes)
         self._start_progress()
+        # 本轮一次性解析全部简称（stock_list.txt + 一次 query_all_stock），worker 内不再逐只查名称
+        self._list_name_by_code = resolve_stock_names(self.stock_codes, self._list_name_by_code)
+        # 交易日历在主进程增量刷新一次，子进程（拉取 / 计算）只读本地文件
+        if not ensure_trade_calendar(self.current_time):
+            self.logger.warning("交易日历刷新失败，未覆盖的日期按周一至周五判断")
         self.logger.warning(f"开始拉取 {total} 只股票，{workers} 进程并行，每 50 只打印进度")
         results = {}
         done = 0
@@ -673,88 +818,168 @@ class StockKlineSpider:
                 self._advance_progress(code)
                 if s_df is not None and not s_df.empty:
                     self.process_kline_data(s_code, s_name, s_df)
+                    self._journal_result(code, 'done', s_name, s_df)
+                else:
+                    self._journal_result(code, 'failed', s_name)
 
             # 从 K 线结果中提取估值写入 CSV（替代独立的估值抓取阶段）
             self._export_valuation_csv(results)
             return
 
-        # 并行流水线：每个子进程"拉取后立刻计算"，主进程仅处理 I/O
-        if BAOSTOCK_PIPELINE_FETCH_AND_COMPUTE:
+        # 并行流水线：每个子进程"拉取后立刻计算"，主进程仅处理 I/O（面板模式需先拉完全部股票，不走流水线）
+        if BAOSTOCK_PIPELINE_FETCH_AND_COMPUTE and not INDICATOR_PANEL:
             self.logger.warning("启用并行流水线模式：子进程拉取K线后立即计算信号，主进程负责写入/导出")
             try:
                 failed_kline_codes = set()
-                worker_timeout = 300  # 单只股票最大处理时间（秒）
+                worker_timeout = 300  # 单只股票最大处理时间（秒），按块内股票数放大
+                chunk_size = max(1, int(BAOSTOCK_PIPELINE_CHUNK_SIZE))  # 每个任务处理的股票数
                 poll_interval = 30  # 每 30 秒检查一次卡死进程
                 consecutive_stuck = 0  # 连续卡死计数
                 stuck_threshold = workers  # 连续卡死数 >= worker 数时重启进程池
                 max_restarts = 3  # 最大重启次数
 
                 remaining_codes = list(self.stock_codes)
+                # 按历史耗时/失败调度：已知慢股票最先提交并与快股票交错
+                fetch_history = FetchHistory.load() if FETCH_HISTORY_ENABLE else None
+                if fetch_history is not None:
+                    remaining_codes, n_slow = fetch_history.schedule(remaining_codes)
+                    if n_slow:
+                        self.logger.warning(f"按拉取历史调度：{n_slow} 只已知慢/不稳定股票优先提交")
                 submitted_codes = set()
                 pool_broken = False
                 pool_broken_reason = None
                 restart_count = 0
 
+                # 进程池大小（即同时登录的 baostock 会话数）不超过上限，对冲预留的 worker 也算在上限之内：
+                # 常规任务最多占「上限 - 预留」个 worker
+                pool_ceiling = max(workers, int(BAOSTOCK_MAX_FETCH_WORKERS))
+                reserved = 0
+                if BAOSTOCK_HEDGE_ENABLE:
+                    reserved = min(max(0, int(BAOSTOCK_HEDGE_RESERVED_WORKERS)), pool_ceiling - 1)
+                regular_limit = min(workers, pool_ceiling - reserved)
+
+                # 自适应并发：进程池按上限创建，在途任务数由控制器的 limit 决定
+                controller = None
+                if BAOSTOCK_ADAPTIVE_CONCURRENCY:
+                    controller = AdaptiveConcurrency(
+                        workers,
+                        min_limit=BAOSTOCK_MIN_FETCH_WORKERS,
+                        max_limit=pool_ceiling - reserved,
+                    )
+                    regular_limit = controller.max_limit
+                    self.logger.warning(
+                        f"启用自适应并发：初始 {controller.limit}，范围 {controller.min_limit}~{controller.max_limit}"
+                    )
+
+                # 对冲执行：超过耗时预算的任务在空闲 worker 上再提交一份，先完成者生效
+                hedge = None
+                if BAOSTOCK_HEDGE_ENABLE:
+                    hedge = HedgePolicy(
+                        percentile=BAOSTOCK_HEDGE_PERCENTILE,
+                        multiplier=BAOSTOCK_HEDGE_MULTIPLIER,
+                        min_samples=BAOSTOCK_HEDGE_MIN_SAMPLES,
+                        min_budget=BAOSTOCK_HEDGE_MIN_SECONDS,
+                        max_ratio=BAOSTOCK_HEDGE_MAX_RATIO,
+                    )
+                # 预留给对冲副本的 worker：常规任务只补足到 _inflight_limit()，不会占用
+                pool_size = regular_limit + reserved
+                hedged_chunks = set()
+                hedge_futures = set()
+                orphaned = []  # 同一块已有结果后被放弃、但仍占着 worker 的 future
+
+                # 瞬时失败的股票按指数退避放回进程池，与正常任务交错重试
+                retry_queue = RetryQueue(
+                    max_attempts=BAOSTOCK_RETRY_MAX_ATTEMPTS,
+                    base_delay=BAOSTOCK_RETRY_BASE_DELAY,
+                    max_delay=BAOSTOCK_RETRY_MAX_DELAY,
+                )
+
+                def _inflight_limit():
+                    return controller.limit if controller else regular_limit
+
+                def _observe_concurrency(res=None, failure_kind=None):
+                    """把单个任务的结果反馈给并发控制器，limit 变化时打日志"""
+                    if controller is None:
+                        return
+                    if failure_kind:
+                        change = controller.on_failure(failure_kind)
+                    elif res.get('skip') and _is_transient_skip(res.get('reason')):
+                        change = controller.on_failure('timeout' if res.get('reason') == '超时' else 'error')
+                    else:
+                        change = controller.on_success(res.get('fetch_elapsed'))
+                    if change:
+                        self.logger.warning(f"自适应并发调整：{change[0]} -> {change[1]}")
+
+                def _record_fetch_history(code, res=None, failed=False):
+                    """把单只股票的拉取耗时 / 瞬时失败记入历史（下次运行据此调度）"""
+                    if fetch_history is None:
+                        return
+                    if res is not None:
+                        failed = failed or bool(res.get('skip') and _is_transient_skip(res.get('reason')))
+                        fetch_history.record(code, res.get('fetch_elapsed'), failed)
+                    else:
+                        fetch_history.record(code, None, failed)
+
                 def _create_executor():
-                    return ProcessPoolExecutor(max_workers=workers)
+                    # 子进程在 initializer 中预登录一次，整个进程池生命周期内复用会话
+                    return ProcessPoolExecutor(max_workers=pool_size, initializer=init_baostock_worker)
+
+                def _submit_one(exec, chunk):
+                    return exec.submit(
+                        fetch_and_compute_chunk_baostock_worker,
+                        chunk,
+                        self.start_date,
+                        self.end_date,
+                        INDICATORS_CONFIG,
+                        SIGNAL_FILTERS,
+                        self.current_time,
+                        5,
+                        {code: self._list_name_by_code.get(code) for code in chunk},
+                    )
 
                 def _submit_batch(exec, codes, batch_size):
+                    """提交至多 batch_size 个任务，每个任务为 chunk_size 只股票组成的块，返回 {future: 块}"""
                     batch = {}
-                    for code in codes[:batch_size]:
-                        if code in submitted_codes:
-                            continue
-                        submitted_codes.add(code)
-                        f = exec.submit(
-                            fetch_and_compute_one_baostock_worker,
-                            code,
-                            self.start_date,
-                            self.end_date,
-                            INDICATORS_CONFIG,
-                            SIGNAL_FILTERS,
-                            self.current_time,
-                            5,
-                            self._list_name_by_code.get(code),
-                        )
-                        batch[f] = code
+                    todo = [code for code in codes if code not in submitted_codes][:batch_size * chunk_size]
+                    for i in range(0, len(todo), chunk_size):
+                        chunk = tuple(todo[i:i + chunk_size])
+                        submitted_codes.update(chunk)
+                        batch[_submit_one(exec, chunk)] = chunk
                     return batch
 
-                def _is_retryable_skip(reason):
-                    """skip 结果是否为可重试的瞬时失败（K线拉取/超时/取消/卡死）。
-
-                    流动性不足、换手率不足、数据量不足N天、估值过滤及非瞬时异常都属
-                    确定性/过滤类 skip，重试无意义，不应进入重试队列。
-                    """
-                    reason = reason or ''
-                    if reason in ('K线拉取失败', '超时', '已取消'):
-                        return True
-                    if '卡死' in reason:
-                        return True
-                    return False
+                def _submit_retries(exec, batch_size):
+                    """把重试队列中已到期的股票按块提交，至多 batch_size 个任务，返回 {future: 块}"""
+                    batch = {}
+                    due = retry_queue.pop_due(batch_size * chunk_size)
+                    for i in range(0, len(due), chunk_size):
+                        chunk = tuple(due[i:i + chunk_size])
+                        submitted_codes.update(chunk)
+                        batch[_submit_one(exec, chunk)] = chunk
+                    return batch
+
+                def _retry_or_give_up(code):
+                    """瞬时失败：放入重试队列（结果待定，从 results 移除）；重试次数用完则记为最终失败"""
+                    if retry_queue.schedule(code) is None:
+                        failed_kline_codes.add(code)
+                    else:
+                        results.pop(code, None)
+
+                def _chunk_label(chunk):
+                    return ','.join(chunk)
 
-                def _classify_retry_outcome(res):
-                    """把单只股票的重试结果归类为四类之一：
-                    - 'success'：拿到数据且完整跑完计算（无论有无信号）
-                    - 'filtered'：被流动性/数据量/估值等确定性门槛挡掉，不重试
-                    - 'retry'：真正的瞬时拉取失败（K线拉取/超时/取消/卡死），下轮继续重试
-                    - 'failed'：计算出错（带 error 字段），按“出错了才算失败”定义为失败，不重试
-                    """
-                    if res.get('error'):
-                        return 'failed'
-                    if res.get('skip'):
-                        if _is_retryable_skip(res.get('reason')):
-                            return 'retry'
-                        return 'filtered'
-                    return 'success'
+                def _busy_workers():
+                    return len(pending) + sum(1 for f in orphaned if not f.done())
 
                 def _handle_result(res, code):
-                    """处理单个结果（写文件/写库/更新极值等 I/O），返回是否应加入重试集"""
+                    """处理单个结果（写文件/写库/更新极值等 I/O），返回是否应放入重试队列"""
+                    self._record_session_health(res)
                     try:
                         self._process_compute_result(res)
                     except Exception as e:
                         self.logger.error(f"处理 {code} 流水线结果出错: {e}")
 
                     should_retry = False
-                    if res.get('skip') and _is_retryable_skip(res.get('reason')):
+                    if res.get('skip') and _is_transient_skip(res.get('reason')):
                         should_retry = True
 
                     df = res.get('df')
@@ -766,30 +991,74 @@ class StockKlineSpider:
 
                     return should_retry
 
+                # 全市场预筛：必然被数据量 / 流动性门槛挡掉的股票不再提交，按 worker 的 skip 结果处理
+                gated = self._pregate_universe(remaining_codes)
+                if gated:
+                    for code in remaining_codes:
+                        if code not in gated:
+                            continue
+                        name = self._list_name_by_code.get(code) or code
+                        _handle_result({'stock_code': code, 'stock_name': name, 'skip': True, 'reason': gated[code]}, code)
+                        done += 1
+                        self._advance_progress(code)
+                    remaining_codes = [c for c in remaining_codes if c not in gated]
+                    self.logger.warning(f"预筛跳过 {len(gated)} 只（本地仓库判定数据量/流动性不达标），剩余 {len(remaining_codes)} 只提交")
+
+                if chunk_size > 1:
+                    self.logger.warning(f"流水线按块提交：每个任务 {chunk_size} 只股票")
                 start_time = time.time()
                 executor = _create_executor()
-                futures = _submit_batch(executor, remaining_codes, workers * 2)
+                futures = _submit_batch(executor, remaining_codes, controller.limit if controller else workers * 2)
                 pending = set(futures.keys())
                 future_start = {f: time.time() for f in pending}
 
-                while pending and not pool_broken:
-                    done_set, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
-                    if not done_set:
+                last_wait_log = time.time()
+                last_tick = time.time()
+
+                while (pending or len(retry_queue)) and not pool_broken:
+                    # 熔断暂停期间（服务不可用，所有子进程都在等待恢复）不计入单只股票的耗时，
+                    # 避免恢复后被误判为卡死或触发对冲
+                    now = time.time()
+                    paused = baostock_breaker_paused()
+                    if paused:
+                        for f in pending:
+                            future_start[f] = future_start.get(f, now) + (now - last_tick)
+                    last_tick = now
+
+                    # 有对冲预算时缩短轮询间隔，超预算的任务能及时对冲
+                    budget = hedge.budget() if hedge else None
+                    wait_timeout = poll_interval if budget is None else min(poll_interval, max(1.0, budget / 4))
+                    # 重试队列中最早一只到期时醒来提交
+                    retry_due = retry_queue.next_due_in()
+                    if retry_due is not None:
+                        wait_timeout = min(wait_timeout, max(0.5, retry_due))
+                    if pending:
+                        done_set, _ = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                    else:
+                        time.sleep(wait_timeout)
+                        done_set = set()
+                    if not done_set and time.time() - last_wait_log >= poll_interval:
+                        last_wait_log = time.time()
                         elapsed_all = int(time.time() - start_time)
-                        self.logger.warning(f"等待中... {len(pending)} 只股票仍在处理，已用时 {elapsed_all}s")
-                        continue
+                        if paused:
+                            self.logger.warning(f"baostock 熔断中，暂停拉取等待恢复... {len(pending)} 个任务待处理，{len(retry_queue)} 只等待重试，已用时 {elapsed_all}s")
+                        else:
+                            self.logger.warning(f"等待中... {len(pending)} 个任务仍在处理，{len(retry_queue)} 只等待重试，已用时 {elapsed_all}s")
 
                     # 处理已完成的 future
                     for future in done_set:
                         pending.discard(future)
-                        code = futures[future]
+                        chunk = futures[future]
+                        if all(code in results for code in chunk):
+                            # 对冲的另一份已先完成并处理过
+                            continue
                         try:
-                            res = future.result(timeout=5)
+                            chunk_res = future.result(timeout=5)
                         except CancelledError:
-                            res = {'stock_code': code, 'stock_name': code, 'skip': True, 'reason': '已取消'}
+                            chunk_res = [{'stock_code': code, 'stock_name': code, 'skip': True, 'reason': '已取消'} for code in chunk]
                         except TimeoutError:
-                            self.logger.error(f"拉取+计算 {code} 超时")
-                            res = {'stock_code': code, 'stock_name': code, 'skip': True, 'reason': '超时'}
+                            self.logger.error(f"拉取+计算 {_chunk_label(chunk)} 超时")
+                            chunk_res = [{'stock_code': code, 'stock_name': code, 'skip': True, 'reason': '超时'} for code in chunk]
                         except Exception as e:
                             is_broken = isinstance(e, (BrokenProcessPool, BrokenPipeError))
                             if not is_broken and isinstance(e, OSError) and "Broken pipe" in str(e):
@@ -802,51 +1071,95 @@ class StockKlineSpider:
                                     f.cancel()
                                 pending.clear()
                                 break
-                            self.logger.error(f"拉取+计算 {code} 出错: {e}")
-                            res = {'stock_code': code, 'stock_name': code, 'skip': True, 'reason': str(e)}
+                            self.logger.error(f"拉取+计算 {_chunk_label(chunk)} 出错: {e}")
+                            chunk_res = [{'stock_code': code, 'stock_name': code, 'skip': True, 'reason': str(e)} for code in chunk]
 
-                        consecutive_stuck = 0
-                        if _handle_result(res, code):
-                            failed_kline_codes.add(code)
+                        siblings = [f for f in pending if futures.get(f) == chunk]
+                        all_transient = all(r.get('skip') and _is_transient_skip(r.get('reason')) for r in chunk_res)
+                        if siblings and all_transient:
+                            # 同一块的另一份仍在运行：本份全部失败不作数，以另一份的结果为准
+                            continue
+                        if siblings:
+                            for f in siblings:
+                                f.cancel()
+                                pending.discard(f)
+                                orphaned.append(f)
+                            if future in hedge_futures:
+                                hedge.on_hedge_won()
+                                self.logger.warning(f"对冲生效：{_chunk_label(chunk)} 的副本先完成")
+                        if hedge and not all(r.get('skip') for r in chunk_res):
+                            hedge.observe(time.time() - future_start.get(future, time.time()))
 
-                        done += 1
-                        self._advance_progress(code)
-                        if done == 1 or done % 50 == 0 or done == total:
-                            self.logger.warning(f"已拉取+计算 {done}/{total} 只")
+                        consecutive_stuck = 0
+                        for res in chunk_res:
+                            code = res['stock_code']
+                            if code in results or code in retry_queue:
+                                continue
+                            first = code not in retry_queue.attempts  # 重试的结果不重复计入进度
+                            _observe_concurrency(res)
+                            _record_fetch_history(code, res)
+                            if _handle_result(res, code):
+                                _retry_or_give_up(code)
+
+                            if first:
+                                done += 1
+                                self._advance_progress(code)
+                                if done == 1 or done % 50 == 0 or done == total:
+                                    self.logger.warning(f"已拉取+计算 {done}/{total} 只")
 
                     # 检查卡死的 future
                     if not pool_broken:
                         now = time.time()
-                        stuck = [f for f in pending if now - future_start.get(f, now) > worker_timeout]
+                        stuck = [
+                            f for f in pending
+                            if now - future_start.get(f, now) > worker_timeout * len(futures[f])
+                        ]
                         for f in stuck:
-                            code = futures[f]
+                            chunk = futures[f]
+                            if any(g is not f and futures.get(g) == chunk for g in pending):
+                                # 已有对冲副本在跑：放弃卡住的这份即可，不计入连续卡死
+                                f.cancel()
+                                pending.discard(f)
+                                orphaned.append(f)
+                                continue
                             elapsed = int(now - future_start.get(f, now))
-                            self.logger.error(f"拉取+计算 {code} 卡死({elapsed}s > {worker_timeout}s)，跳过")
+                            timeout = worker_timeout * len(chunk)
+                            self.logger.error(f"拉取+计算 {_chunk_label(chunk)} 卡死({elapsed}s > {timeout}s)，跳过")
                             f.cancel()
                             pending.discard(f)
-                            results[code] = (code, code, None)
-                            self._advance_progress(code)
-                            failed_kline_codes.add(code)
-                            done += 1
+                            for code in chunk:
+                                if code in results:
+                                    continue
+                                first = code not in retry_queue.attempts
+                                results[code] = (code, code, None)
+                                _record_fetch_history(code, failed=True)
+                                _retry_or_give_up(code)
+                                if first:
+                                    self._advance_progress(code)
+                                    done += 1
                             consecutive_stuck += 1
+                            _observe_concurrency(failure_kind='stuck')
 
                         # 连续卡死数达到阈值，强制重启进程池
                         if consecutive_stuck >= stuck_threshold:
                             if restart_count < max_restarts:
                                 restart_count += 1
                                 self.logger.warning(
-                                    f"连续 {consecutive_stuck} 只卡死，强制重启进程池 "
+                                    f"连续 {consecutive_stuck} 个任务卡死，强制重启进程池 "
                                     f"(第 {restart_count}/{max_restarts} 次，剩余 {len(pending)} 个已提交任务将被丢弃)"
                                 )
-                                # 收集剩余已提交但未完成的股票
+                                # 剩余已提交但未完成的股票放入重试队列
                                 for f in list(pending):
-                                    c = futures.get(f)
-                                    if c:
-                                        failed_kline_codes.add(c)
-                                        results[c] = (c, c, None)
-                                        self._advance_progress(c)
-                                        done += 1
+                                    for c in futures.get(f, ()):
+                                        if c not in results and c not in retry_queue:
+                                            first = c not in retry_queue.attempts
+                                            results[c] = (c, c, None)
+                                            _retry_or_give_up(c)
+                                            if first:
+                                                self._advance_progress(c)
+                                                done += 1
                                 pending.clear()
+                                orphaned.clear()
 
                                 # 强制关闭旧进程池（杀掉卡死的 worker 进程）
                                 try:
@@ -859,9 +1172,11 @@ class StockKlineSpider:
                                 submitted_codes.clear()  # 重置，让未完成的可以重新提交
                                 executor = _create_executor()
                                 consecutive_stuck = 0
-                                unsubmitted = [c for c in remaining_codes if c not in results]
+                                unsubmitted = [c for c in remaining_codes if c not in results and c not in retry_queue]
                                 if unsubmitted:
-                                    new_futures = _submit_batch(executor, unsubmitted, workers * 2)
+                                    new_futures = _submit_batch(
+                                        executor, unsubmitted, controller.limit if controller else workers * 2
+                                    )
                                     futures = new_futures
                                     pending = set(futures.keys())
                                     future_start = {f: time.time() for f in pending}
@@ -869,216 +1184,75 @@ class StockKlineSpider:
                                 # 超过最大重启次数，放弃
                                 self.logger.error(f"进程池已重启 {restart_count} 次仍连续卡死，放弃剩余任务")
                                 for f in list(pending):
-                                    c = futures.get(f)
-                                    if c:
-                                        failed_kline_codes.add(c)
-                                        results[c] = (c, c, None)
-                                        self._advance_progress(c)
-                                        done += 1
+                                    for c in futures.get(f, ()):
+                                        if c not in results:
+                                            failed_kline_codes.add(c)
+                                            results[c] = (c, c, None)
+                                            self._advance_progress(c)
+                                            done += 1
                                 pending.clear()
                                 pool_broken = True
 
-                    # 补充提交新任务（保持进程池满载）
-                    if not pool_broken and len(pending) < workers:
-                        unsubmitted = [c for c in remaining_codes if c not in submitted_codes and c not in results]
-                        if unsubmitted:
-                            new_batch = _submit_batch(executor, unsubmitted, workers - len(pending))
-                            futures.update(new_batch)
-                            pending.update(new_batch.keys())
-                            future_start.update({f: time.time() for f in new_batch})
+                    # 对冲：超过耗时预算且尚未对冲的任务（最早提交的优先），在有空闲 worker 时再提交一份
+                    budget = hedge.budget() if hedge and not paused else None
+                    if not pool_broken and budget is not None:
+                        now = time.time()
+                        for f in sorted(pending, key=lambda x: future_start.get(x, now)):
+                            submitted_tasks = -(-len(submitted_codes) // chunk_size)
+                            if _busy_workers() >= pool_size or not hedge.allow(submitted_tasks):
+                                break
+                            chunk = futures[f]
+                            elapsed = now - future_start.get(f, now)
+                            if chunk in hedged_chunks or elapsed < budget:
+                                continue
+                            hedged_chunks.add(chunk)
+                            hedge.on_hedge()
+                            g = _submit_one(executor, chunk)
+                            futures[g] = chunk
+                            pending.add(g)
+                            hedge_futures.add(g)
+                            future_start[g] = now
+                            self.logger.warning(f"{_chunk_label(chunk)} 已耗时 {elapsed:.0f}s（预算 {budget:.0f}s），提交对冲副本")
+
+                    # 补充提交（在途任务数补足到当前并发上限）：先提交已到期的重试，再提交新任务
+                    if not pool_broken and len(pending) < _inflight_limit():
+                        new_batch = _submit_retries(executor, _inflight_limit() - len(pending))
+                        unsubmitted = [
+                            c for c in remaining_codes
+                            if c not in submitted_codes and c not in results and c not in retry_queue
+                        ]
+                        free = _inflight_limit() - len(pending) - len(new_batch)
+                        if unsubmitted and free > 0:
+                            new_batch.update(_submit_batch(executor, unsubmitted, free))
+                        futures.update(new_batch)
+                        pending.update(new_batch.keys())
+                        future_start.update({f: time.time() for f in new_batch})
+
+                if controller:
+                    self.logger.warning(f"自适应并发：{controller.summary()}")
+                if hedge and hedge.hedges:
+                    self.logger.warning(f"对冲执行：{hedge.summary()}")
+
+                if retry_queue.attempts:
+                    self.logger.warning(f"重试队列：{retry_queue.summary()}")
+                if failed_kline_codes:
+                    self.logger.error(f"拉取/超时/卡死仍未恢复 {len(failed_kline_codes)} 只（已放弃重试）")
 
-                # 关闭进程池
+                if fetch_history is not None:
+                    try:
+                        fetch_history.save()
+                    except OSError as e:
+                        self.logger.warning(f"保存拉取历史失败: {e}")
+
+                # 关闭进程池（重试队列清空后才关闭，重试复用同一批已登录的子进程）
                 try:
                     executor.shutdown(wait=False, cancel_futures=True)
                 except Exception:
                     pass
+                self._log_session_health()
 
-                # 末尾集中重试：针对失败/超时/卡死的股票再跑几轮
-                if failed_kline_codes:
-                    retry_rounds = 5
-                    retry_parallel_threshold = 50  # 超过此数量使用多进程重试
-                    retry_workers = min(3, workers)  # 重试进程数，比正常阶段保守
-
-                    self.logger.warning(
-                        f"流水线阶段失败/超时 {len(failed_kline_codes)} 只，开始末尾重试 {retry_rounds} 轮"
-                    )
-                    remaining = set(failed_kline_codes)
-
-                    for r in range(1, retry_rounds + 1):
-                        if not remaining:
-                            break
-                        self.logger.warning(f"重试第 {r}/{retry_rounds} 轮，待重试 {len(remaining)} 只")
-                        if r > 1:
-                            time.sleep(min(2 * r, 8))
-                        next_remaining = set()
-                        use_parallel = len(remaining) > retry_parallel_threshold and r < retry_rounds
-
-                        if use_parallel:
-                            # 多进程重试
-                            retry_executor = ProcessPoolExecutor(max_workers=retry_workers)
-                            try:
-                                retry_futures = {
-                                    retry_executor.submit(
-                                        fetch_and_compute_one_baostock_worker,
-                                        code,
-                                        self.start_date,
-                                        self.end_date,
-                                        INDICATORS_CONFIG,
-                                        SIGNAL_FILTERS,
-                                        self.current_time,
-                                        3,
-                                        self._list_name_by_code.get(code),
-                                    ): code
-                                    for code in remaining
-                                }
-                                retry_total = len(retry_futures)
-                                retry_done = 0
-                                retry_success = 0
-                                retry_filtered = 0
-                                retry_failed = 0
-                                done_futures = set()
-                                # 动态计算超时：每只股票 60 秒，最少 300 秒
-                                retry_batch_timeout = max(300, int(retry_total / retry_workers * 60))
-                                self.logger.warning(f"并行重试超时设置: {retry_batch_timeout}s（{retry_total} 只 / {retry_workers} worker）")
-                                try:
-                                    for future in as_completed(retry_futures, timeout=retry_batch_timeout):
-                                        done_futures.add(future)
-                                        code = retry_futures[future]
-                                        retry_done += 1
-                                        try:
-                                            retry_res = future.result(timeout=5)
-                                        except Exception as e:
-                                            retry_res = {
-                                                'stock_code': code,
-                                                'stock_name': code,
-                                                'skip': True,
-                                                'reason': str(e),
-                                                'error': str(e),
-                                            }
-
-                                        try:
-                                            self._process_compute_result(retry_res)
-                                        except Exception as e:
-                                            self.logger.error(f"处理 {code} 重试结果出错: {e}")
-
-                                        df = retry_res.get('df')
-                                        if df is not None and hasattr(df, "empty") and not df.empty:
-                                            name = retry_res.get('stock_name') or code
-                                            results[code] = (code, name, df.tail(1))
-                                        else:
-                                            results[code] = (code, retry_res.get('stock_name') or code, None)
-
-                                        outcome = _classify_retry_outcome(retry_res)
-                                        if outcome == 'retry':
-                                            next_remaining.add(code)
-                                        elif outcome == 'failed':
-                                            retry_failed += 1
-                                        else:  # success（含 filtered：拿到数据即算成功）
-                                            retry_success += 1
-                                            if outcome == 'filtered':
-                                                retry_filtered += 1
-
-                                        if retry_done == 1 or retry_done % 50 == 0 or retry_done == retry_total:
-                                            self.logger.warning(f"重试进度: {retry_done}/{retry_total} 只，成功 {retry_success}（含过滤 {retry_filtered}），失败 {retry_failed}")
-                                except TimeoutError:
-                                    # 超时：未完成的 future 标记为失败，下轮继续重试
-                                    unfinished = set(retry_futures.keys()) - done_futures
-                                    self.logger.warning(f"并行重试超时，已完成 {retry_done}/{retry_total}，剩余 {len(unfinished)} 只未完成")
-                                    for f in unfinished:
-                                        c = retry_futures[f]
-                                        f.cancel()
-                                        results[c] = (c, c, None)
-                                        next_remaining.add(c)
-                            finally:
-                                retry_executor.shutdown(wait=False, cancel_futures=True)
-                        else:
-                            # 串行重试：重置登录状态，让 worker 重新登录
-                            self.logger.warning(f"进入串行重试（第 {r}/{retry_rounds} 轮），共 {len(remaining)} 只待重试")
-                            import spiders.baostock_helper as _bh
-                            try:
-                                logout_baostock()
-                            except Exception:
-                                pass
-                            _bh._BAOSTOCK_LOGGED_IN = False
-                            self.logger.warning("串行重试前已重置 baostock 登录状态")
-                            retry_total = len(remaining)
-                            retry_done = 0
-                            retry_success = 0
-                            retry_filtered = 0
-                            retry_failed = 0
-                            for retry_code in list(remaining):
-                                retry_done += 1
-                                retry_timeout = 180
-                                try:
-                                    def _alarm_handler(signum, frame):
-                                        raise TimeoutError(f"重试 {retry_code} 超时({retry_timeout}s)")
-                                    old_handler = signal.signal(signal.SIGALRM, _alarm_handler)
-                                    signal.alarm(retry_timeout)
-                                    try:
-                                        retry_res = fetch_and_compute_one_baostock_worker(
-                                            retry_code,
-                                            self.start_date,
-                                            self.end_date,
-                                            INDICATORS_CONFIG,
-                                            SIGNAL_FILTERS,
-                                            self.current_time,
-                                            3,
-                                            self._list_name_by_code.get(retry_code),
-                                        )
-                                    finally:
-                                        signal.alarm(0)
-                                        signal.signal(signal.SIGALRM, old_handler)
-                                except TimeoutError as e:
-                                    # 单只股票计算超时（signal.alarm 触发）：属可重试瞬时失败
-                                    retry_res = {
-                                        'stock_code': retry_code,
-                                        'stock_name': retry_code,
-                                        'skip': True,
-                                        'reason': '超时',
-                                    }
-                                except Exception as e:
-                                    # 其它异常：按“出错了才算失败”定义为失败（不重试）
-                                    retry_res = {
-                                        'stock_code': retry_code,
-                                        'stock_name': retry_code,
-                                        'skip': True,
-                                        'reason': str(e),
-                                        'error': str(e),
-                                    }
-
-                                try:
-                                    self._process_compute_result(retry_res)
-                                except Exception as e:
-                                    self.logger.error(f"处理 {retry_code} 重试结果出错: {e}")
-
-                                df = retry_res.get('df')
-                                if df is not None and hasattr(df, "empty") and not df.empty:
-                                    name = retry_res.get('stock_name') or retry_code
-                                    results[retry_code] = (retry_code, name, df.tail(1))
-                                else:
-                                    results[retry_code] = (retry_code, retry_res.get('stock_name') or retry_code, None)
-
-                                outcome = _classify_retry_outcome(retry_res)
-                                if outcome == 'retry':
-                                    next_remaining.add(retry_code)
-                                elif outcome == 'failed':
-                                    retry_failed += 1
-                                else:  # success（含 filtered：拿到数据即算成功）
-                                    retry_success += 1
-                                    if outcome == 'filtered':
-                                        retry_filtered += 1
-
-                                if retry_done == 1 or retry_done % 50 == 0 or retry_done == retry_total:
-                                    self.logger.warning(f"重试进度: {retry_done}/{retry_total} 只，成功 {retry_success}（含过滤 {retry_filtered}），失败 {retry_failed}")
-
-                            self.logger.warning(f"串行重试完成：成功 {retry_success} 只（含过滤 {retry_filtered}），失败 {retry_failed} 只（其中待重试 {len(next_remaining)} 只）")
-
-                        remaining = next_remaining
-                        if remaining:
-                            self.logger.error(f"拉取/超时/卡死仍未恢复 {len(remaining)} 只（已重试 {r}/{retry_rounds} 轮）")
-
-                    if pool_broken:
-                        raise BrokenProcessPool(pool_broken_reason or "process pool broken")
+                if pool_broken:
+                    raise BrokenProcessPool(pool_broken_reason or "process pool broken")
             except BrokenProcessPool as e:
                 # 回退到串行流式（稳定优先）
                 self.logger.warning(f"流水线并行失败，回退串行流式: {e}")
@@ -1123,7 +1297,7 @@ class StockKlineSpider:
             self._export_valuation_csv(results)
             return
         try:
-            with ProcessPoolExecutor(max_workers=workers) as executor:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_baostock_worker) as executor:
                 futures = {
                     executor.submit(
                         fetch_one_baostock_worker,
@@ -1233,6 +1407,12 @@ class StockKlineSpider:
             if s_df is not None and not s_df.empty:
                 valid_items.append((s_code, s_name, s_df))
 
+        # 面板模式：主进程整体计算全部股票的指标，再逐只分析信号
+        if INDICATOR_PANEL and valid_items:
+            self._compute_panel(valid_items)
+            self._export_valuation_csv(results)
+            return
+
         if kline_workers > 0 and len(valid_items) > 1:
             self.logger.warning(
                 f"开始并行计算 {len(valid_items)} 只股票的信号，{kline_workers} 进程"
@@ -1290,11 +1470,32 @@ class StockKlineSpider:
             if count == 1 or count % 50 == 0 or count == len(valid_items):
                 self.logger.warning(f"开始处理第{count}个股票 {s_code} 的数据")
             self.process_kline_data(s_code, s_name, s_df)
+            self._journal_result(s_code, 'done', s_name, s_df)
 
         # 从 K 线结果中提取估值写入 CSV（替代独立的估值抓取阶段）
         self._export_valuation_csv(results)
         return
 
+    def _compute_panel(self, valid_items):
+        """面板模式：valid_items 为 [(code, name, df)]，指标经 indicator_panel 一次算完，信号逐只分析并写入。"""
+        from .indicator_panel import calculate_panel_indicators
+        from .signal_compute_worker import compute_signals_for_stock
+
+        started = time.time()
+        frames = calculate_panel_indicators([(s_code, s_df) for s_code, _, s_df in valid_items], INDICATORS_CONFIG)
+        self.logger.warning(
+            f"面板模式：{len(valid_items)} 只股票的指标整体计算完成，耗时 {time.time() - started:.1f}s，开始逐只分析信号"
+        )
+        for count, (s_code, s_name, _) in enumerate(valid_items, 1):
+            res = compute_signals_for_stock(
+                s_code, s_name, frames[s_code],
+                INDICATORS_CONFIG, SIGNAL_FILTERS, self.current_time,
+                indicators_ready=True,
+            )
+            self._process_compute_result(res)
+            if count == 1 or count % 200 == 0 or count == len(valid_items):
+                self.logger.warning(f"已计算 {count}/{len(valid_items)} 只")
+
     def write_to_signal_file(self, content):
         """将内容写入信号文件（带股票级去重，防止并发或重试导致重复）"""
         if not hasattr(self, '_written_signal_stocks'):
@@ -1400,7 +1601,22 @@ class StockKlineSpider:
             self.conn.rollback()  # 发生错误时回滚事务
     
     def _process_compute_result(self, res):
-        """处理 compute_signals_for_stock 返回的结果（主进程 I/O）。"""
+        """处理 compute_signals_for_stock 返回的结果（主进程 I/O），写入完成后记入运行日志。"""
+        stock_code = res['stock_code']
+        already_processed = stock_code in getattr(self, '_processed_stock_codes', ())
+        self._apply_compute_result(res)
+        if already_processed:
+            return
+        if res.get('error'):
+            status = 'error'
+        elif res.get('skip') and _is_transient_skip(res.get('reason')):
+            status = 'failed'
+        else:
+            status = 'done'
+        self._journal_result(stock_code, status, res.get('stock_name'), res.get('df'))
+
+    def _apply_compute_result(self, res):
+        """写入单只股票的信号文件与数据库记录。"""
         stock_code = res['stock_code']
         stock_name = res['stock_name']
 
@@ -1562,7 +1778,7 @@ class StockKlineSpider:
 
             # 算技术指标
             if self.calc_indicators:
-                df = TechnicalIndicators.calculate_all(df, INDICATORS_CONFIG)
+                df = calculate_indicators(df, INDICATORS_CONFIG)
                 
                 # 分析信号
                 kdj_analysis = self.analyze_signals(df, stock_code=stock_code)
@@ -2073,8 +2289,8 @@ class StockKlineSpider:
             df.index = pd.to_datetime(df.index)
             # 获取最后一个交易日
             last_date = df.index[-1]
-            # 获取最近3个交易日的数据（排除周六和周日）
-            trading_days = df[df.index.dayofweek < 5].index  # 0-4分别代表周一到周五
+            # 获取最近3个交易日的数据（排除非交易日）
+            trading_days = df.index[is_trading_day(df.index)]  # 按本地交易日历（未覆盖时按周一至周五）
             last_3_trading_days = trading_days[-3:]
             last_3_days = df.loc[last_3_trading_days].copy()
             
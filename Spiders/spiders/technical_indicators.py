@@ -1,10 +1,54 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from ta.momentum import RSIIndicator, ROCIndicator, StochasticOscillator
 from ta.trend import MACD, EMAIndicator, SMAIndicator, ADXIndicator
 from ta.volatility import BollingerBands, AverageTrueRange
 from ta.volume import OnBalanceVolumeIndicator, VolumeWeightedAveragePrice
 
+def rolling_deviation_mean(values, window, deviation=np.abs):
+    """
+    滑动窗口内各点对窗口均值的离差经 deviation 变换后的均值（默认即平均绝对偏差）；前 window-1 个为 NaN。
+    两遍法（先窗口均值、再离差），与逐窗口 abs(x - x.mean()).mean() 在浮点舍入量级内一致
+    （累加顺序不同，不保证逐位相同；相对误差为若干 ulp，约 1e-15）；
+    按窗口内偏移逐次累加到长度 n 的数组，只有 window 次向量运算，不逐窗口回调 Python，也不生成 n×window 的临时数组。
+    多维输入沿最后一维计算（每行一条序列）。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    m = values.shape[-1] - window + 1
+    if m <= 0:
+        return out
+    mean = sliding_window_view(values, window, axis=-1).mean(axis=-1)
+    acc = np.zeros(mean.shape)
+    dev = np.empty(mean.shape)
+    for k in range(window):
+        np.subtract(values[..., k:k + m], mean, out=dev)
+        acc += deviation(dev, out=dev)
+    out[..., window - 1:] = acc / window
+    return out
+
+
+def weighted_moving_average(values, period):
+    """
+    线性加权移动平均（权重 1..period，越新越大）；前 period-1 个为 NaN。
+    以反序权重做一次 np.convolve（valid 模式），整条序列在 NumPy 内完成；与逐窗口 np.dot(x, weights) / weights.sum()
+    在浮点舍入量级内一致（累加顺序不同，不保证逐位相同；相对误差为若干 ulp，约 1e-15）。
+    多维输入沿最后一维逐行计算（每行一条序列；逐行 np.convolve 保证与一维结果逐位一致）。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        weights = np.arange(1, period + 1)
+        kernel = weights[::-1].astype(np.float64)
+        total = weights.sum()
+        rows = values.reshape(-1, values.shape[-1])
+        dest = out.reshape(-1, values.shape[-1])
+        for row, dst in zip(rows, dest):
+            dst[period - 1:] = np.convolve(row, kernel, mode='valid') / total
+    return out
+
+
 class TechnicalIndicators:
     @staticmethod
     def calculate_kdj(df, period=9, signal=3):
@@ -88,8 +132,7 @@ class TechnicalIndicators:
         try:
             for period in periods:
                 if len(df) >= period:
-                    weights = np.arange(1, period + 1)
-                    df[f'WMA_{period}'] = df['close'].rolling(window=period).apply(lambda x: np.dot(x, weights) / weights.sum(), raw=True)
+                    df[f'WMA_{period}'] = weighted_moving_average(df['close'].to_numpy(), period)
         except Exception as e:
             print(f"计算WMA时出错: {str(e)}")
         return df
@@ -141,7 +184,7 @@ class TechnicalIndicators:
             
             ma = tp.rolling(window=length).mean()
             
-            md = tp.rolling(window=length).apply(lambda x: abs(x - x.mean()).mean())
+            md = pd.Series(rolling_deviation_mean(tp.to_numpy(), length), index=tp.index)
             
             df['CCI_20'] = (tp - ma) / (0.015 * md)
             
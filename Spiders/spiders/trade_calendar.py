@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地交易日历：持久化到 TRADE_CALENDAR_FILE，增量刷新，查询全部在内存中完成
+
+文件为 csv（calendar_date,is_trading_day），每个日历日一行，覆盖 [首日, 末日] 连续区间。
+  - update_calendar：只向数据源请求文件尚未覆盖的头部 / 尾部区间，合并后原子写回
+  - 查询函数（is_trading_day / previous_trading_days / trading_days_between / count_trading_days）
+    基于内存中已排序的 datetime64[D] 交易日数组做 searchsorted，不发任何请求；
+    文件被其他进程更新后（mtime 变化）自动重新加载
+
+日历未覆盖的日期：is_trading_day 退化为「周一至周五」，count_trading_days 返回 None，
+由调用方决定是否请求数据源。
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .stock_config import TRADE_CALENDAR_FILE, TRADE_CALENDAR_HISTORY_DAYS
+
+# 进程内缓存：{'mtime', 'first', 'last', 'days', 'flags', 'trading'}；days 为全部日历日，trading 为已排序交易日
+_CALENDAR = None
+
+
+def _to_day(d):
+    """'YYYYMMDD' / 'YYYY-MM-DD' / datetime / Timestamp → numpy.datetime64[D]。"""
+    if isinstance(d, np.datetime64):
+        return d.astype('datetime64[D]')
+    if isinstance(d, str):
+        d = d.strip()
+        if len(d) == 8 and d.isdigit():
+            d = f"{d[:4]}-{d[4:6]}-{d[6:8]}"
+        return np.datetime64(d[:10], 'D')
+    return np.datetime64(pd.Timestamp(d).date(), 'D')
+
+
+def _to_days(dates):
+    """批量转换为 datetime64[D] 数组（DatetimeIndex 直接取底层数组，不逐个解析）。"""
+    if isinstance(dates, (pd.DatetimeIndex, pd.Series)):
+        return np.asarray(dates.values, dtype='datetime64[ns]').astype('datetime64[D]')
+    arr = np.asarray(dates)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype('datetime64[D]')
+    return np.array([_to_day(d) for d in arr.ravel()], dtype='datetime64[D]').reshape(arr.shape)
+
+
+def _day_str(day):
+    return str(np.datetime64(day, 'D'))
+
+
+def _read_file():
+    try:
+        df = pd.read_csv(TRADE_CALENDAR_FILE, dtype=str)
+    except (OSError, ValueError):
+        return None
+    if df.empty or 'calendar_date' not in df.columns or 'is_trading_day' not in df.columns:
+        return None
+    days = df['calendar_date'].to_numpy(dtype='datetime64[D]')
+    flags = df['is_trading_day'].to_numpy() == '1'
+    order = np.argsort(days, kind='stable')
+    days, flags = days[order], flags[order]
+    return {
+        'mtime': os.path.getmtime(TRADE_CALENDAR_FILE),
+        'first': days[0],
+        'last': days[-1],
+        'days': days,
+        'flags': flags,
+        'trading': days[flags],
+    }
+
+
+def load_calendar():
+    """返回内存中的日历（文件变化时重新加载）；文件不存在或损坏返回 None。"""
+    global _CALENDAR
+    try:
+        mtime = os.path.getmtime(TRADE_CALENDAR_FILE)
+    except OSError:
+        _CALENDAR = None
+        return None
+    if _CALENDAR is None or _CALENDAR['mtime'] != mtime:
+        _CALENDAR = _read_file()
+    return _CALENDAR
+
+
+def _save(days, flags):
+    os.makedirs(os.path.dirname(TRADE_CALENDAR_FILE) or '.', exist_ok=True)
+    tmp_path = f"{TRADE_CALENDAR_FILE}.{os.getpid()}.tmp"
+    df = pd.DataFrame({
+        'calendar_date': np.datetime_as_string(days, unit='D'),
+        'is_trading_day': np.where(flags, '1', '0'),
+    })
+    try:
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, TRADE_CALENDAR_FILE)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def update_calendar(fetch_fn, end_date=None, start_date=None):
+    """
+    确保日历覆盖 [start_date, end_date]，只请求缺失的头部 / 尾部区间。
+
+    参数:
+        fetch_fn: fetch_fn(start, end) -> list[(日期 'YYYY-MM-DD', '0'/'1')] | None，None 表示请求失败
+        end_date: 默认今天
+        start_date: 默认不补头部；首次播种至少覆盖 end_date 前 TRADE_CALENDAR_HISTORY_DAYS 天
+
+    返回:
+        bool: 日历是否已覆盖请求区间
+    """
+    end = _to_day(end_date or datetime.now())
+    cal = load_calendar()
+    seed_start = end - np.timedelta64(int(TRADE_CALENDAR_HISTORY_DAYS), 'D')
+    if cal is None:
+        start = min(_to_day(start_date), seed_start) if start_date else seed_start
+    elif start_date:
+        start = _to_day(start_date)
+    else:
+        start = min(cal['first'], end)
+
+    if cal is not None and cal['first'] <= start and cal['last'] >= end:
+        return True
+
+    if cal is None:
+        ranges = [(start, end)]
+        days, flags = np.array([], dtype='datetime64[D]'), np.array([], dtype=bool)
+    else:
+        ranges = []
+        if start < cal['first']:
+            ranges.append((start, cal['first'] - np.timedelta64(1, 'D')))
+        if end > cal['last']:
+            ranges.append((cal['last'] + np.timedelta64(1, 'D'), end))
+        days, flags = cal['days'], cal['flags']
+
+    for s, e in ranges:
+        rows = fetch_fn(_day_str(s), _day_str(e))
+        if rows is None:
+            return False
+        expected = np.arange(s, e + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+        got = {str(r[0])[:10]: str(r[1]) == '1' for r in rows}
+        # 数据源未返回的日期（不应出现）不写入，避免把未知日期记成非交易日
+        if len(got) < len(expected):
+            return False
+        new_flags = np.array([got.get(_day_str(d), False) for d in expected], dtype=bool)
+        days = np.concatenate([days, expected])
+        flags = np.concatenate([flags, new_flags])
+
+    order = np.argsort(days, kind='stable')
+    _save(days[order], flags[order])
+    return load_calendar() is not None
+
+
+def covers(start, end=None):
+    """日历是否覆盖 [start, end]（end 默认等于 start）。"""
+    cal = load_calendar()
+    if cal is None:
+        return False
+    s = _to_day(start)
+    e = _to_day(end) if end is not None else s
+    return bool(cal['first'] <= s and e <= cal['last'])
+
+
+def is_trading_day(dates):
+    """
+    是否交易日：标量返回 bool，数组 / DatetimeIndex 返回 bool 数组（向量化 searchsorted）。
+    日历未覆盖的日期按周一至周五判断。
+    """
+    scalar = not isinstance(dates, (pd.DatetimeIndex, pd.Series, np.ndarray, list, tuple))
+    days = np.atleast_1d(_to_days([dates] if scalar else dates))
+    weekday = ((days.astype('int64') - 4) % 7) < 5   # 1970-01-01 为周四
+    cal = load_calendar()
+    if cal is None or len(days) == 0:
+        result = weekday
+    else:
+        trading = cal['trading']
+        pos = np.searchsorted(trading, days)
+        hit = (pos < len(trading)) & (trading[np.minimum(pos, len(trading) - 1)] == days)
+        covered = (days >= cal['first']) & (days <= cal['last'])
+        result = np.where(covered, hit, weekday)
+    return bool(result[0]) if scalar else result
+
+
+def previous_trading_days(date=None, n=1, inclusive=True):
+    """
+    date（默认今天）及之前最近的 n 个交易日，从新到旧，格式 'YYYY-MM-DD'。
+    inclusive=False 时不含 date 当天。日历未覆盖 date 时返回空列表。
+    """
+    cal = load_calendar()
+    day = _to_day(date or datetime.now())
+    if cal is None or not (cal['first'] <= day <= cal['last']):
+        return []
+    trading = cal['trading']
+    end = np.searchsorted(trading, day, side='right' if inclusive else 'left')
+    picked = trading[max(0, end - int(n)):end][::-1]
+    return [str(d) for d in np.datetime_as_string(picked, unit='D')]
+
+
+def trading_days_between(start, end):
+    """[start, end] 内的全部交易日（datetime64[D] 升序数组）；仅包含日历覆盖的部分。"""
+    cal = load_calendar()
+    if cal is None:
+        return np.array([], dtype='datetime64[D]')
+    trading = cal['trading']
+    lo = np.searchsorted(trading, _to_day(start), side='left')
+    hi = np.searchsorted(trading, _to_day(end), side='right')
+    return trading[lo:hi]
+
+
+def count_trading_days(start, end):
+    """[start, end] 内的交易日数；日历未完整覆盖该区间时返回 None。"""
+    if _to_day(start) > _to_day(end):
+        return 0
+    if not covers(start, end):
+        return None
+    return int(len(trading_days_between(start, end)))
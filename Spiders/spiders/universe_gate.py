@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+全市场预筛（pre-gate）：提交流水线任务前，用本地 K 线仓库 + 一次全市场交易状态快照
+判定哪些股票必然被 compute_signals_for_stock 的前置检查挡掉，直接跳过拉取与计算
+
+只在能与 worker 得到完全相同结论时才跳过（结果与不预筛一致）：
+  - 仓库已含最近交易日的 K 线：worker 不会发请求，拿到的窗口就是仓库窗口，直接在本地做同样的检查
+  - 仓库截至上一交易日、且最近交易日停牌（query_all_stock 的 tradeStatus=0）：
+    worker 拿到的窗口 = 仓库窗口 + 一根停牌 K 线（成交额 / 换手率为 0），同样可在本地还原
+检查项与 worker 相同且顺序一致：数据量不足 min_history_days → 近 avg_days 日均成交额 / 换手率门槛。
+其余情况（无仓库、仓库过旧、需补头部等）一律交给 worker，不做近似判断。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .kline_store import _store_path, _to_dash_date, _window, load_bars
+from .signal_compute_worker import _passes_stock_liquidity_gate
+from .trade_calendar import previous_trading_days
+
+
+def _suspended_bar(template, day):
+    """停牌日 K 线：价格沿用上一根收盘，成交量 / 成交额 / 换手率为 0（门槛只用成交额与换手率）。"""
+    bar = template.iloc[[-1]].copy()
+    bar.index = pd.DatetimeIndex([pd.Timestamp(day)], name=template.index.name)
+    for col in ('volume', 'amount', 'turnover'):
+        if col in bar.columns:
+            bar[col] = np.zeros(1, dtype=bar[col].dtype)
+    return bar
+
+
+def pregate_reason(stock_code, start_date, end_date, signal_filters, trade_status=None, adjustflag='2'):
+    """
+    返回 worker 必然给出的 skip 原因；无法精确判定或会通过检查时返回 None。
+
+    参数:
+        trade_status: 最近交易日该股票的 tradeStatus（'0' 停牌），未知为 None
+        adjustflag: 仓库中日线的复权口径（成交额 / 换手率不受复权影响）
+    """
+    start_date = _to_dash_date(start_date)
+    end_date = _to_dash_date(end_date)
+    recent = previous_trading_days(end_date, 2)
+    if len(recent) < 2:
+        return None
+    last_trading, prev_trading = recent
+
+    # 仓库文件早于最近交易日写入 → 不可能含该日 K 线；非停牌股无需读取
+    suspended = str(trade_status) == '0'
+    path = _store_path(stock_code, adjustflag)
+    try:
+        mtime_day = pd.Timestamp.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+    except OSError:
+        return None
+    if not suspended and mtime_day < last_trading:
+        return None
+
+    payload = load_bars(stock_code, adjustflag)
+    if payload is None:
+        return None
+    stored = payload['df']
+    covered_from = payload.get('covered_from') or stored.index[0].strftime("%Y-%m-%d")
+    if start_date < covered_from:
+        return None
+
+    last_date = stored.index[-1].strftime("%Y-%m-%d")
+    window = _window(stored, start_date, end_date)
+    if window is None:
+        return None
+    if last_date >= last_trading:
+        pass
+    elif suspended and last_date == prev_trading:
+        window = pd.concat([window, _suspended_bar(window, last_trading)])
+    else:
+        return None
+
+    min_history_days = signal_filters.get('min_history_days', 60)
+    if len(window) < min_history_days:
+        return f'数据量不足{min_history_days}天'
+    ok, reason = _passes_stock_liquidity_gate(window, signal_filters)
+    return None if ok else reason
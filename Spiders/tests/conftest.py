@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""单元测试公共设置：把仓库根目录加入 sys.path，以 Spiders.spiders.xxx 导入被测模块。"""
+
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""baostock_replay：录制多页结果集时取完全部分页，回放得到完整结果。"""
+
+from Spiders.spiders.baostock_replay import RecordingBackend, ReplayBackend
+
+PER_PAGE = 3
+FIELDS = ['code', 'tradeStatus', 'code_name']
+
+
+class _PagedResultData:
+    """模拟 baostock ResultData 的分页：满页时 next() 取下一页并替换 data。"""
+
+    def __init__(self, rows):
+        self.pages = [rows[i:i + PER_PAGE] for i in range(0, len(rows), PER_PAGE)]
+        self.page = 0
+        self.fields = FIELDS
+        self.data = self.pages[0]
+        self.error_code = '0'
+        self.error_msg = 'success'
+        self.cur_row_num = 0
+
+    def next(self):
+        if self.cur_row_num < len(self.data):
+            return True
+        if len(self.data) < PER_PAGE or self.page + 1 >= len(self.pages):
+            return False
+        self.page += 1
+        self.data = self.pages[self.page]
+        self.cur_row_num = 0
+        return True
+
+    def get_row_data(self):
+        row = self.data[self.cur_row_num]
+        self.cur_row_num += 1
+        return row
+
+
+class _FakeBaostock:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query_all_stock(self, day=None):
+        return _PagedResultData(self.rows)
+
+
+def _drain(rs):
+    rows = []
+    while rs.next():
+        rows.append(rs.get_row_data())
+    return rows
+
+
+def test_recording_keeps_every_page(tmp_path):
+    rows = [[f'sh.6000{i:02d}', '1', f'股票{i}'] for i in range(8)]
+    recorder = RecordingBackend(_FakeBaostock(rows), str(tmp_path))
+
+    rs = recorder.query_all_stock(day='2025-09-30')
+    assert rs.fields == FIELDS
+    assert _drain(rs) == rows
+
+    replay = ReplayBackend(str(tmp_path))
+    replayed = replay.query_all_stock(day='2025-09-30')
+    assert replayed.error_code == '0'
+    assert _drain(replayed) == rows
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""KlineSourceRouter：故障切换、冷却、竞速与字段完整性排序（LocalKlineSource 作替身数据源）。"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders.data_sources import KlineSource, KlineSourceRouter, LocalKlineSource
+
+CODE = 'sh.600000'
+
+
+def _bars(n=30, scale=1.0):
+    index = pd.bdate_range('2024-01-02', periods=n)
+    close = np.linspace(10.0, 12.0, n) * scale
+    return pd.DataFrame(
+        {'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close,
+         'volume': np.arange(1, n + 1) * 1000.0, 'amount': close * 1000.0},
+        index=index,
+    )
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    a.mkdir()
+    b.mkdir()
+    _bars(scale=1.0).to_pickle(a / f'{CODE}.pkl')
+    _bars(scale=2.0).to_pickle(b / f'{CODE}.pkl')
+    return str(a), str(b)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        KlineSource()
+
+
+def test_failover_and_cooldown(dirs):
+    broken = LocalKlineSource(dirs[0], name='broken', error_rate=1.0)
+    healthy = LocalKlineSource(dirs[1], name='healthy')
+    router = KlineSourceRouter([broken, healthy], race=False, cooldown=60.0)
+
+    df = router.fetch(CODE, '2024-01-02', '2024-03-01')
+    assert df is not None and df['close'].iloc[0] == pytest.approx(20.0)
+    assert router.stats['broken'].failures == 1
+    assert router.stats['broken'].cooling_down()
+    # 冷却中的数据源排到最后，下次直接走健康的数据源
+    assert [s.name for s in router._ordered()] == ['healthy', 'broken']
+    router.fetch(CODE, '2024-01-02', '2024-03-01')
+    assert router.stats['broken'].failures == 1
+    assert router.stats['healthy'].successes == 2
+
+
+def test_empty_result_is_not_a_failure(dirs):
+    primary = LocalKlineSource(dirs[0], name='primary')
+    backup = LocalKlineSource(dirs[1], name='backup')
+    router = KlineSourceRouter([primary, backup], race=False)
+    assert router.fetch(CODE, '2030-01-01', '2030-02-01') is None
+    assert router.stats['primary'].failures == 0
+    assert not router.stats['primary'].cooling_down()
+
+
+def test_race_against_slow_source(dirs):
+    slow = LocalKlineSource(dirs[0], name='slow', latency=1.0)
+    fast = LocalKlineSource(dirs[1], name='fast', latency=0.0)
+    router = KlineSourceRouter([slow, fast], race=True, race_min_seconds=0.05)
+
+    started = time.time()
+    df = router.fetch(CODE, '2024-01-02', '2024-03-01')
+    assert time.time() - started < 0.9
+    assert df['close'].iloc[0] == pytest.approx(20.0)
+    assert router.stats['fast'].wins == 1
+
+
+def test_full_schema_sources_rank_first(dirs):
+    partial = LocalKlineSource(dirs[0], name='partial', full_schema=False)
+    full = LocalKlineSource(dirs[1], name='full', latency=0.02)
+    router = KlineSourceRouter([partial, full], race=False)
+    router.stats['partial'].on_success(0.001)
+    router.stats['full'].on_success(0.5)
+
+    assert [s.name for s in router._ordered()] == ['full', 'partial']
+    assert [s.name for s in router._ordered(full_schema=False)] == ['partial']
+    assert router.has_partial_sources()
+    # 仓库路径只取字段完整的数据源：它失败时返回 None，而不是退到缺字段的数据源
+    full.error_rate = 1.0
+    assert router.fetch(CODE, '2024-01-02', '2024-03-01', full_schema=True) is None
+    assert router.fetch(CODE, '2024-01-02', '2024-03-01')['close'].iloc[0] == pytest.approx(10.0)
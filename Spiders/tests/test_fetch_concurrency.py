@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""fetch_concurrency.RetryQueue：指数退避到期、按到期顺序取出、重试次数用完后放弃。"""
+
+import pytest
+
+from Spiders.spiders.fetch_concurrency import RetryQueue
+
+
+def test_schedule_backoff_is_exponential_and_capped():
+    queue = RetryQueue(max_attempts=5, base_delay=2.0, max_delay=10.0)
+    delays = [queue.schedule('a', now=0.0) for _ in range(5)]
+    assert delays == [2.0, 4.0, 8.0, 10.0, 10.0]
+    assert queue.attempts['a'] == 5
+
+
+def test_pop_due_returns_due_codes_in_order():
+    queue = RetryQueue(base_delay=1.0, max_delay=60.0)
+    queue.schedule('a', now=0.0)        # 到期 1
+    queue.schedule('b', now=0.0)        # 到期 1
+    queue.schedule('b', now=0.0)        # 第二次：到期 2
+    queue.schedule('c', now=5.0)        # 到期 6
+    assert len(queue) == 4 and 'c' in queue
+
+    assert queue.pop_due(10, now=0.5) == []
+    assert queue.pop_due(1, now=1.0) == ['a']
+    assert 'a' not in queue
+    assert queue.pop_due(10, now=2.0) == ['b', 'b']
+    assert queue.pop_due(10, now=5.9) == []
+    assert queue.pop_due(10, now=6.0) == ['c']
+    assert len(queue) == 0
+
+
+def test_next_due_in():
+    queue = RetryQueue(base_delay=3.0)
+    assert queue.next_due_in(now=0.0) is None
+    queue.schedule('a', now=10.0)
+    queue.schedule('b', now=11.0)
+    assert queue.next_due_in(now=10.0) == pytest.approx(3.0)
+    assert queue.next_due_in(now=20.0) == 0.0
+    queue.pop_due(1, now=13.0)
+    assert queue.next_due_in(now=13.0) == pytest.approx(1.0)
+
+
+def test_gives_up_after_max_attempts():
+    queue = RetryQueue(max_attempts=2, base_delay=1.0)
+    assert queue.schedule('a', now=0.0) == 1.0
+    assert queue.pop_due(1, now=1.0) == ['a']
+    assert queue.schedule('a', now=1.0) == 2.0
+    assert queue.pop_due(1, now=3.0) == ['a']
+    assert queue.schedule('a', now=3.0) is None
+    assert 'a' not in queue and len(queue) == 0
+    assert queue.given_up == 1
+    assert queue.attempts == {'a': 2}
+    assert '1 只重试 2 次仍失败' in queue.summary()
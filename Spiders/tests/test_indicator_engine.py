@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""indicator_engine.compute_all 与 TechnicalIndicators.calculate_all（ta 实现）的一致性：列名、列顺序、dtype、数值。"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders.indicator_engine import compute_all
+from Spiders.spiders.stock_config import INDICATORS_CONFIG
+from Spiders.spiders.technical_indicators import TechnicalIndicators
+
+
+def _bars(n, float_volume, seed):
+    rng = np.random.default_rng(seed)
+    close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+    high = np.round(close * (1 + rng.uniform(0, 0.03, n)), 2)
+    low = np.round(close * (1 - rng.uniform(0, 0.03, n)), 2)
+    volume = rng.integers(1000, 10 ** 7, n)
+    if float_volume:
+        volume = volume.astype(np.float64)
+    return pd.DataFrame(
+        {'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume, 'amount': close * volume},
+        index=pd.bdate_range('2024-01-01', periods=n),
+    )
+
+
+@pytest.mark.parametrize('float_volume', [False, True], ids=['int_volume', 'float_volume'])
+@pytest.mark.parametrize('n', [30, 61, 250])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_calculate_all(n, float_volume, seed):
+    df = _bars(n, float_volume, seed)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = TechnicalIndicators.calculate_all(df.copy(), INDICATORS_CONFIG)
+    got = compute_all(df.copy(), INDICATORS_CONFIG)
+
+    assert list(got.columns) == list(expected.columns)
+    for col in expected.columns:
+        assert got[col].dtype == expected[col].dtype, col
+        # 数值差异在浮点舍入量级，空值位置（预热段）完全一致
+        np.testing.assert_allclose(
+            got[col].to_numpy(np.float64), expected[col].to_numpy(np.float64),
+            rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col,
+        )
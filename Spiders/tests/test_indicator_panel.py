@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""indicator_panel.calculate_panel_indicators 与逐只 calculate_indicators 的结果逐位一致。"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders.indicator_engine import calculate_indicators
+from Spiders.spiders.indicator_panel import calculate_panel_indicators
+from Spiders.spiders.stock_config import INDICATORS_CONFIG
+
+
+def _frames(count=60, seed=1):
+    """长度不一、起点不同、中间缺 K 线、停牌平价、整数 / 浮点成交量、含 NaN 与重复日期的一批股票。"""
+    rng = np.random.default_rng(seed)
+    calendar = pd.bdate_range('2024-01-01', periods=260)
+    frames = []
+    for s in range(count):
+        start = int(rng.integers(0, 250)) if s % 4 == 0 else 0
+        index = calendar[start:]
+        if s % 3 == 0:
+            index = index[rng.random(len(index)) > 0.05]
+        n = len(index)
+        close = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+        high = np.round(close * (1 + rng.uniform(0, 0.03, n)), 2)
+        low = np.round(close * (1 - rng.uniform(0, 0.03, n)), 2)
+        if s % 7 == 0 and n > 40:
+            close[n // 2:n // 2 + 15] = high[n // 2:n // 2 + 15] = low[n // 2:n // 2 + 15] = close[n // 2]
+        volume = rng.integers(1000, 10 ** 7, n)
+        if s % 2:
+            volume = volume.astype(np.float64)
+        df = pd.DataFrame(
+            {'open': close, 'high': high, 'low': low, 'close': close, 'volume': volume, 'amount': close * volume},
+            index=index,
+        )
+        if s == 5:
+            df.loc[df.index[3], 'close'] = np.nan
+        if s == 11:
+            df = pd.concat([df, df.iloc[[-1]]])
+        frames.append((f's{s}', df))
+    return frames
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_panel_matches_per_stock(seed):
+    frames = _frames(seed=seed)
+    panel = calculate_panel_indicators(frames, INDICATORS_CONFIG)
+    assert set(panel) == {code for code, _ in frames}
+    for code, df in frames:
+        expected = calculate_indicators(df, INDICATORS_CONFIG)
+        pd.testing.assert_frame_equal(panel[code], expected, check_exact=True, obj=code)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""intraday_store：复权读取缺少复权因子时不回退为不复权价格，分钟线信号返回 skip 或按请求到的因子计算。"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders import intraday_store, kline_store
+from Spiders.spiders.stock_config import INDICATORS_CONFIG, SIGNAL_FILTERS
+
+CODE = 'sh.600000'
+
+
+@pytest.fixture(autouse=True)
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(intraday_store, 'INTRADAY_STORE_DIR', str(tmp_path / 'intraday'))
+    monkeypatch.setattr(kline_store, 'KLINE_STORE_DIR', str(tmp_path / 'kline'))
+    days = pd.bdate_range('2025-07-01', '2025-09-30')
+    slots = list(pd.date_range('09:35', '11:30', freq='5min').time) + list(pd.date_range('13:05', '15:00', freq='5min').time)
+    index = pd.DatetimeIndex([pd.Timestamp.combine(d, t) for d in days for t in slots], name='time')
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.002, len(index))))
+    bars = pd.DataFrame(
+        {'open': close * 0.999, 'high': close * 1.002, 'low': close * 0.997, 'close': close,
+         'volume': rng.integers(10_000, 1_000_000, len(index)), 'amount': close * 5e5},
+        index=index,
+    )
+    intraday_store.append_bars(CODE, '5', bars)
+    return bars
+
+
+def _factors():
+    # 2025-09-15 除权：之前的前复权价格 × 0.5
+    return pd.DataFrame({'fore': [0.5, 1.0], 'back': [1.0, 2.0]},
+                        index=pd.DatetimeIndex(['2025-07-01', '2025-09-15']))
+
+
+def test_adjusted_load_without_factors_returns_none(stores):
+    assert intraday_store.load_intraday_bars(CODE, '5', adjustflag='2') is None
+    raw = intraday_store.load_intraday_bars(CODE, '5')
+    np.testing.assert_array_equal(raw['close'].to_numpy(), stores['close'].to_numpy())
+
+
+def test_signals_skip_without_factors():
+    res = intraday_store.compute_intraday_signals(
+        CODE, 'x', '5', '2025-09-01', '2025-09-30', INDICATORS_CONFIG, SIGNAL_FILTERS, '2025-09-30'
+    )
+    assert res['skip'] and res['reason'] == '缺少复权因子'
+
+
+def test_signals_use_fetched_factors():
+    requested = []
+
+    def fetch_factors(code, end_date):
+        requested.append((code, end_date))
+        return _factors()
+
+    res = intraday_store.compute_intraday_signals(
+        CODE, 'x', '5', '2025-09-01', '2025-09-30', INDICATORS_CONFIG, SIGNAL_FILTERS, '2025-09-30',
+        fetch_factors_fn=fetch_factors,
+    )
+    assert requested == [(CODE, '2025-09-30')]
+    assert not res['skip'] and res['error'] is None
+    expected = intraday_store.load_intraday_bars(CODE, '5', '2025-09-01', '2025-09-30', adjustflag='2', factors=_factors())
+    np.testing.assert_array_equal(res['df']['close'].to_numpy(), expected['close'].to_numpy())
+    raw = intraday_store.load_intraday_bars(CODE, '5', '2025-09-01', '2025-09-12')
+    np.testing.assert_allclose(expected.loc[:'2025-09-12', 'close'].to_numpy(), raw['close'].to_numpy() * 0.5)
+    # 只用于本次计算，不写入日线仓库
+    assert kline_store.load_factors(CODE) is None
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""本地复权：adjust_bars 与 baostock 前复权（adjustflag='2'）的一致性，以及按昨收检测除权除息。"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders import kline_store
+from Spiders.spiders.kline_store import _corporate_action_dates, adjust_bars, fetch_adjusted_bars
+
+CODE = 'sh600000'
+
+
+def _raw_bars(base=10.0, events=None, n=14):
+    """
+    不复权日线（adjustflag='3' 的结构）：events 为 {第几根: 昨收 → 除权参考价}，
+    其余交易日的昨收等于前一根收盘价；change_rate 按交易所口径保留两位小数。
+    """
+    events = events or {}
+    index = pd.bdate_range('2024-03-01', periods=n)
+    rng = np.random.default_rng(7)
+    close = np.empty(n)
+    preclose = np.empty(n)
+    last = base
+    for i in range(n):
+        preclose[i] = round(events[i](last), 2) if i in events else last
+        close[i] = round(preclose[i] * (1 + rng.uniform(-0.03, 0.03)), 2)
+        last = close[i]
+    return pd.DataFrame(
+        {'open': np.round(preclose * 1.001, 2), 'high': np.round(close * 1.02, 2),
+         'low': np.round(close * 0.98, 2), 'close': close, 'preclose': preclose,
+         'volume': np.full(n, 1e6), 'amount': close * 1e6,
+         'change_rate': np.round((close / preclose - 1) * 100, 2)},
+        index=pd.DatetimeIndex(index, name='date'),
+    )
+
+
+def _baostock_factors(raw):
+    """query_adjust_factor 的结构：除权除息日索引，fore（最新一段为 1）/ back（首次除权前为 1）。"""
+    ratio = (raw['preclose'] / raw['close'].shift(1)).iloc[1:]
+    ratio = ratio[ratio != 1.0]
+    fore = ratio[::-1].cumprod()[::-1].shift(-1, fill_value=1.0)
+    back = (1.0 / ratio).cumprod()
+    return pd.DataFrame({'fore': fore, 'back': back})
+
+
+def _baostock_forward(raw):
+    """baostock 前复权（涨跌幅复权）：最新价不变，往前逐日按当日涨跌幅（close / preclose）倒推。"""
+    close = raw['close'].to_numpy()
+    growth = close / raw['preclose'].to_numpy()
+    adj_close = np.empty(len(raw))
+    adj_close[-1] = close[-1]
+    for i in range(len(raw) - 1, 0, -1):
+        adj_close[i - 1] = adj_close[i] / growth[i]
+    scale = adj_close / close
+    out = raw.copy()
+    for col in ('open', 'high', 'low', 'close', 'preclose'):
+        out[col] = raw[col].to_numpy() * scale
+    return out
+
+
+# 现金分红 0.3 元、10 送 3、一分钱的小额分红
+EVENTS = {4: lambda p: p - 0.3, 8: lambda p: p / 1.3, 11: lambda p: p - 0.01}
+
+
+def test_adjust_bars_matches_baostock_forward():
+    raw = _raw_bars(events=EVENTS)
+    factors = _baostock_factors(raw)
+    assert list(factors.index) == [raw.index[i] for i in sorted(EVENTS)]
+
+    adjusted = adjust_bars(raw, factors, adjustflag='2')
+    expected = _baostock_forward(raw)
+    pd.testing.assert_frame_equal(adjusted, expected, check_exact=False, rtol=1e-12, check_freq=False)
+    # 前复权后相邻两根之间不再有除权缺口
+    assert np.allclose(adjusted['preclose'].iloc[1:].to_numpy(), adjusted['close'].iloc[:-1].to_numpy())
+
+
+def test_corporate_action_dates_use_preclose():
+    # 千元股价：涨跌幅只有两位小数，反推的昨收误差可达几分钱，一分钱的分红与之无法区分
+    raw = _raw_bars(base=1500.0, events={6: lambda p: p - 0.01, 10: lambda p: p - 12.0})
+    assert _corporate_action_dates(raw) == [raw.index[6], raw.index[10]]
+    assert _corporate_action_dates(raw, since=raw.index[6]) == [raw.index[10]]
+
+    # 没有昨收的行（旧数据源）退回按涨跌幅反推
+    legacy = raw.assign(preclose=np.nan)
+    legacy['change_rate'] = (legacy['close'] / raw['preclose'] - 1) * 100
+    assert _corporate_action_dates(legacy) == [raw.index[6], raw.index[10]]
+
+
+def test_small_dividend_refreshes_factors(tmp_path, monkeypatch):
+    monkeypatch.setattr(kline_store, 'KLINE_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(kline_store, '_has_trading_day_after', lambda last_date, end_date: True)
+    raw = _raw_bars(events=EVENTS)
+    calls = []
+
+    def fetch_raw(code, start, end):
+        out = raw[(raw.index >= pd.Timestamp(start)) & (raw.index <= pd.Timestamp(end))]
+        return out if not out.empty else None
+
+    def fetch_factors(code, end):
+        calls.append(end)
+        return _baostock_factors(raw[raw.index <= pd.Timestamp(end)])
+
+    day = lambda i: raw.index[i].strftime('%Y-%m-%d')
+    first = fetch_adjusted_bars(CODE, day(0), day(10), fetch_raw, fetch_factors)
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, _baostock_forward(raw.iloc[:11]), check_exact=False, rtol=1e-12, check_freq=False)
+
+    # 第 11 根是一分钱的小额分红：必须发现并刷新复权因子
+    second = fetch_adjusted_bars(CODE, day(0), day(13), fetch_raw, fetch_factors)
+    assert calls == [day(10), day(13)]
+    pd.testing.assert_frame_equal(second, _baostock_forward(raw), check_exact=False, rtol=1e-12, check_freq=False)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""rolling_deviation_mean / weighted_moving_average 与原逐窗口 rolling().apply 实现的回归测试。"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Spiders.spiders.technical_indicators import rolling_deviation_mean, weighted_moving_average
+
+# 累加顺序与逐窗口实现不同：只保证浮点舍入量级一致，不保证逐位相同
+RTOL = 1e-13
+
+
+def _close(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.Series(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))))
+
+
+@pytest.mark.parametrize('n', [19, 20, 250, 1000])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_rolling_deviation_mean_matches_rolling_apply(n, seed):
+    close = _close(n, seed)
+    expected = close.rolling(window=20).apply(lambda x: abs(x - x.mean()).mean()).to_numpy()
+    got = rolling_deviation_mean(close.to_numpy(), 20)
+    np.testing.assert_allclose(got, expected, rtol=RTOL, atol=0, equal_nan=True)
+
+
+@pytest.mark.parametrize('n', [4, 60, 250, 1000])
+@pytest.mark.parametrize('period', [5, 10, 20, 30, 60])
+def test_weighted_moving_average_matches_rolling_apply(n, period):
+    close = _close(n, period)
+    weights = np.arange(1, period + 1)
+    expected = close.rolling(window=period).apply(lambda x: np.dot(x, weights) / weights.sum(), raw=True).to_numpy()
+    got = weighted_moving_average(close.to_numpy(), period)
+    np.testing.assert_allclose(got, expected, rtol=RTOL, atol=0, equal_nan=True)
+
+
+def test_two_dimensional_rows_match_one_dimensional():
+    rows = np.vstack([_close(300, seed).to_numpy() for seed in range(4)])
+    for values_2d, fn in ((rolling_deviation_mean(rows, 20), lambda r: rolling_deviation_mean(r, 20)),
+                          (weighted_moving_average(rows, 30), lambda r: weighted_moving_average(r, 30))):
+        for row, got in zip(rows, values_2d):
+            np.testing.assert_array_equal(got, fn(row))
@@ -326,10 +326,13 @@ def main():
     parser.add_argument('--start-date', help='开始日期（格式：YYYY-MM-DD）')
     parser.add_argument('--end-date', help='结束日期（格式：YYYY-MM-DD）')
     parser.add_argument('--dry-run', action='store_true', help='仅显示需要补充的信号，不实际补充')
-    parser.add_argument('--delay', type=float, default=0.5, help='请求之间的延迟（秒），默认0.5秒')
+    parser.add_argument('--delay', type=float, default=None,
+                        help='请求之间的延迟（秒）；默认 baostock 为 0（由全局令牌桶限流统一控速），东方财富为 0.5')
     parser.add_argument('--batch-size', type=int, default=10, help='每批处理的股票数量，默认10')
     
     args = parser.parse_args()
+    if args.delay is None:
+        args.delay = 0.0 if DATA_SOURCE == 'baostock' else 0.5
     
     logger.info("=" * 80)
     logger.info("开始补充现有数据库中的每日价格数据")
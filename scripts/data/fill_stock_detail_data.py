@@ -7,11 +7,14 @@
 - 从 stock_list.txt 读取全量股票代码
 - 读取现有 stock_detail_data.csv，找出缺失的股票代码
 - 对缺失代码低并发拉取 baostock K 线（只需要最后一条记录的 close/peTTM/pbMRQ 等）
+- --eps-fallback：peTTM 缺失时按 close / epsTTM 计算 PE（额外请求季度财务数据 query_profit_data，
+  走本地缓存 profit_cache，只请求新披露的季度）；默认关闭，不增加请求量
 - 合并去重并写回 stock_detail_data.csv
 
 用法示例：
   python scripts/data/fill_stock_detail_data.py --workers 2 --retries 5
   python scripts/data/fill_stock_detail_data.py --only-missing --limit 200
+  python scripts/data/fill_stock_detail_data.py --eps-fallback
 """
 
 from __future__ import annotations
@@ -123,12 +126,21 @@ def _safe_float(v):
         return None
 
 
-def _fetch_last_row(code: str, start_date: str | None, end_date: str | None, retries: int):
+def _worker_init():
+    """子进程初始化：预登录 baostock，之后该进程内的所有股票复用同一会话。"""
+    _ensure_import_path()
+    from spiders.baostock_helper import init_baostock_worker
+
+    init_baostock_worker()
+
+
+def _fetch_last_row(code: str, start_date: str | None, end_date: str | None, retries: int,
+                    eps_fallback: bool = False):
     """
     子进程执行：拉取 K 线 -> 取最后一行 -> 转为 CSV 行 dict。
     """
     _ensure_import_path()
-    from spiders.baostock_helper import fetch_one_baostock_worker
+    from spiders.baostock_helper import fetch_one_baostock_worker, latest_eps_ttm
 
     c, name, df = fetch_one_baostock_worker(
         stock_code=code,
@@ -142,11 +154,19 @@ def _fetch_last_row(code: str, start_date: str | None, end_date: str | None, ret
     last = df.iloc[-1]
     pe = _safe_float(last.get("peTTM"))
     pb = _safe_float(last.get("pbMRQ"))
+    close = _safe_float(last.get("close"))
+    if eps_fallback and pe is None and close:
+        try:
+            eps_ttm = _safe_float(latest_eps_ttm(c, df.index[-1].to_pydatetime()))
+        except Exception:
+            eps_ttm = None
+        if eps_ttm and eps_ttm > 0:
+            pe = round(close / eps_ttm, 2)
 
     row = {
         "stock_id": c,
         "stock_name": name or c,
-        "new_price": _safe_float(last.get("close")),
+        "new_price": close,
         "percentage_change": _safe_float(last.get("change_rate")),
         "price_change": "",
         "trading_volume": _safe_float(last.get("volume")),
@@ -176,6 +196,8 @@ def main():
     ap.add_argument("--limit", type=int, default=0, help="最多补多少只（0=不限制）")
     ap.add_argument("--start-date", default=None, help="K线开始日期 YYYY-MM-DD（默认None=由worker内部处理）")
     ap.add_argument("--end-date", default=datetime.now().strftime("%Y-%m-%d"), help="K线结束日期 YYYY-MM-DD")
+    ap.add_argument("--eps-fallback", action="store_true",
+                    help="peTTM 缺失时按 close / epsTTM 计算 PE（额外请求 query_profit_data，默认关闭）")
     args = ap.parse_args()
 
     all_codes = _read_stock_list(args.stock_list)
@@ -201,9 +223,9 @@ def main():
     fetched_fail = 0
 
     # 低并发补齐：避免打爆数据源
-    with ProcessPoolExecutor(max_workers=workers) as ex:
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as ex:
         futs = {
-            ex.submit(_fetch_last_row, code, args.start_date, args.end_date, args.retries): code
+            ex.submit(_fetch_last_row, code, args.start_date, args.end_date, args.retries, args.eps_fallback): code
             for code in missing
         }
         for i, fut in enumerate(as_completed(futs), 1):
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量拉取分钟 K 线写入本地分钟线仓库（Spiders/spiders/intraday_store.py）。
+
+思路：
+- 从 stock_list.txt（或 --codes）读取股票代码
+- 每只股票只请求仓库最后一根 K 线之后的分钟线（空仓库从 --start-date 开始），追加到按月分块的压缩文件
+- 低并发进程池，每个子进程预登录一次 baostock；请求经全局限流与熔断
+- --signals：写入后在同一子进程内用仓库中 [--start-date, --end-date] 的前复权分钟线计算指标与信号
+  （intraday_store.compute_intraday_signals），有近期信号的股票写入项目根目录
+  intraday_signals_<频率>m_<结束日期>.txt；日线仓库没有复权因子的股票向 baostock 请求
+
+用法示例：
+  python scripts/data/ingest_intraday_bars.py --frequency 5 --start-date 2025-09-01
+  python scripts/data/ingest_intraday_bars.py --frequency 30 --codes sh600000 sz000001
+  python scripts/data/ingest_intraday_bars.py --frequency 30 --signals
+"""
+
+from __future__ import annotations
+import sys as _sys, os as _os
+_p = _os.path.dirname(_os.path.abspath(__file__))
+while _p and _p != _os.path.dirname(_p) and not _os.path.isdir(_os.path.join(_p, 'Spiders')):
+    _p = _os.path.dirname(_p)
+if _p and _os.path.isdir(_os.path.join(_p, 'Spiders')) and _p not in _sys.path:
+    _sys.path.insert(0, _p)
+from Spiders.common.log import get_logger
+logger = get_logger(__name__)
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_STOCK_LIST = os.path.join(PROJECT_ROOT, "stock_list.txt")
+
+
+def _ensure_import_path():
+    spiders_dir = os.path.join(PROJECT_ROOT, "Spiders")
+    if spiders_dir not in sys.path:
+        sys.path.insert(0, spiders_dir)
+
+
+def _worker_init():
+    _ensure_import_path()
+    from spiders.baostock_helper import init_baostock_worker
+    init_baostock_worker()
+
+
+def _ingest_one(code: str, frequency: str, start_date: str, end_date: str, signals: bool = False, name: str = ""):
+    _ensure_import_path()
+    from spiders.baostock_helper import fetch_adjust_factors_baostock, fetch_intraday_bars_baostock
+    from spiders.intraday_store import compute_intraday_signals, fetch_intraday_incremental
+    from spiders.stock_config import INDICATORS_CONFIG, SIGNAL_FILTERS
+
+    def _fetch(stock_code, start, end):
+        return fetch_intraday_bars_baostock(stock_code, start, end, frequency=frequency)
+
+    appended = fetch_intraday_incremental(code, frequency, start_date, end_date, _fetch)
+    if not signals:
+        return code, appended, None
+    res = compute_intraday_signals(
+        code, name or code, frequency, start_date, end_date, INDICATORS_CONFIG, SIGNAL_FILTERS,
+        current_time=end_date, fetch_factors_fn=fetch_adjust_factors_baostock,
+    )
+    # 带指标的分钟线 DataFrame 很大，不回传主进程
+    res.pop('df', None)
+    return code, appended, res
+
+
+def _format_signals(res) -> list[str]:
+    analysis = res.get('kdj_analysis') or {}
+    recent = analysis.get('recent_signals') or []
+    if not recent:
+        return []
+    lines = [
+        f"\n股票 {res['stock_name']}({res['stock_code']}) 分钟线信号分析结果",
+        f"总体成功率: {analysis['overall_success_rate']:.2f}%",
+        f"总信号数: {analysis['total_signals']}",
+        f"近期信号（{len(recent)} 个）：",
+    ]
+    for sig in recent:
+        lines.append(f"- {sig['date']:%Y-%m-%d %H:%M} {sig['signal']} 成功率 {sig['signal_success_rate']:.2f}% 价格 {sig['close']:.2f}")
+    return lines
+
+
+def main():
+    _ensure_import_path()
+    from spiders.baostock_helper import MINUTE_FREQUENCIES, ensure_trade_calendar, read_stock_list_txt
+
+    ap = argparse.ArgumentParser(description="增量拉取分钟 K 线写入本地分钟线仓库")
+    ap.add_argument("--frequency", default="5", choices=MINUTE_FREQUENCIES, help="分钟线频率（默认 5）")
+    ap.add_argument("--stock-list", default=DEFAULT_STOCK_LIST)
+    ap.add_argument("--codes", nargs="+", help="指定股票代码（默认读取 --stock-list）")
+    ap.add_argument("--start-date", default=(datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d"),
+                    help="仓库为空时的起始日期 YYYY-MM-DD（默认 30 天前）")
+    ap.add_argument("--end-date", default=datetime.now().strftime("%Y-%m-%d"), help="结束日期 YYYY-MM-DD")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--limit", type=int, default=0, help="最多处理多少只（0=不限制）")
+    ap.add_argument("--signals", action="store_true",
+                    help="写入后在仓库的前复权分钟线上计算指标与信号，结果写入 intraday_signals_<频率>m_<结束日期>.txt")
+    args = ap.parse_args()
+
+    names = {}
+    if args.codes:
+        codes = args.codes
+    else:
+        codes, names = read_stock_list_txt(args.stock_list)
+    if args.limit and args.limit > 0:
+        codes = codes[: args.limit]
+    if not codes:
+        logger.info("[ingest_intraday_bars] nothing to do.")
+        return 0
+
+    # 交易日历在主进程刷新一次，子进程据此跳过无新交易日的股票
+    ensure_trade_calendar(args.end_date)
+    logger.info(f"[ingest_intraday_bars] {len(codes)} stocks, frequency={args.frequency}, "
+                f"{args.start_date} ~ {args.end_date}, workers={args.workers}")
+
+    ok = 0
+    failed = 0
+    appended = 0
+    report = []
+    signalled = 0
+    skipped = 0
+    with ProcessPoolExecutor(max_workers=max(1, int(args.workers)), initializer=_worker_init) as ex:
+        futs = {
+            ex.submit(_ingest_one, code, args.frequency, args.start_date, args.end_date,
+                      args.signals, names.get(code, "")): code
+            for code in codes
+        }
+        for i, fut in enumerate(as_completed(futs), 1):
+            res = None
+            try:
+                _, n, res = fut.result()
+            except Exception as e:
+                n = None
+                logger.warning(f"[ingest_intraday_bars] {futs[fut]} failed: {e}")
+            if n is None:
+                failed += 1
+            else:
+                ok += 1
+                appended += n
+            if res is not None:
+                if res.get('error'):
+                    logger.warning(f"[ingest_intraday_bars] {futs[fut]} signals failed: {res['error'].splitlines()[0]}")
+                elif res.get('skip'):
+                    skipped += 1
+                else:
+                    lines = _format_signals(res)
+                    signalled += bool(lines)
+                    report.extend(lines)
+            if i == 1 or i % 50 == 0 or i == len(codes):
+                logger.info(f"[ingest_intraday_bars] progress {i}/{len(codes)} ok={ok} fail={failed} bars+={appended}")
+
+    logger.info(f"[ingest_intraday_bars] done: ok={ok} fail={failed}, appended {appended} bars")
+    if args.signals:
+        out_path = os.path.join(
+            PROJECT_ROOT, f"intraday_signals_{args.frequency}m_{args.end_date.replace('-', '')}.txt"
+        )
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(f"分钟线（{args.frequency} 分钟）信号分析报告 - {args.start_date} ~ {args.end_date}\n")
+            f.write("=" * 80 + "\n")
+            f.write("\n".join(report) + "\n")
+        logger.info(f"[ingest_intraday_bars] signals: {signalled} stocks with recent signals, "
+                    f"{skipped} skipped -> {out_path}")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())